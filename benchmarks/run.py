@@ -0,0 +1,310 @@
+"""Benchmark suite for the workbook pipeline.
+
+Generates synthetic workbooks, times the base64, load and save stages
+(the latter at every output compression level), every processing_type
+ExcelProcessor supports and set_cells with each bulk value input (values,
+columns, csv and, if pyarrow is installed, arrow), and writes the results
+as JSON. A previous results file can be given as a baseline to flag
+regressions.
+
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --cases cells_10k styled_100k --compare baseline.json --threshold 0.2
+"""
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import base64
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl.utils import get_column_letter
+from src.schemas.models import Processing, ProcessingTarget, PasteTarget, CellRange, Cell
+from src.excel.processor import ExcelProcessor
+from src.excel.template_cache import TemplateCache
+from src.excel.passthrough import COMPRESSION_LEVELS, save_workbook
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    sheets: int
+    rows: int
+    cols: int
+    styled: bool = False
+    merges: int = 0
+
+    @property
+    def cells(self) -> int:
+        return self.sheets * self.rows * self.cols
+
+CASES = {case.name: case for case in [
+    BenchmarkCase("cells_10k", sheets=1, rows=1000, cols=10),
+    BenchmarkCase("cells_100k", sheets=1, rows=10000, cols=10),
+    BenchmarkCase("cells_1m", sheets=1, rows=100000, cols=10),
+    BenchmarkCase("sheets_100", sheets=100, rows=100, cols=10),
+    BenchmarkCase("styled_100k", sheets=1, rows=10000, cols=10, styled=True),
+    BenchmarkCase("merges_10k", sheets=1, rows=10000, cols=10, merges=2500),
+]}
+
+def build_workbook(case: BenchmarkCase) -> bytes:
+    """Generate a synthetic workbook for a case and return it as xlsx bytes."""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    thin = Side(style="thin", color="000000")
+    styles = [
+        (Font(bold=i % 2 == 0, italic=i % 3 == 0, color=f"FF{i * 40:02X}0000"),
+         PatternFill(patternType="solid", fgColor=f"FF00{i * 30:02X}00"),
+         Border(left=thin, bottom=thin) if i % 2 else Border(),
+         Alignment(horizontal="center" if i % 2 else "left", wrapText=i % 4 == 0))
+        for i in range(6)
+    ]
+    for sheet_index in range(case.sheets):
+        ws = wb.create_sheet(f"Sheet{sheet_index + 1}")
+        for row in range(1, case.rows + 1):
+            ws.append([f"r{row}c{col}" if col % 3 == 0 else row * col
+                       for col in range(1, case.cols + 1)])
+        if case.styled:
+            for row in ws.iter_rows():
+                for cell in row:
+                    font, fill, border, alignment = styles[(cell.row + cell.column) % len(styles)]
+                    cell.font, cell.fill, cell.border, cell.alignment = font, fill, border, alignment
+        # 2x2 merged blocks in columns right of the data, clear of the copy target
+        rows_per_column = max(case.rows // 2, 1)
+        for merge in range(case.merges):
+            row = 1 + 2 * (merge % rows_per_column)
+            col = 2 * case.cols + 4 + 2 * (merge // rows_per_column)
+            ws.merge_cells(start_row=row, start_column=col, end_row=row + 1, end_column=col + 1)
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def _cells(start_col: int, start_row: int, end_col: Optional[int] = None, end_row: Optional[int] = None) -> CellRange:
+    return CellRange(
+        start_cell=Cell(col_letter=get_column_letter(start_col), row=start_row),
+        end_cell=Cell(col_letter=get_column_letter(end_col), row=end_row) if end_col else None
+    )
+
+def _arrow_payload(values: List[List[Any]]) -> Optional[str]:
+    """Encode rows as a base64 Arrow IPC stream, or None without pyarrow."""
+    try:
+        import pyarrow
+    except ImportError:
+        return None
+    table = pyarrow.table({f"c{index}": list(column) for index, column in enumerate(zip(*values))})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode()
+
+def build_operations(case: BenchmarkCase) -> Dict[str, Processing]:
+    """One representative Processing per processing_type, sized to the case.
+
+    set_cells also gets a set_cells_<input> case for each other bulk value
+    input, writing the same block.
+    """
+    block_rows = min(case.rows, 10000)
+    span = min(case.rows, 1000)
+    values = [[row * col for col in range(case.cols)] for row in range(block_rows)]
+    bulk_inputs = {
+        "columns": {"columns": [list(column) for column in zip(*values)]},
+        "csv": {"csv": "\n".join(",".join(map(str, row)) for row in values)},
+    }
+    arrow = _arrow_payload(values)
+    if arrow is not None:
+        bulk_inputs["arrow"] = {"arrow": arrow}
+    operations = {
+        "copy": Processing(
+            processing_type="copy",
+            target=ProcessingTarget(cells=_cells(1, 1, case.cols, span)),
+            paste_target=PasteTarget(sheet_name="Sheet1", cells=_cells(case.cols + 2, 1))
+        ),
+        "copy_sheet": Processing(processing_type="copy_sheet"),
+        "copy_style": Processing(
+            processing_type="copy_style",
+            target=ProcessingTarget(cells=_cells(1, 1, case.cols, span)),
+            paste_target=PasteTarget(sheet_name="Sheet1", cells=_cells(case.cols + 2, 1))
+        ),
+        "insert_sheet": Processing(processing_type="insert_sheet"),
+        "delete_sheet": Processing(processing_type="delete_sheet"),
+        "insert": Processing(
+            processing_type="insert",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=11)))
+        ),
+        "delete": Processing(
+            processing_type="delete",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=11)))
+        ),
+        "hidden": Processing(
+            processing_type="hidden",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=span)))
+        ),
+        "group": Processing(
+            processing_type="group",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=span)),
+                                    collapsed=True)
+        ),
+        "set_cells": Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(cells=_cells(1, 1), values=values)
+        ),
+        "join_cells": Processing(
+            processing_type="join_cells",
+            target=ProcessingTarget(cells=_cells(1, 1, 3, 3))
+        ),
+        "merge_cells": Processing(
+            processing_type="merge_cells",
+            target=ProcessingTarget(ranges=[
+                _cells(case.cols + 2, row, case.cols + 3, row + 1) for row in range(1, span, 2)
+            ])
+        ),
+        # Covers every merged block build_workbook adds
+        "unmerge_cells": Processing(
+            processing_type="unmerge_cells",
+            target=ProcessingTarget(ranges=[
+                _cells(2 * case.cols + 4, 1, 2 * case.cols + 5 + 2 * (case.merges // max(case.rows // 2, 1)),
+                       case.rows + 1)
+            ])
+        ),
+    }
+    for name, fields in bulk_inputs.items():
+        operations[f"set_cells_{name}"] = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(cells=_cells(1, 1), **fields)
+        )
+    return operations
+
+def _sheet_for(processing_type: str) -> str:
+    # insert_sheet needs a name that does not exist yet
+    return "Benchmark" if processing_type == "insert_sheet" else "Sheet1"
+
+def _time(func: Callable[..., Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """Time func over repeat runs; if given, setup runs untimed and its result is passed to func."""
+    timings = []
+    for _ in range(repeat):
+        arguments = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*arguments)
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "runs": len(timings)}
+
+def run_case(case: BenchmarkCase, repeat: int = 3) -> Dict[str, Any]:
+    """Time every stage of the pipeline for one case."""
+    excel_data = build_workbook(case)
+    encoded = base64.b64encode(excel_data).decode()
+    results: Dict[str, Any] = {
+        "cells": case.cells,
+        "input_bytes": len(excel_data),
+        "base64_decode": _time(lambda: base64.b64decode(encoded), repeat),
+        "load": _time(lambda: ExcelProcessor(io.BytesIO(excel_data)), repeat),
+    }
+
+    processor = ExcelProcessor(io.BytesIO(excel_data))
+    results["save"] = _time(processor.save, repeat)
+    for compression in COMPRESSION_LEVELS:
+        save = lambda compression=compression: save_workbook(processor.workbook, compression)
+        results[f"save_{compression}"] = _time(save, repeat)
+        results[f"save_{compression}"]["output_bytes"] = len(save().getvalue())
+    output = processor.save().getvalue()
+    results["base64_encode"] = _time(lambda: base64.b64encode(output).decode(), repeat)
+
+    # Each run works on a fresh clone of the parsed template so runs do not compound
+    cache = TemplateCache(max_bytes=1 << 40)
+    fresh_processor = lambda: ExcelProcessor(io.BytesIO(excel_data), template_cache=cache)
+
+    operations = build_operations(case)
+    for name, process in operations.items():
+        try:
+            results[name] = _time(
+                lambda fresh: fresh.process_operations(_sheet_for(process.processing_type), [process]),
+                repeat,
+                setup=fresh_processor
+            )
+        except Exception as e:
+            results[name] = {"error": str(e)}
+
+    written = len(operations["set_cells"].target.values)
+    for name, process in operations.items():
+        if process.processing_type == "set_cells" and "min" in results[name]:
+            results[name]["rows_per_second"] = written / results[name]["min"]
+    return results
+
+def run_suite(cases: List[BenchmarkCase], repeat: int = 3, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """Run the given cases and return a results document."""
+    results = {}
+    for case in cases:
+        log(f"{case.name}: {case.cells} cells in {case.sheets} sheet(s)")
+        results[case.name] = run_case(case, repeat)
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "openpyxl": openpyxl.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """List stages whose best time regressed by more than threshold (0.2 = 20%)."""
+    regressions = []
+    for case_name, stages in current["results"].items():
+        baseline_stages = baseline["results"].get(case_name, {})
+        for stage, timing in stages.items():
+            reference = baseline_stages.get(stage)
+            if not isinstance(timing, dict) or not isinstance(reference, dict):
+                continue
+            if "min" not in timing or not reference.get("min"):
+                continue
+            change = timing["min"] / reference["min"] - 1
+            if change > threshold:
+                regressions.append({
+                    "case": case_name,
+                    "stage": stage,
+                    "baseline": reference["min"],
+                    "current": timing["min"],
+                    "change": change,
+                })
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Excel processing pipeline.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=sorted(CASES),
+                        help="cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    document = run_suite([CASES[name] for name in args.cases], args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(document, file, indent=2)
+
+    for case_name, stages in document["results"].items():
+        for stage, timing in stages.items():
+            if isinstance(timing, dict):
+                summary = f"{timing['min']:.4f}s" if "min" in timing else f"error: {timing['error']}"
+                print(f"{case_name:>14} {stage:<18} {summary}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(document, baseline, args.threshold)
+        for item in regressions:
+            print(f"REGRESSION {item['case']} {item['stage']}: "
+                  f"{item['baseline']:.4f}s -> {item['current']:.4f}s (+{item['change']:.0%})")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,83 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Form, Header
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
+import asyncio
 import base64
 import io
-from typing import Dict, Any
+import json
+import shutil
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple, Iterator, AsyncIterator, BinaryIO
 
-from src.schemas.models import ExcelRequest, ExcelResponse
-from src.excel.processor import ExcelProcessor
+from pydantic import TypeAdapter
 
-app = FastAPI(title="Excel Processing API")
+from src.schemas.models import ExcelRequest, ExcelResponse, Operation, PipelineRequest, PipelineTransformRequest
+from src.excel.processor import transform_bytes, transform_bytes_timed, referenced_sheets
+from src.excel.executor import ExcelExecutor, PoolSaturatedError
+from src.excel.admission import admit, get_memory_budget, WorkbookTooLargeError
+from src.excel.template_cache import get_template_cache
+from src.excel.result_cache import get_result_cache, result_key, pipeline_result_key
+from src.excel.pipelines import get_pipeline_registry, transform_bytes_with_pipeline
+from src.excel.planner import optimize_operations
+from src.excel.jobs import JobStore, JobRunner
+from src.metrics import metrics, collect_timings, current_timer, timed, timed_call
+from src.profiling import is_valid_profile_id, profile_paths, load_summary
+from src import config
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+operations_adapter = TypeAdapter(List[Operation])
+
+executor = ExcelExecutor(
+    mode=config.EXECUTION_MODE,
+    pool_size=config.POOL_SIZE,
+    queue_depth=config.POOL_QUEUE_DEPTH,
+    retry_after=config.POOL_RETRY_AFTER,
+)
+
+job_runner = JobRunner(
+    JobStore(config.JOB_DIR, config.JOB_TTL),
+    workers=config.JOB_WORKERS,
+    use_processes=config.EXECUTION_MODE == "process",
+    memory_budget=config.JOB_MEMORY_BUDGET_BYTES,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_runner.store.cleanup()
+    yield
+    executor.shutdown()
+    job_runner.shutdown()
+
+app = FastAPI(title="Excel Processing API", lifespan=lifespan)
+
+@app.middleware("http")
+async def stage_timing(request: Request, call_next):
+    """Report stage timings in Server-Timing and aggregate them for /metrics."""
+    if not config.METRICS_ENABLED:
+        return await call_next(request)
+    with collect_timings() as timer:
+        response = await call_next(request)
+    if timer.stages:
+        response.headers["Server-Timing"] = timer.server_timing()
+    route = request.scope.get("route")
+    # Raw paths of unmatched requests would give every probed URL its own series
+    endpoint = route.path if route else "unmatched"
+
+    # Streamed responses such as /transform_excel/batch do their work while the
+    # body is sent, so the request is recorded once the body is done
+    body = response.body_iterator
+    async def record_after_body() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            metrics.record(endpoint, response.status_code, timer)
+    response.body_iterator = record_after_body()
+    return response
 
 @app.exception_handler(HTTPException)
 async def exception_handler(request: Request, exc: HTTPException):
@@ -19,36 +89,399 @@ async def exception_handler(request: Request, exc: HTTPException):
             "status": "Error",
             "error_code": exc.status_code,
             "status_code": exc.status_code,
-        }
+        },
+        headers=exc.headers,
     )
 
-@app.post("/transform_excel", response_model=ExcelResponse)
-async def transform_excel(request: ExcelRequest) -> Dict[str, Any]:
+def iter_buffer(buffer: io.BytesIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the buffer contents in fixed-size chunks."""
+    while True:
+        chunk = buffer.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def too_large_exception(error: WorkbookTooLargeError) -> HTTPException:
+    """Map a workbook that can never fit the memory budget to a 413."""
+    return HTTPException(status_code=413, detail={str(error)})
+
+def busy_exception(error: PoolSaturatedError) -> HTTPException:
+    """Map pool saturation to a 503 with Retry-After."""
+    return HTTPException(
+        status_code=503,
+        detail={str(error)},
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def profile_id_for(x_profile: Optional[str], x_request_id: Optional[str]) -> Optional[str]:
+    """Return the ID to spool a profile under, or None if this request is not profiled."""
+    if not config.PROFILING_ENABLED or x_profile not in ("1", "true"):
+        return None
+    if x_request_id is None:
+        return uuid.uuid4().hex
+    if not is_valid_profile_id(x_request_id):
+        raise HTTPException(status_code=400, detail="X-Request-ID may only contain letters, digits, '-' and '_'")
+    return x_request_id
+
+async def process_workbook(excel_file: BinaryIO, operations: List[Operation],
+                           profile_id: Optional[str] = None, compression: Optional[str] = None) -> io.BytesIO:
+    """Run the transformation, or return the stored output of an identical earlier request."""
+    excel_data = excel_file.read()
+
+    async def compute() -> bytes:
+        # Memory is only reserved for requests that actually run
+        async with admit(excel_data, referenced_sheets(operations)) as load_mode:
+            return await run_transformation(excel_data, operations, profile_id, compression, load_mode)
+
+    result_cache = get_result_cache()
+    # Profiled requests always run, since the profile is what they ask for
+    if result_cache is None or profile_id is not None:
+        return io.BytesIO(await compute())
+    key = result_key(excel_data, operations, compression)
+    return io.BytesIO(await result_cache.get_or_compute(key, compute))
+
+async def run_transformation(excel_data: bytes, operations: List[Operation], profile_id: Optional[str] = None,
+                             compression: Optional[str] = None, load_mode: Optional[str] = None) -> bytes:
+    """Run the transformation inline or on the worker pool depending on config."""
+    if executor.mode == "inline":
+        return transform_bytes(excel_data, operations, profile_id, compression, load_mode)
+    timer = current_timer()
+    if timer is None:
+        return await executor.run(transform_bytes, excel_data, operations, profile_id, compression, load_mode)
+    # Stages timed in the worker process are sent back with the output
+    output_data, worker_timer = await executor.run(
+        transform_bytes_timed, excel_data, operations, profile_id, compression, load_mode)
+    timer.merge(worker_timer)
+    return output_data
+
+async def process_with_pipeline(excel_data: bytes, pipeline_id: str, params: Optional[Dict[str, Any]],
+                                compression: Optional[str]) -> io.BytesIO:
+    """Run a registered pipeline inline or on the worker pool, through the result cache if enabled."""
+    pipeline = get_pipeline_registry().get(pipeline_id)
+    if pipeline is None:
+        raise ValueError(f"Pipeline {pipeline_id} not found")
+
+    async def compute() -> bytes:
+        async with admit(excel_data, pipeline.sheet_names) as load_mode:
+            args = (excel_data, pipeline_id, params, compression, load_mode)
+            if executor.mode == "inline":
+                return transform_bytes_with_pipeline(*args)
+            timer = current_timer()
+            if timer is None:
+                return await executor.run(transform_bytes_with_pipeline, *args)
+            output_data, worker_timer = await executor.run(timed_call, transform_bytes_with_pipeline, *args)
+            timer.merge(worker_timer)
+            return output_data
+
+    result_cache = get_result_cache()
+    if result_cache is None:
+        return io.BytesIO(await compute())
+    key = pipeline_result_key(excel_data, pipeline_id, params, compression)
+    return io.BytesIO(await result_cache.get_or_compute(key, compute))
+
+def plan_response(operations: List[Operation]) -> Dict[str, Any]:
+    """Envelope returned for dry runs."""
+    return {
+        "output": "",
+        "mimetype": XLSX_MIMETYPE,
+        "status": "Success",
+        "error_code": 200,
+        "status_code": 200,
+        "plan": [operation.model_dump(exclude_none=True) for operation in operations],
+    }
+
+@app.post("/transform_excel", response_model=ExcelResponse, response_model_exclude_none=True)
+async def transform_excel(
+    request: ExcelRequest,
+    response: Response,
+    x_profile: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    profile_id = profile_id_for(x_profile, x_request_id)
     try:
+        operations = optimize_operations(request.operations) if request.optimize else request.operations
+        if request.dry_run:
+            return plan_response(operations)
+
         # Decode base64 Excel file
-        excel_data = base64.b64decode(request.file)
+        with timed("base64_decode"):
+            excel_data = base64.b64decode(request.file)
         excel_buffer = io.BytesIO(excel_data)
-        
-        # Create Excel processor instance
-        processor = ExcelProcessor(excel_buffer)
-        
-        # Process each operation
-        for operation in request.operations:
-            processor.process_operations(operation.sheet_name, operation.processing)
-        
-        # Get processed Excel file
-        output_buffer = processor.save()
-        output_base64 = base64.b64encode(output_buffer.read()).decode()
-        
+
+        # Process operations and get processed Excel file
+        output_buffer = await process_workbook(excel_buffer, operations, profile_id, request.compression)
+        if profile_id is not None:
+            response.headers["X-Profile-Id"] = profile_id
+        with timed("base64_encode"):
+            output_base64 = base64.b64encode(output_buffer.read()).decode()
+
+        return {
+            "output": output_base64,
+            "mimetype": XLSX_MIMETYPE,
+            "status": "Success",
+            "error_code": 200,
+            "status_code": 200,
+        }
+    except PoolSaturatedError as e:
+        raise busy_exception(e)
+    except WorkbookTooLargeError as e:
+        raise too_large_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={str(e)}
+        )
+
+@app.post("/transform_excel/pipeline", response_model=ExcelResponse, response_model_exclude_none=True)
+async def transform_excel_pipeline(request: PipelineTransformRequest) -> Dict[str, Any]:
+    """Transform a workbook with a registered pipeline instead of an operation list."""
+    try:
+        with timed("base64_decode"):
+            excel_data = base64.b64decode(request.file)
+        output_buffer = await process_with_pipeline(excel_data, request.pipeline_id, request.params,
+                                                    request.compression)
+        with timed("base64_encode"):
+            output_base64 = base64.b64encode(output_buffer.read()).decode()
+
         return {
             "output": output_base64,
-            "mimetype": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            "mimetype": XLSX_MIMETYPE,
             "status": "Success",
             "error_code": 200,
             "status_code": 200,
         }
+    except PoolSaturatedError as e:
+        raise busy_exception(e)
+    except WorkbookTooLargeError as e:
+        raise too_large_exception(e)
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail={str(e)}
-        )
\ No newline at end of file
+        )
+
+@app.post("/transform_excel/binary")
+async def transform_excel_binary(
+    file: UploadFile = File(...),
+    operations: str = Form(...),
+    optimize: bool = Form(True),
+    dry_run: bool = Form(False),
+    compression: Optional[str] = Form(None),
+    x_profile: Optional[str] = Header(None),
+    x_request_id: Optional[str] = Header(None),
+):
+    """Transform a workbook sent as a multipart part and stream the raw xlsx back."""
+    profile_id = profile_id_for(x_profile, x_request_id)
+    try:
+        # Operations arrive as a JSON part next to the binary workbook
+        parsed_operations = operations_adapter.validate_json(operations)
+        if optimize:
+            parsed_operations = optimize_operations(parsed_operations)
+        if dry_run:
+            return JSONResponse(content=plan_response(parsed_operations))
+
+        # The upload is already spooled, so openpyxl can read it in place
+        output_buffer = await process_workbook(file.file, parsed_operations, profile_id, compression)
+    except PoolSaturatedError as e:
+        raise busy_exception(e)
+    except WorkbookTooLargeError as e:
+        raise too_large_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={str(e)}
+        )
+
+    headers = {"Content-Disposition": 'attachment; filename="output.xlsx"'}
+    if profile_id is not None:
+        headers["X-Profile-Id"] = profile_id
+    return StreamingResponse(iter_buffer(output_buffer), media_type=XLSX_MIMETYPE, headers=headers)
+
+def spool_upload(file: UploadFile) -> BinaryIO:
+    """Copy an upload to a temporary file that outlives the request's own upload files."""
+    spool = tempfile.TemporaryFile()
+    file.file.seek(0)
+    shutil.copyfileobj(file.file, spool, STREAM_CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+async def transform_batch_item(index: int, filename: str, upload: BinaryIO, operations: List[Operation],
+                               compression: Optional[str], limit: asyncio.Semaphore) -> Dict[str, Any]:
+    """Transform one workbook of a batch, reporting errors in its result instead of raising.
+
+    The workbook is only read from its spool file once the item holds a
+    slot, so a batch keeps at most one workbook per slot in memory.
+    """
+    async with limit:
+        try:
+            with upload:
+                output_buffer = await process_workbook(upload, operations, compression=compression)
+            return {
+                "index": index,
+                "filename": filename,
+                "output": base64.b64encode(output_buffer.read()).decode(),
+                "mimetype": XLSX_MIMETYPE,
+                "status": "Success",
+                "error_code": 200,
+                "status_code": 200,
+            }
+        except Exception as e:
+            status_code = 503 if isinstance(e, PoolSaturatedError) else 413 if isinstance(e, WorkbookTooLargeError) else 400
+            return {
+                "index": index,
+                "filename": filename,
+                "output": f"Bad Request: {e}",
+                "status": "Error",
+                "error_code": status_code,
+                "status_code": status_code,
+            }
+
+async def iter_batch_results(uploads: List[Tuple[str, BinaryIO]], operations: List[Operation],
+                             compression: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Yield one NDJSON line per workbook, in completion order."""
+    # Keep the batch within the worker pool so it does not crowd out other requests
+    limit = asyncio.Semaphore(executor.pool_size if executor.mode == "process" else 1)
+    tasks = [
+        asyncio.create_task(transform_batch_item(index, filename, upload, operations, compression, limit))
+        for index, (filename, upload) in enumerate(uploads)
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            yield (json.dumps(result) + "\n").encode()
+    finally:
+        for task in tasks:
+            task.cancel()
+        for _, upload in uploads:
+            upload.close()
+
+@app.post("/transform_excel/batch")
+async def transform_excel_batch(
+    files: List[UploadFile] = File(...),
+    operations: str = Form(...),
+    optimize: bool = Form(True),
+    compression: Optional[str] = Form(None),
+):
+    """Apply one operation list to many workbooks and stream per-file results as NDJSON."""
+    try:
+        # Validated and optimized once for the whole batch
+        parsed_operations = operations_adapter.validate_json(operations)
+        if optimize:
+            parsed_operations = optimize_operations(parsed_operations)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={str(e)}
+        )
+
+    # Uploads are closed once the endpoint returns, before the stream is consumed,
+    # so each is copied to a temporary file rather than read into memory
+    uploads = [(file.filename, await asyncio.to_thread(spool_upload, file)) for file in files]
+    return StreamingResponse(iter_batch_results(uploads, parsed_operations, compression), media_type=NDJSON_MIMETYPE)
+
+@app.post("/pipelines", status_code=201)
+async def register_pipeline(request: PipelineRequest) -> Dict[str, Any]:
+    """Validate and plan an operation list once, returning the ID to run it by."""
+    try:
+        operations = optimize_operations(request.operations) if request.optimize else request.operations
+        pipeline = get_pipeline_registry().register(operations)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={str(e)}
+        )
+    return pipeline.describe()
+
+@app.get("/pipelines/{pipeline_id}")
+async def get_pipeline(pipeline_id: str) -> Dict[str, Any]:
+    """Show a registered pipeline's operations and parameters."""
+    pipeline = get_pipeline_registry().get(pipeline_id)
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline {pipeline_id} not found")
+    return pipeline.describe()
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(...),
+    operations: str = Form(...),
+    optimize: bool = Form(True),
+) -> Dict[str, Any]:
+    """Queue a transformation and return its job ID for polling."""
+    try:
+        parsed_operations = operations_adapter.validate_json(operations)
+        if optimize:
+            parsed_operations = optimize_operations(parsed_operations)
+        job_id = job_runner.submit(await file.read(), parsed_operations)
+    except WorkbookTooLargeError as e:
+        raise too_large_exception(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={str(e)}
+        )
+    return {"job_id": job_id, "status": "queued"}
+
+def get_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> Dict[str, Any]:
+    """Report a job's status and which Processing step it is running."""
+    return get_job_or_404(job_id)
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Download the output workbook of a finished job."""
+    job = get_job_or_404(job_id)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=400, detail=job["error"])
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}")
+    return FileResponse(
+        job_runner.store.path(job_id, "output"),
+        media_type=XLSX_MIMETYPE,
+        filename="output.xlsx",
+    )
+
+def get_profile_or_404(profile_id: str) -> Dict[str, Any]:
+    summary = None
+    if config.PROFILING_ENABLED and is_valid_profile_id(profile_id):
+        summary = load_summary(config.PROFILE_DIR, profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return summary
+
+@app.get("/profiles/{profile_id}")
+async def profile_summary(profile_id: str) -> Dict[str, Any]:
+    """Wall time and tracemalloc peak memory recorded for a profiled request."""
+    return get_profile_or_404(profile_id)
+
+@app.get("/profiles/{profile_id}/pstats")
+async def profile_stats(profile_id: str):
+    """Download the cProfile stats of a profiled request, for pstats or snakeviz."""
+    get_profile_or_404(profile_id)
+    return FileResponse(
+        profile_paths(config.PROFILE_DIR, profile_id)["pstats"],
+        media_type="application/octet-stream",
+        filename=f"{profile_id}.pstats",
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request counters and stage duration histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    """Expose cache counters; template caches are those of the worker processes in process mode."""
+    template_cache = executor.template_cache if executor.mode == "process" else get_template_cache()
+    result_cache = get_result_cache()
+    memory_budget = get_memory_budget()
+    return {
+        "template_cache": template_cache.stats() if template_cache and template_cache.max_bytes > 0 else None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "memory_budget": memory_budget.stats() if memory_budget else None,
+    }
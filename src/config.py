@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment."""
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# "inline" runs workbook processing in the request handler,
+# "process" sends it to a bounded process pool
+EXECUTION_MODE = os.environ.get("EXCEL_EXECUTION_MODE", "inline")
+POOL_SIZE = _env_int("EXCEL_POOL_SIZE", os.cpu_count() or 1)
+POOL_QUEUE_DEPTH = _env_int("EXCEL_POOL_QUEUE_DEPTH", POOL_SIZE * 2)
+POOL_RETRY_AFTER = _env_int("EXCEL_POOL_RETRY_AFTER", 5)
+
+# Memory budget for parsed template workbooks; 0 disables the cache
+TEMPLATE_CACHE_BYTES = _env_int("EXCEL_TEMPLATE_CACHE_BYTES", 0)
+
+# Admission control: requests reserve an estimate of the memory they need
+# (worksheet XML size times MEMORY_COST_FACTOR) against this budget and wait
+# up to MEMORY_WAIT_TIMEOUT seconds for room; 0 disables it
+MEMORY_BUDGET_BYTES = _env_int("EXCEL_MEMORY_BUDGET_BYTES", 0)
+MEMORY_COST_FACTOR = _env_int("EXCEL_MEMORY_COST_FACTOR", 12)
+MEMORY_WAIT_TIMEOUT = _env_int("EXCEL_MEMORY_WAIT_TIMEOUT", 30)
+
+# Disk budget for transformed outputs of repeated requests; 0 disables the cache
+RESULT_CACHE_BYTES = _env_int("EXCEL_RESULT_CACHE_BYTES", 0)
+RESULT_CACHE_DIR = os.environ.get("EXCEL_RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "excel_results"))
+
+# Registered operation pipelines, shared by the API and worker processes
+PIPELINE_DIR = os.environ.get("EXCEL_PIPELINE_DIR", os.path.join(tempfile.gettempdir(), "excel_pipelines"))
+
+# "full" re-serializes every sheet on save, "passthrough" copies the XML of
+# sheets no operation touched straight from the input archive
+SAVE_MODE = os.environ.get("EXCEL_SAVE_MODE", "full")
+
+# Deduplicate and drop unused style records before saving
+COMPACT_STYLES = os.environ.get("EXCEL_COMPACT_STYLES", "0") == "1"
+
+# Output archive compression: "stored", "fast", "default" or "best" deflate
+COMPRESSION = os.environ.get("EXCEL_COMPRESSION", "default")
+
+# "eager" parses every sheet on load, "lazy" parses only the sheets the
+# operations reference and passes the rest through on save
+LOAD_MODE = os.environ.get("EXCEL_LOAD_MODE", "eager")
+
+# Asynchronous jobs: spool directory, lifetime in seconds and worker count
+JOB_DIR = os.environ.get("EXCEL_JOB_DIR", os.path.join(tempfile.gettempdir(), "excel_jobs"))
+JOB_TTL = _env_int("EXCEL_JOB_TTL", 3600)
+JOB_WORKERS = _env_int("EXCEL_JOB_WORKERS", POOL_SIZE)
+# Memory budget jobs reserve their estimated cost against before they start,
+# separate from MEMORY_BUDGET_BYTES since jobs run on their own workers;
+# 0 disables it
+JOB_MEMORY_BUDGET_BYTES = _env_int("EXCEL_JOB_MEMORY_BUDGET_BYTES", MEMORY_BUDGET_BYTES)
+
+# Per-stage timings in a Server-Timing header and aggregated on /metrics
+METRICS_ENABLED = os.environ.get("EXCEL_METRICS_ENABLED", "0") == "1"
+
+# Requests sent with an X-Profile header are profiled when enabled; the
+# pstats file and memory summary are spooled here by request ID
+PROFILING_ENABLED = os.environ.get("EXCEL_PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("EXCEL_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "excel_profiles"))
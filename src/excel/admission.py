@@ -0,0 +1,165 @@
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+import asyncio
+import io
+import zipfile
+from collections import deque
+from contextlib import asynccontextmanager
+from src.excel.executor import PoolSaturatedError
+from src.excel.passthrough import Package, passthrough_sheets
+from src import config
+
+class WorkbookTooLargeError(Exception):
+    """Raised when a workbook's estimated memory cost exceeds the whole budget."""
+
+    def __init__(self, cost: int, budget: int):
+        super().__init__(
+            f"Workbook needs an estimated {cost // (1 << 20)} MiB to process, "
+            f"more than the {budget // (1 << 20)} MiB memory budget"
+        )
+        self.cost = cost
+        self.budget = budget
+
+def estimate_memory_cost(excel_data: bytes, sheet_names: Optional[Iterable[str]] = None) -> int:
+    """Estimate the memory needed to process a workbook from its ZIP central directory.
+
+    Worksheet and shared string XML expand by about MEMORY_COST_FACTOR once
+    parsed; other parts are counted at their uncompressed size. With
+    sheet_names, the worksheets a lazy load leaves unparsed are not counted.
+    """
+    with zipfile.ZipFile(io.BytesIO(excel_data)) as archive:
+        package = Package(archive)
+        skipped = set()
+        if sheet_names is not None:
+            lazy_sheets = passthrough_sheets(excel_data) - set(sheet_names)
+            skipped = {package.sheets[name] for name in lazy_sheets}
+        expanding = set(package.sheets.values()) | {package.shared_strings_part()}
+        cost = 0
+        for info in archive.infolist():
+            if info.filename in skipped:
+                continue
+            factor = config.MEMORY_COST_FACTOR if info.filename in expanding else 1
+            cost += info.file_size * factor
+        return cost
+
+def choose_load_mode(excel_data: bytes, sheet_names: Iterable[str], budget_bytes: int) -> Tuple[str, int]:
+    """Pick the load mode to process a workbook with under budget_bytes and its cost.
+
+    Starts from config.LOAD_MODE and switches an eager load whose estimate
+    exceeds the budget to lazy loading if that fits. The cost returned may
+    still exceed the budget; callers reject such workbooks.
+    """
+    load_mode = config.LOAD_MODE
+    if load_mode == "lazy":
+        return load_mode, estimate_memory_cost(excel_data, sheet_names)
+    cost = estimate_memory_cost(excel_data)
+    if cost > budget_bytes:
+        lazy_cost = estimate_memory_cost(excel_data, sheet_names)
+        if lazy_cost <= budget_bytes:
+            return "lazy", lazy_cost
+    return load_mode, cost
+
+class MemoryBudget:
+    """Process-wide memory budget that requests reserve their estimated cost against.
+
+    Requests that do not fit wait in arrival order, up to wait_timeout
+    seconds, for earlier ones to release their reservation.
+    """
+
+    def __init__(self, budget_bytes: int, wait_timeout: float, retry_after: int = 5):
+        self.budget_bytes = budget_bytes
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.reserved = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    async def acquire(self, cost: int) -> None:
+        """Reserve cost bytes, waiting for room if needed."""
+        if cost > self.budget_bytes:
+            self.rejected += 1
+            raise WorkbookTooLargeError(cost, self.budget_bytes)
+        if not self._waiters and self.reserved + cost <= self.budget_bytes:
+            self.reserved += cost
+            self.admitted += 1
+            return
+
+        self.queued += 1
+        waiter = (cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PoolSaturatedError(self.retry_after)
+        except asyncio.CancelledError:
+            # The reservation may have been granted just as the request went away
+            if waiter[1].done() and not waiter[1].cancelled():
+                self.release(cost)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._wake()
+        self.admitted += 1
+
+    def release(self, cost: int) -> None:
+        """Return a reservation and admit waiting requests that now fit."""
+        self.reserved -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.reserved + self._waiters[0][0] <= self.budget_bytes:
+            cost, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.reserved += cost
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def reserve(self, cost: int):
+        await self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "reserved_bytes": self.reserved,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+_memory_budget: Optional[MemoryBudget] = None
+
+def get_memory_budget() -> Optional[MemoryBudget]:
+    """Return the process-wide memory budget, or None when admission control is off."""
+    global _memory_budget
+    if config.MEMORY_BUDGET_BYTES <= 0:
+        return None
+    if _memory_budget is None:
+        _memory_budget = MemoryBudget(config.MEMORY_BUDGET_BYTES, config.MEMORY_WAIT_TIMEOUT,
+                                      config.POOL_RETRY_AFTER)
+    return _memory_budget
+
+@asynccontextmanager
+async def admit(excel_data: bytes, sheet_names: Iterable[str]):
+    """Reserve a request's memory cost and yield the load mode to process it with.
+
+    An eager load that does not fit the budget on its own is routed to lazy
+    loading, which parses only the sheets the operations reference, if
+    that fits. Yields None (use config.LOAD_MODE) when admission is off.
+    """
+    budget = get_memory_budget()
+    if budget is None:
+        yield None
+        return
+
+    load_mode, cost = choose_load_mode(excel_data, sheet_names, budget.budget_bytes)
+    async with budget.reserve(cost):
+        yield load_mode
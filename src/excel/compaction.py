@@ -0,0 +1,116 @@
+from typing import Dict, Iterator, Tuple
+import openpyxl
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.worksheet import Worksheet
+
+# Style table name, workbook attribute, StyleArray position of its ID and
+# how many leading records are reserved (Excel expects the default font,
+# the "none" and "gray125" fills and so on to stay first)
+STYLE_TABLES = (
+    ("fonts", "_fonts", 0, 1),
+    ("fills", "_fills", 1, 2),
+    ("borders", "_borders", 2, 1),
+    ("protections", "_protections", 4, 1),
+    ("alignments", "_alignments", 5, 1),
+)
+NUMBER_FORMAT_POSITION = 3
+
+def style_counts(workbook: openpyxl.Workbook) -> Dict[str, int]:
+    """Number of records in each of the workbook's style tables."""
+    counts = {name: len(getattr(workbook, attribute)) for name, attribute, _, _ in STYLE_TABLES}
+    counts["number_formats"] = len(workbook._number_formats)
+    counts["cell_xfs"] = len(workbook._cell_styles)
+    return counts
+
+def _iter_styled(workbook: openpyxl.Workbook) -> Iterator:
+    """Yield every cell and row/column dimension that carries a style array."""
+    for sheet in workbook._sheets:
+        if not isinstance(sheet, Worksheet):
+            continue
+        for holder in (sheet._cells.values(), sheet.row_dimensions.values(), sheet.column_dimensions.values()):
+            for obj in holder:
+                if obj._style is not None:
+                    yield obj
+
+def compact_styles(workbook: openpyxl.Workbook, keep_cell_xfs: bool = False) -> Dict[str, Tuple[int, int]]:
+    """Deduplicate equal style records, drop unused ones and renumber the references.
+
+    Cells and row/column dimensions get style arrays pointing into the new
+    tables. With keep_cell_xfs, every cellXfs record keeps its position,
+    because sheets passed through unparsed still refer to them by index;
+    only the font, fill, border, number format, alignment and protection
+    tables are compacted then. Returns (before, after) counts per table.
+    """
+    before = style_counts(workbook)
+    holders = list(_iter_styled(workbook))
+    used = {tuple(obj._style) for obj in holders}
+    old_xfs = list(workbook._cell_styles)
+    # Arrays set since loading are only added to cellXfs as the sheets are written
+    before["cell_xfs"] += len(used - {tuple(array) for array in old_xfs})
+    if keep_cell_xfs:
+        used.update(tuple(array) for array in old_xfs)
+    elif old_xfs:
+        # Cells written without a style attribute use the first record
+        used.add(tuple(old_xfs[0]))
+
+    # StyleArray position -> {old ID: new ID}
+    remaps: Dict[int, Dict[int, int]] = {}
+    for _, attribute, position, reserved in STYLE_TABLES:
+        old = getattr(workbook, attribute)
+        new = IndexedList()
+        remap = {index: new.add(old[index]) for index in range(min(reserved, len(old)))}
+        for index in sorted({array[position] for array in used}):
+            if index not in remap:
+                remap[index] = new.add(old[index]) if index < len(old) else 0
+        setattr(workbook, attribute, new)
+        remaps[position] = remap
+
+    old_formats = workbook._number_formats
+    new_formats = IndexedList()
+    remap = {}
+    for format_id in sorted({array[NUMBER_FORMAT_POSITION] for array in used}):
+        if format_id < BUILTIN_FORMATS_MAX_SIZE or format_id - BUILTIN_FORMATS_MAX_SIZE >= len(old_formats):
+            remap[format_id] = format_id
+            continue
+        code = old_formats[format_id - BUILTIN_FORMATS_MAX_SIZE]
+        if code in BUILTIN_FORMATS_REVERSE:
+            remap[format_id] = BUILTIN_FORMATS_REVERSE[code]
+        else:
+            remap[format_id] = new_formats.add(code) + BUILTIN_FORMATS_MAX_SIZE
+    workbook._number_formats = new_formats
+    remaps[NUMBER_FORMAT_POSITION] = remap
+
+    # Named styles hold their own style objects and re-add them to the new tables
+    for named_style in workbook._named_styles:
+        named_style.bind(workbook)
+
+    renumbered: Dict[tuple, tuple] = {}
+    def renumber(array) -> tuple:
+        key = tuple(array)
+        result = renumbered.get(key)
+        if result is None:
+            values = list(key)
+            for position, remap in remaps.items():
+                values[position] = remap[values[position]]
+            result = renumbered[key] = tuple(values)
+        return result
+
+    if keep_cell_xfs:
+        cell_xfs = IndexedList()
+        for array in old_xfs:
+            list.append(cell_xfs, StyleArray(renumber(array)))
+        # Renumbering can make records equal; each value maps to its first position
+        cell_xfs._dict = {}
+        for index, array in enumerate(cell_xfs):
+            cell_xfs._dict.setdefault(array, index)
+    else:
+        cell_xfs = IndexedList([StyleArray(renumber(old_xfs[0]))] if old_xfs else [StyleArray()])
+    for obj in holders:
+        obj._style = StyleArray(renumber(obj._style))
+        cell_xfs.add(obj._style)
+    workbook._cell_styles = cell_xfs
+
+    after = style_counts(workbook)
+    return {name: (before[name], after[name]) for name in before}
@@ -0,0 +1,73 @@
+from typing import Any, Callable, Optional
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from src.excel.template_cache import WorkerCacheStats, counted_call
+from src import config
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the worker pool and its queue are both full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, retry later")
+        self.retry_after = retry_after
+
+
+class ExcelExecutor:
+    def __init__(self, mode: str = "inline", pool_size: int = 1,
+                 queue_depth: int = 0, retry_after: int = 5):
+        """Initialize executor; "process" mode runs jobs in a bounded process pool."""
+        if mode not in ("inline", "process"):
+            raise ValueError(f"Unknown execution mode '{mode}'")
+        self.mode = mode
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+        self.in_flight = 0
+        # Template caches live in the workers, which report back after each job
+        self.template_cache = WorkerCacheStats(config.TEMPLATE_CACHE_BYTES)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of jobs running or waiting at once."""
+        return self.pool_size + self.queue_depth
+
+    @property
+    def queued(self) -> int:
+        """Number of accepted jobs waiting for a free worker."""
+        return max(0, self.in_flight - self.pool_size)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.pool_size)
+        return self._pool
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run func(*args), off the event loop when in process mode."""
+        if self.mode == "inline":
+            return func(*args)
+
+        if self.in_flight >= self.capacity:
+            raise PoolSaturatedError(self.retry_after)
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, report = await loop.run_in_executor(self._get_pool(), counted_call, func, *args)
+        except Exception as error:
+            report = getattr(error, "template_cache_report", None)
+            if report is not None:
+                self.template_cache.add(report)
+            raise
+        finally:
+            self.in_flight -= 1
+        if report is not None:
+            self.template_cache.add(report)
+        return result
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,252 @@
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import io
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pydantic import TypeAdapter
+from src.schemas.models import Operation
+from src.excel.admission import WorkbookTooLargeError, choose_load_mode
+from src.excel.processor import ExcelProcessor, referenced_sheets
+from src import config
+
+operations_adapter = TypeAdapter(List[Operation])
+
+# Minimum seconds between progress writes; each is a SQLite transaction
+PROGRESS_INTERVAL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    operation_index INTEGER,
+    processing_index INTEGER,
+    completed_steps INTEGER NOT NULL DEFAULT 0,
+    total_steps INTEGER NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+class JobStore:
+    """SQLite-backed job records with inputs and outputs spooled to a directory.
+
+    Worker processes open their own store on the same directory, so the
+    database is the only state shared with the API process.
+    """
+
+    def __init__(self, directory: str, ttl: int):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self.db_path = os.path.join(directory, "jobs.sqlite3")
+        with self._connect() as connection:
+            connection.execute(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for one transaction."""
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def path(self, job_id: str, kind: str) -> str:
+        """Spool file for a job's "input", "operations" or "output"."""
+        extension = "json" if kind == "operations" else "xlsx"
+        return os.path.join(self.directory, f"{job_id}.{kind}.{extension}")
+
+    def create(self, excel_data: bytes, operations: List[Operation]) -> str:
+        """Spool a job's input to disk and record it as queued."""
+        job_id = uuid.uuid4().hex
+        with open(self.path(job_id, "input"), "wb") as file:
+            file.write(excel_data)
+        with open(self.path(job_id, "operations"), "wb") as file:
+            file.write(operations_adapter.dump_json(operations))
+
+        now = time.time()
+        total_steps = sum(len(operation.processing) for operation in operations)
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, total_steps, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, "queued", total_steps, now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Set columns of a job record."""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's status and progress, or None if unknown or expired."""
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["created_at"] + self.ttl < time.time():
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "progress": {
+                "operation_index": row["operation_index"],
+                "processing_index": row["processing_index"],
+                "completed_steps": row["completed_steps"],
+                "total_steps": row["total_steps"],
+            },
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "expires_at": row["created_at"] + self.ttl,
+        }
+
+    def cleanup(self) -> int:
+        """Delete expired jobs and their spool files, returning how many were removed."""
+        cutoff = time.time() - self.ttl
+        with self._connect() as connection:
+            expired = [row["id"] for row in connection.execute(
+                "SELECT id FROM jobs WHERE created_at < ?", (cutoff,))]
+            connection.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+        for job_id in expired:
+            for kind in ("input", "operations", "output"):
+                try:
+                    os.remove(self.path(job_id, kind))
+                except FileNotFoundError:
+                    pass
+        return len(expired)
+
+def run_job(directory: str, ttl: int, job_id: str, load_mode: Optional[str] = None) -> None:
+    """Process a spooled job, recording which Processing step it is on.
+
+    Progress is written at most every PROGRESS_INTERVAL seconds, and with
+    the outcome, so the final record shows the last step that ran.
+    load_mode overrides config.LOAD_MODE. Module-level so it can be sent
+    to worker processes.
+    """
+    store = JobStore(directory, ttl)
+    progress: Dict[str, int] = {}
+    try:
+        with open(store.path(job_id, "operations"), "rb") as file:
+            operations = operations_adapter.validate_json(file.read())
+        store.update(job_id, status="running")
+
+        with open(store.path(job_id, "input"), "rb") as file:
+            lazy = (load_mode or config.LOAD_MODE) == "lazy"
+            sheet_names = referenced_sheets(operations) if lazy else None
+            processor = ExcelProcessor(io.BytesIO(file.read()), sheet_names=sheet_names)
+
+        completed = 0
+        last_write = time.monotonic()
+        for operation_index, operation in enumerate(operations):
+            def on_step(processing_index: int, operation_index: int = operation_index) -> None:
+                nonlocal last_write
+                progress.update(operation_index=operation_index, processing_index=processing_index,
+                                completed_steps=completed + processing_index)
+                now = time.monotonic()
+                if now - last_write >= PROGRESS_INTERVAL:
+                    store.update(job_id, **progress)
+                    last_write = now
+            processor.process_operations(operation.sheet_name, operation.processing, on_step=on_step)
+            completed += len(operation.processing)
+
+        output = processor.save()
+        # Write then rename so a result is never read half-written
+        partial_path = store.path(job_id, "output") + ".partial"
+        with open(partial_path, "wb") as file:
+            file.write(output.getvalue())
+        os.replace(partial_path, store.path(job_id, "output"))
+        store.update(job_id, **{**progress, "status": "succeeded", "completed_steps": completed})
+    except Exception as e:
+        store.update(job_id, **progress, status="failed", error=str(e))
+
+class JobRunner:
+    def __init__(self, store: JobStore, workers: int = 1, use_processes: bool = True,
+                 memory_budget: int = 0):
+        """Initialize a runner that executes stored jobs on a local pool.
+
+        With a memory_budget, each job reserves its estimated memory cost
+        and waits, in arrival order, until it fits beside the running jobs.
+        """
+        self.store = store
+        self.workers = workers
+        self.use_processes = use_processes
+        self.memory_budget = memory_budget
+        self.reserved = 0
+        # (job ID, cost, load mode) of jobs waiting for room in the budget
+        self._waiting: Deque[Tuple[str, int, Optional[str]]] = deque()
+        # Reentrant: a pool may run a done callback, which dispatches, inside submit()
+        self._lock = threading.Condition(threading.RLock())
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._pool = pool_class(max_workers=self.workers)
+        return self._pool
+
+    def submit(self, excel_data: bytes, operations: List[Operation]) -> str:
+        """Store a job and queue it, returning its ID.
+
+        Raises WorkbookTooLargeError, before storing anything, if the job
+        cannot fit the memory budget even when loaded lazily.
+        """
+        load_mode, cost = None, 0
+        if self.memory_budget > 0:
+            load_mode, cost = choose_load_mode(excel_data, referenced_sheets(operations), self.memory_budget)
+            if cost > self.memory_budget:
+                raise WorkbookTooLargeError(cost, self.memory_budget)
+        self.store.cleanup()
+        job_id = self.store.create(excel_data, operations)
+        with self._lock:
+            self._waiting.append((job_id, cost, load_mode))
+            self._dispatch()
+        return job_id
+
+    def _dispatch(self) -> None:
+        """Start waiting jobs, in order, while the next one fits the budget."""
+        with self._lock:
+            while self._waiting:
+                job_id, cost, load_mode = self._waiting[0]
+                if self.memory_budget > 0 and self.reserved + cost > self.memory_budget:
+                    break
+                self._waiting.popleft()
+                try:
+                    future = self._get_pool().submit(run_job, self.store.directory, self.store.ttl,
+                                                     job_id, load_mode)
+                except Exception as e:
+                    # A broken pool; fail the job rather than leave it queued forever
+                    self.store.update(job_id, status="failed", error=str(e))
+                    continue
+                self.reserved += cost
+                future.add_done_callback(
+                    lambda done, job_id=job_id, cost=cost: self._finish(job_id, cost, done))
+
+    def _finish(self, job_id: str, cost: int, future: Future) -> None:
+        """Return a finished job's reservation and start the jobs that now fit."""
+        self._record_crash(job_id, future)
+        with self._lock:
+            self.reserved -= cost
+            self._dispatch()
+            self._lock.notify_all()
+
+    def _record_crash(self, job_id: str, future: Future) -> None:
+        """Mark a job failed if its worker died before recording an outcome."""
+        error = future.exception() if not future.cancelled() else None
+        if error is not None:
+            self.store.update(job_id, status="failed", error=str(error))
+
+    def shutdown(self) -> None:
+        """Start the jobs still waiting for the memory budget, then stop the worker pool."""
+        with self._lock:
+            self._lock.wait_for(lambda: not self._waiting)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,200 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from copy import copy
+from openpyxl.cell.cell import MergedCell
+from openpyxl.styles import Border
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+
+# (min_row, min_col, max_row, max_col)
+Bounds = Tuple[int, int, int, int]
+
+BAND_ROWS = 64
+# Ranges spanning more bands than this are checked against every query instead
+MAX_BANDS = 64
+
+def bounds_of(cell_range: CellRange) -> Bounds:
+    return cell_range.min_row, cell_range.min_col, cell_range.max_row, cell_range.max_col
+
+def _intersects(a: Bounds, b: Bounds) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class RangeIndex:
+    """Cell ranges bucketed by band of rows, to find the ones a range intersects.
+
+    Each range is listed under every band of BAND_ROWS rows it covers, so a
+    query only looks at ranges near it. Ranges are tracked by identity and
+    may be moved in place, as shifting rows or columns does, then re-filed
+    with move().
+    """
+
+    def __init__(self, ranges: Iterable[CellRange] = ()):
+        self._bands: Dict[int, Dict[int, CellRange]] = {}
+        self._tall: Dict[int, CellRange] = {}
+        # id(range) -> (first band, last band) it is filed under, or None if tall
+        self._placed: Dict[int, Optional[Tuple[int, int]]] = {}
+        for cell_range in ranges:
+            self.add(cell_range)
+
+    def __len__(self) -> int:
+        return len(self._placed)
+
+    def add(self, cell_range: CellRange) -> None:
+        first, last = cell_range.min_row // BAND_ROWS, cell_range.max_row // BAND_ROWS
+        if last - first >= MAX_BANDS:
+            self._tall[id(cell_range)] = cell_range
+            self._placed[id(cell_range)] = None
+            return
+        for band in range(first, last + 1):
+            self._bands.setdefault(band, {})[id(cell_range)] = cell_range
+        self._placed[id(cell_range)] = (first, last)
+
+    def discard(self, cell_range: CellRange) -> None:
+        if id(cell_range) not in self._placed:
+            return
+        placed = self._placed.pop(id(cell_range))
+        if placed is None:
+            del self._tall[id(cell_range)]
+            return
+        for band in range(placed[0], placed[1] + 1):
+            members = self._bands[band]
+            del members[id(cell_range)]
+            if not members:
+                del self._bands[band]
+
+    def move(self, cell_range: CellRange) -> None:
+        """Re-file a range whose bounds were changed in place."""
+        self.discard(cell_range)
+        self.add(cell_range)
+
+    def intersecting(self, bounds: Bounds) -> List[CellRange]:
+        """Return the indexed ranges that share at least one cell with bounds."""
+        first, last = bounds[0] // BAND_ROWS, bounds[2] // BAND_ROWS
+        if last - first < len(self._bands):
+            bands = (self._bands.get(band) for band in range(first, last + 1))
+        else:
+            bands = (members for band, members in self._bands.items() if first <= band <= last)
+        found: Dict[int, CellRange] = {}
+        for members in bands:
+            if members:
+                found.update(members)
+        found.update(self._tall)
+        return [cell_range for cell_range in found.values() if _intersects(bounds_of(cell_range), bounds)]
+
+# Worksheet attribute holding (the MultiCellRange the index was built from,
+# index). It lives on the sheet, so it is collected with its workbook;
+# copies of a sheet must drop it.
+INDEX_ATTRIBUTE = "_merge_index"
+
+def merge_index(sheet: Worksheet) -> RangeIndex:
+    """Return the index of a sheet's merged ranges, building it on first use.
+
+    The index is rebuilt if the merged ranges were replaced or changed
+    without going through this module or the shift engine.
+    """
+    cached = getattr(sheet, INDEX_ATTRIBUTE, None)
+    if cached is not None and cached[0] is sheet.merged_cells and len(cached[1]) == len(sheet.merged_cells.ranges):
+        return cached[1]
+    index = RangeIndex(sheet.merged_cells.ranges)
+    setattr(sheet, INDEX_ATTRIBUTE, (sheet.merged_cells, index))
+    return index
+
+def update_merge_index(sheet: Worksheet, moved: Sequence[CellRange], removed: Sequence[CellRange]) -> None:
+    """Follow a shift that moved some merged ranges and dropped others, if the sheet is indexed."""
+    cached = getattr(sheet, INDEX_ATTRIBUTE, None)
+    if cached is None:
+        return
+    index = cached[1]
+    for cell_range in removed:
+        index.discard(cell_range)
+    for cell_range in moved:
+        index.move(cell_range)
+    setattr(sheet, INDEX_ATTRIBUTE, (sheet.merged_cells, index))
+
+def merge_ranges(sheet: Worksheet, ranges: Sequence[Bounds]) -> int:
+    """Merge many ranges at once and return how many new merges were made.
+
+    Every range is checked for overlap, with existing merges and with the
+    other ranges, before any is merged; a range that is already merged
+    exactly is left as it is and single cells are skipped. As with
+    openpyxl's merge_cells, the cells other than the top-left one are
+    replaced by MergedCells that carry its outer borders and protection.
+    """
+    index = merge_index(sheet)
+    batch = RangeIndex()
+    pending: List[CellRange] = []
+    for bounds in ranges:
+        if bounds[0] == bounds[2] and bounds[1] == bounds[3]:
+            continue
+        cell_range = CellRange(min_row=bounds[0], min_col=bounds[1], max_row=bounds[2], max_col=bounds[3])
+        existing = index.intersecting(bounds)
+        if len(existing) == 1 and bounds_of(existing[0]) == bounds:
+            continue
+        clash = existing or batch.intersecting(bounds)
+        if clash:
+            raise ValueError(f"Cannot merge {cell_range.coord}: it overlaps merged range {clash[0].coord}")
+        batch.add(cell_range)
+        pending.append(cell_range)
+
+    # (top-left style, edge position) -> MergedCell style array, shared by the batch
+    resolved: Dict[tuple, StyleArray] = {}
+    for cell_range in pending:
+        merged = MergedCellRange(sheet, cell_range.coord)
+        _fill_merged_cells(sheet, merged, resolved)
+        sheet.merged_cells.ranges.add(merged)
+        index.add(merged)
+    # Keep the cached index valid for the grown set
+    setattr(sheet, INDEX_ATTRIBUTE, (sheet.merged_cells, index))
+    return len(pending)
+
+def _fill_merged_cells(sheet: Worksheet, merged: MergedCellRange, resolved: Dict[tuple, StyleArray]) -> None:
+    """Replace a merge's cells with MergedCells styled as MergedCellRange.format() would."""
+    start = merged.start_cell
+    start_style = tuple(start._style) if start._style is not None else None
+    min_row, min_col, max_row, max_col = bounds_of(merged)
+    cells = sheet._cells
+    for row in range(min_row, max_row + 1):
+        for col in range(min_col, max_col + 1):
+            if row == min_row and col == min_col:
+                continue
+            position = (row == min_row, col == min_col, col == max_col, row == max_row)
+            style = resolved.get((start_style, position))
+            if style is None:
+                # Edge cells take the top-left cell's border on their outer sides
+                prototype = MergedCell(sheet, row=row, column=col)
+                for name, on_edge in zip(("top", "left", "right", "bottom"), position):
+                    side = getattr(start.border, name)
+                    if on_edge and side is not None and side.style is not None:
+                        prototype.border += Border(**{name: side})
+                if prototype._style is None:
+                    prototype._style = StyleArray()
+                if start._style is not None:
+                    prototype._style.protectionId = start._style.protectionId
+                style = resolved[(start_style, position)] = prototype._style
+            cell = cells[(row, col)] = MergedCell(sheet, row=row, column=col)
+            cell._style = copy(style)
+
+def unmerge_ranges(sheet: Worksheet, ranges: Sequence[Bounds]) -> int:
+    """Unmerge every merged range that intersects one of ranges; returns how many were.
+
+    The MergedCells are removed, leaving the top-left cell with its value
+    and style, as openpyxl's unmerge_cells does.
+    """
+    index = merge_index(sheet)
+    found: Dict[int, CellRange] = {}
+    for bounds in ranges:
+        for merged in index.intersecting(bounds):
+            found[id(merged)] = merged
+
+    cells = sheet._cells
+    for merged in found.values():
+        index.discard(merged)
+        sheet.merged_cells.ranges.discard(merged)
+        min_row, min_col, max_row, max_col = bounds_of(merged)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                if row != min_row or col != min_col:
+                    cells.pop((row, col), None)
+    setattr(sheet, INDEX_ATTRIBUTE, (sheet.merged_cells, index))
+    return len(found)
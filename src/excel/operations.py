@@ -1,105 +1,183 @@
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Set, Union
+from copy import copy
 import openpyxl
-from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.cell import coordinate_from_string
 from openpyxl.styles import PatternFill, Font, Border, Side, Alignment
 from src.schemas.models import Processing
-from src.excel.utils import apply_styles, get_cell_range
-from openpyxl.worksheet.dimensions import RowDimension, ColumnDimension
+from src.excel.utils import (apply_styles, get_cell_range, StyleCache, iter_bulk_rows, write_rows, SheetRange, IndexRange,
+                             is_row_target, clone_worksheet, iter_block_cells, update_row_dimensions,
+                             update_column_dimensions)
+from src.excel.shift import apply_shifts
+from src.excel.merges import Bounds, merge_ranges, unmerge_ranges
 
 class xlsx_operation:
     def __init__(self, workbook: openpyxl.Workbook):
         """Initialize xlsx_operation with a workbook."""
         self.workbook = workbook
+        self.style_cache = StyleCache()
+        # Sheets whose content may have changed, for passthrough saving
+        self.touched_sheets: Set[str] = set()
 
     def copy_cells(self, sheet_name: str, process: Processing) -> None:
         """Copy cells from source to target location."""
         if not process.target or not process.paste_target:
             raise ValueError("Both target and paste_target are required for copy operation")
+        self.touched_sheets.add(process.paste_target.sheet_name)
+        self._paste_block(sheet_name, process, with_values=True)
 
+    def _paste_block(self, sheet_name: str, process: Processing, with_values: bool) -> None:
+        """Copy the styles, and values if with_values, of a block of cells.
+
+        Only cells that exist in the source are read, and they are read
+        before anything is written, so the target may overlap the source.
+        With paste_target.tile the block is repeated to fill the paste
+        target's cells, cropping at its edges.
+        """
         source_sheet = self.workbook[sheet_name]
         target_sheet = self.workbook[process.paste_target.sheet_name]
-        
-        source_range = get_cell_range(process.target.cells)
-        target_range = get_cell_range(process.paste_target.cells)
-        
-        for i in range(len(source_range['rows'])):
-            for j in range(len(source_range['cols'])):
-                source_row = source_range['rows'][i]
-                source_col = source_range['cols'][j]
-                target_row = target_range['rows'][i]
-                target_col = target_range['cols'][j]
-                
-                source_cell = source_sheet.cell(row=source_row, column=source_col)
-                
-                target_cell = target_sheet.cell(row=target_row, column=target_col)
-                target_cell.value = source_cell.value
-                
-                apply_styles(source_cell, target_cell)
+
+        source_range = get_cell_range(process.target.cells, source_sheet)
+        target_range = get_cell_range(process.paste_target.cells, target_sheet)
+        height, width = len(source_range.rows), len(source_range.cols)
+        if not height or not width:
+            return
+        first_row, first_col = target_range.rows.first, target_range.cols.first
+        if process.paste_target.tile:
+            if not process.paste_target.cells.end_cell:
+                raise ValueError("paste_target cells need an end_cell to tile into")
+            rows, cols = target_range.rows, target_range.cols
+        else:
+            rows = IndexRange(first_row, first_row + height - 1)
+            cols = IndexRange(first_col, first_col + width - 1)
+
+        # Offset within the block -> (value, data_type, style array)
+        block = {}
+        for (row, col), cell in iter_block_cells(source_sheet, source_range.rows, source_range.cols):
+            if cell.has_style or (with_values and cell._value is not None):
+                block[(row - source_range.rows.first, col - source_range.cols.first)] = (
+                    cell._value, cell.data_type, cell._style)
+
+        # Target cells the block leaves empty are cleared
+        for (row, col), cell in iter_block_cells(target_sheet, rows, cols):
+            if ((row - first_row) % height, (col - first_col) % width) not in block:
+                if with_values and not isinstance(cell, MergedCell):
+                    cell._value = None
+                    cell.data_type = "n"
+                cell._style = None
+
+        cells = target_sheet._cells
+        for (row_offset, col_offset), (value, data_type, style) in block.items():
+            for row in range(first_row + row_offset, rows.last + 1, height):
+                for col in range(first_col + col_offset, cols.last + 1, width):
+                    cell = cells.get((row, col))
+                    if cell is None:
+                        cell = cells[(row, col)] = Cell(target_sheet, row=row, column=col)
+                    if with_values and not isinstance(cell, MergedCell):
+                        cell._value = value
+                        cell.data_type = data_type
+                    cell._style = copy(style) if style is not None else None
+        if rows.last is not None:
+            target_sheet._current_row = max(target_sheet._current_row, rows.last)
 
     def set_cells(self, sheet_name: str, process: Processing) -> None:
         """Set cell values and styles."""
         if not process.target:
             raise ValueError("Target is required for set_cells operation")
+        self.touched_sheets.add(sheet_name)
 
         sheet = self.workbook[sheet_name]
-        cell_range = get_cell_range(process.target.cells)
+        cell_range = get_cell_range(process.target.cells, sheet)
         
         # Set values if provided
-        if process.target.values:
-            for i, row_values in enumerate(process.target.values):
-                for j, value in enumerate(row_values):
-                    cell = sheet.cell(
-                        row=cell_range['rows'][0] + i,
-                        column=cell_range['cols'][0] + j
-                    )
-                    cell.value = value
+        rows = iter_bulk_rows(process.target)
+        if rows:
+            write_rows(sheet, cell_range.rows[0], cell_range.cols[0], rows)
 
         # Set styles if provided
         if process.target.styles:
             self._apply_styles_to_range(sheet, cell_range, process.target.styles)
 
-    def _apply_styles_to_range(self, sheet, cell_range: Dict[str, List[int]], styles: Dict[str, Any]) -> None:
+    def _apply_styles_to_range(self, sheet, cell_range: SheetRange, styles: Dict[str, Any]) -> None:
         """Apply styles to a range of cells."""
         # Apply row height if specified
         if 'row_height' in styles:
-            for row in cell_range['rows']:
-                dim = RowDimension(worksheet=sheet, index=row, height=float(styles['row_height']))
-                sheet.row_dimensions[row] = dim
+            update_row_dimensions(sheet, cell_range.rows, height=float(styles['row_height']))
         
         # Apply column width if specified
         if 'column_width' in styles:
-            for col in cell_range['cols']:
-                col_letter = get_column_letter(col)
-                dim = ColumnDimension(worksheet=sheet, index=col_letter, width=float(styles['column_width']))
-                sheet.column_dimensions[col_letter] = dim
+            update_column_dimensions(sheet, cell_range.cols, width=float(styles['column_width']))
         
-        for row in cell_range['rows']:
-            for col in cell_range['cols']:
+        rows = cell_range.rows
+        cols = cell_range.cols
+        if not rows or not cols:
+            return
+
+        # Work out everything that does not depend on the cell once up front
+        other_styles = {k: v for k, v in styles.items()
+                        if k not in ['border', 'cells', 'row_height', 'column_width']}
+        overrides = self._cell_style_overrides(styles.get('cells'))
+        border_styles = styles.get('border')
+        borders: Dict[tuple, Optional[Border]] = {}
+
+        first_row, last_row = rows[0], rows[-1]
+        first_col, last_col = cols[0], cols[-1]
+
+        # Each distinct (position class, starting style) resolves to one style
+        # array, so most cells only need a lookup and an array copy
+        resolved: Dict[tuple, Any] = {}
+        for row in rows:
+            is_top = row == first_row
+            is_bottom = row == last_row
+            for col in cols:
                 cell = sheet.cell(row=row, column=col)
-                
-                # Apply individual cell styles
-                if 'cells' in styles:
-                    cell_style = styles['cells'].get(f"{get_column_letter(col)}{row}")
-                    if cell_style:
-                        apply_styles(None, cell, cell_style)
-                
-                # Apply border styles
-                if 'border' in styles:
-                    self._apply_border_styles(cell, styles['border'], row, col, cell_range)
-                
-                # Apply other styles (excluding row_height and column_width)
-                style_without_dimensions = {k: v for k, v in styles.items() 
-                                        if k not in ['border', 'cells', 'row_height', 'column_width']}
-                if style_without_dimensions:
-                    apply_styles(None, cell, style_without_dimensions)
-
-    def _apply_border_styles(self, cell, border_styles: Dict[str, Any], row: int, col: int, cell_range: Dict[str, List[int]]) -> None:
-        """Apply border styles to a cell based on its position in the range."""
-        is_top = row == cell_range['rows'][0]
-        is_bottom = row == cell_range['rows'][-1]
-        is_left = col == cell_range['cols'][0]
-        is_right = col == cell_range['cols'][-1]
+                position = (is_top, is_bottom, col == first_col, col == last_col)
+                if position not in borders:
+                    borders[position] = self._build_border(border_styles, *position) if border_styles else None
+
+                override = overrides.get((row, col))
+                if override is not None:
+                    self._style_cell(cell, override, borders[position], other_styles)
+                    continue
+
+                current = cell._style
+                key = (position, tuple(current) if current is not None else None)
+                array = resolved.get(key)
+                if array is None:
+                    self._style_cell(cell, None, borders[position], other_styles)
+                    resolved[key] = copy(cell._style)
+                else:
+                    cell._style = copy(array)
 
+    def _style_cell(self, cell, cell_style: Optional[Dict[str, Any]], border: Optional[Border],
+                    other_styles: Dict[str, Any]) -> None:
+        """Apply per-cell override, position border and range styles to one cell, in that order."""
+        if cell_style:
+            apply_styles(None, cell, cell_style, self.style_cache)
+        if border is not None:
+            cell.border = border
+        if other_styles:
+            apply_styles(None, cell, other_styles, self.style_cache)
+
+    def _cell_style_overrides(self, cell_styles: Optional[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+        """Map the 'cells' style overrides from coordinates to (row, col)."""
+        overrides = {}
+        for coord, cell_style in (cell_styles or {}).items():
+            if not cell_style:
+                continue
+            try:
+                col_letter, row = coordinate_from_string(coord)
+            except ValueError:
+                continue
+            # Only exact upper-case coordinates have ever matched
+            if f"{col_letter}{row}" == coord:
+                overrides[(row, column_index_from_string(col_letter))] = cell_style
+        return overrides
+
+    def _build_border(self, border_styles: Dict[str, Any], is_top: bool, is_bottom: bool,
+                      is_left: bool, is_right: bool) -> Optional[Border]:
+        """Build the border for a position class in the range, or None if it has no sides."""
         border_sides = {}
         if is_top and border_styles.get('top'):
             border_sides['top'] = Side(**border_styles['top'])
@@ -111,105 +189,180 @@ class xlsx_operation:
             border_sides['right'] = Side(**border_styles['right'])
 
         if border_sides:
-            cell.border = Border(**border_sides)
+            return Border(**border_sides)
+        return None
     
 
     def copy_sheet(self, sheet_name: str, process: Processing) -> None:
-        """Copy entire sheet."""
+        """Copy entire sheet, once or into several copies at a time.
+
+        target.sheet_names gives the copies' titles; otherwise target.count
+        copies (default 1) are named "<sheet>_copy", "<sheet>_copy1", ...
+        """
         if sheet_name not in self.workbook.sheetnames:
             raise ValueError(f"Sheet '{sheet_name}' not found")  # Removed period, changed message
-                
-        source = self.workbook[sheet_name]
-        target = self.workbook.copy_worksheet(source)
-        target.title = f"{sheet_name}_copy"
+
+        target = process.target
+        if target and target.sheet_names:
+            titles = target.sheet_names
+            for title in titles:
+                if title in self.workbook.sheetnames:
+                    raise ValueError(f"Sheet {title} already exists")
+            if len(set(titles)) != len(titles):
+                raise ValueError("Duplicate sheet names for copy_sheet")
+        else:
+            count = target.count if target and target.count is not None else 1
+            if count < 1:
+                raise ValueError("copy_sheet count must be at least 1")
+            titles = []
+            taken = set(self.workbook.sheetnames)
+            for _ in range(count):
+                title, index = f"{sheet_name}_copy", 0
+                while title in taken:
+                    index += 1
+                    title = f"{sheet_name}_copy{index}"
+                taken.add(title)
+                titles.append(title)
+
+        for copied in clone_worksheet(self.workbook[sheet_name], titles):
+            self.touched_sheets.add(copied.title)
 
     def copy_style(self, sheet_name: str, process: Processing) -> None:
         """Copy cell styles from source to target location."""
         if not process.target or not process.paste_target:
             raise ValueError("Both target and paste_target are required for copy_style operation")
-
-        source_sheet = self.workbook[sheet_name]
-        target_sheet = self.workbook[process.paste_target.sheet_name]
-        
-        source_range = get_cell_range(process.target.cells)
-        paste_start = process.paste_target.cells["starting_point"]
-        
-        for i, row in enumerate(source_range['rows']):
-            for j, col in enumerate(source_range['cols']):
-                source_cell = source_sheet.cell(row=row, column=col)
-                target_cell = target_sheet.cell(
-                    row=paste_start.row + i,
-                    column=column_index_from_string(paste_start.col_letter) + j
-                )
-                apply_styles(source_cell, target_cell)
+        self.touched_sheets.add(process.paste_target.sheet_name)
+        self._paste_block(sheet_name, process, with_values=False)
 
     def insert_sheet(self, sheet_name: str, process: Processing) -> None:
         """Insert a new sheet."""
         if sheet_name in self.workbook.sheetnames:
             raise ValueError(f"Sheet {sheet_name} already exists")
         self.workbook.create_sheet(sheet_name)
+        self.touched_sheets.add(sheet_name)
 
     def delete_sheet(self, sheet_name: str, process: Processing) -> None:
         """Delete specified sheet."""
         if sheet_name not in self.workbook.sheetnames:
             raise ValueError(f"Sheet {sheet_name} does not exist")
         del self.workbook[sheet_name]
+        self.touched_sheets.add(sheet_name)
 
     def insert_rows_or_cols(self, sheet_name: str, process: Processing) -> None:
         """Insert rows or columns."""
-        if not process.target or not process.target.cells:
-            raise ValueError("Target cells are required for insert operation")
-
-        sheet = self.workbook[sheet_name]
-        cell_range = get_cell_range(process.target.cells)
-        
-        if process.target.cells.start_cell.row and not process.target.cells.start_cell.col_letter:
-            # Insert rows
-            sheet.insert_rows(cell_range['rows'][0], len(cell_range['rows']))
-        else:
-            # Insert columns
-            sheet.insert_cols(cell_range['cols'][0], len(cell_range['cols']))
+        self.shift_rows_or_cols(sheet_name, [process])
 
     def delete_rows_or_cols(self, sheet_name: str, process: Processing) -> None:
         """Delete rows or columns."""
-        if not process.target or not process.target.cells:
-            raise ValueError("Target cells are required for delete operation")
+        self.shift_rows_or_cols(sheet_name, [process])
 
+    def shift_rows_or_cols(self, sheet_name: str, processing: List[Processing]) -> None:
+        """Apply consecutive insert/delete operations on one axis in a single pass."""
         sheet = self.workbook[sheet_name]
-        cell_range = get_cell_range(process.target.cells)
-        
-        if process.target.cells.start_cell.row and not process.target.cells.start_cell.col_letter:
-            # Delete rows
-            sheet.delete_rows(cell_range['rows'][0], len(cell_range['rows']))
-        else:
-            # Delete columns
-            sheet.delete_cols(cell_range['cols'][0], len(cell_range['cols']))
+        self.touched_sheets.add(sheet_name)
+        shifts = []
+        is_rows = None
+        for process in processing:
+            if not process.target or not process.target.cells:
+                raise ValueError(f"Target cells are required for {process.processing_type} operation")
+
+            process_is_rows = is_row_target(process.target.cells)
+            if is_rows is not None and process_is_rows != is_rows:
+                raise ValueError("Batched insert/delete operations must all target rows or all columns")
+            is_rows = process_is_rows
+
+            cell_range = get_cell_range(process.target.cells, sheet)
+            indices = cell_range.rows if is_rows else cell_range.cols
+            if not indices:
+                raise ValueError(f"Target cells are required for {process.processing_type} operation")
+            amount = len(indices) if process.processing_type == "insert" else -len(indices)
+            shifts.append((indices.first, amount))
+
+        apply_shifts(sheet, shifts, is_rows)
 
     def hide_rows_or_cols(self, sheet_name: str, process: Processing) -> None:
         """Hide rows or columns."""
         if not process.target or not process.target.cells:
             raise ValueError("Target cells are required for hide operation")
+        self.touched_sheets.add(sheet_name)
 
         sheet = self.workbook[sheet_name]
-        cell_range = get_cell_range(process.target.cells)
+        cell_range = get_cell_range(process.target.cells, sheet)
         
-        if process.target.cells.start_cell.row and not process.target.cells.start_cell.col_letter:
-            # Hide rows
-            for row in cell_range['rows']:
-                sheet.row_dimensions[row].hidden = True
+        if is_row_target(process.target.cells):
+            update_row_dimensions(sheet, cell_range.rows, hidden=True)
         else:
-            # Hide columns
-            for col in cell_range['cols']:
-                sheet.column_dimensions[get_column_letter(col)].hidden = True
-                
+            update_column_dimensions(sheet, cell_range.cols, hidden=True)
+
+    def group_rows_or_cols(self, sheet_name: str, process: Processing) -> None:
+        """Group rows or columns under an outline, optionally collapsed.
+
+        Collapsing hides the group and marks the row below (or column to
+        the right of) it, where Excel shows the expand button; a group
+        that is not collapsed is shown expanded and its neighbour is left
+        alone.
+        """
+        if not process.target or not process.target.cells:
+            raise ValueError("Target cells are required for group operation")
+        self.touched_sheets.add(sheet_name)
+
+        sheet = self.workbook[sheet_name]
+        cell_range = get_cell_range(process.target.cells, sheet)
+        outline_level = process.target.outline_level or 1
+        if not 1 <= outline_level <= 7:
+            raise ValueError("outline_level must be between 1 and 7")
+        collapsed = bool(process.target.collapsed)
+
+        is_rows = is_row_target(process.target.cells)
+        indices = cell_range.rows if is_rows else cell_range.cols
+        if not indices:
+            return
+        update = update_row_dimensions if is_rows else update_column_dimensions
+        update(sheet, indices, outline_level=outline_level, hidden=collapsed)
+        # Record the outline depth Excel sizes its gutter by; openpyxl derives neither
+        # on save and replaces outlineLevelCol with column_dimensions.max_outline,
+        # which it only works out later, while writing <cols>
+        if is_rows:
+            sheet.sheet_format.outlineLevelRow = max(sheet.sheet_format.outlineLevelRow or 0, outline_level)
+        else:
+            depth = max(sheet.sheet_format.outlineLevelCol or 0, outline_level)
+            sheet.sheet_format.outlineLevelCol = sheet.column_dimensions.max_outline = depth
+        if collapsed:
+            update(sheet, IndexRange(indices.last + 1, indices.last + 1), collapsed=True)
+
     def join_cells(self, sheet_name: str, process: Processing) -> None:
         """Merge cells in the specified range."""
         if not process.target or not process.target.cells:
             raise ValueError("Target cells are required for join_cells operation")
+        self.touched_sheets.add(sheet_name)
 
         sheet = self.workbook[sheet_name]
-        cell_range = get_cell_range(process.target.cells)
-        
-        start_cell = f"{get_column_letter(cell_range['cols'][0])}{cell_range['rows'][0]}"
-        end_cell = f"{get_column_letter(cell_range['cols'][-1])}{cell_range['rows'][-1]}"
-        sheet.merge_cells(f"{start_cell}:{end_cell}")
\ No newline at end of file
+        merge_ranges(sheet, self._range_bounds(sheet, [process.target.cells]))
+
+    def merge_cells(self, sheet_name: str, process: Processing) -> None:
+        """Merge every range in target.ranges, rejecting the batch if any overlap."""
+        if not process.target or not (process.target.ranges or process.target.cells):
+            raise ValueError("Target ranges are required for merge_cells operation")
+        self.touched_sheets.add(sheet_name)
+
+        sheet = self.workbook[sheet_name]
+        merge_ranges(sheet, self._range_bounds(sheet, process.target.ranges or [process.target.cells]))
+
+    def unmerge_cells(self, sheet_name: str, process: Processing) -> None:
+        """Unmerge every merged range that intersects one of target.ranges."""
+        if not process.target or not (process.target.ranges or process.target.cells):
+            raise ValueError("Target ranges are required for unmerge_cells operation")
+        self.touched_sheets.add(sheet_name)
+
+        sheet = self.workbook[sheet_name]
+        unmerge_ranges(sheet, self._range_bounds(sheet, process.target.ranges or [process.target.cells]))
+
+    def _range_bounds(self, sheet, cell_ranges) -> List[Bounds]:
+        """Convert CellRanges to (min_row, min_col, max_row, max_col), skipping empty ones."""
+        bounds = []
+        for cell_range in cell_ranges:
+            sheet_range = get_cell_range(cell_range, sheet)
+            if sheet_range.rows and sheet_range.cols:
+                bounds.append((sheet_range.rows.first, sheet_range.cols.first,
+                               sheet_range.rows.last, sheet_range.cols.last))
+        return bounds
@@ -0,0 +1,386 @@
+from typing import Dict, Set, List, Optional, Tuple, Iterable
+import io
+import posixpath
+import re
+import zipfile
+from copy import copy
+from datetime import datetime
+from xml.etree import ElementTree
+import openpyxl
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet.dimensions import DimensionHolder
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.datavalidation import DataValidationList
+from openpyxl.worksheet.table import TableList
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from src.excel.merges import INDEX_ATTRIBUTE
+
+PACKAGE_RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CONTENT_TYPES_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+DOC_RELS_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+SHARED_STRINGS_TYPE = DOC_RELS_NS + "/sharedStrings"
+
+# Sheet-owned parts that can be copied as-is: nothing outside the sheet's own
+# relationships refers to them by id or position
+PASSTHROUGH_REL_TYPES = {
+    "drawing", "image", "chart", "chartUserShapes", "comments", "vmlDrawing",
+    "printerSettings", "hyperlink", "chartStyle", "chartColorStyle", "themeOverride",
+}
+
+# Output compression strategies: (ZIP method, zlib level)
+COMPRESSION_LEVELS: Dict[str, Tuple[int, Optional[int]]] = {
+    "stored": (zipfile.ZIP_STORED, None),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "default": (zipfile.ZIP_DEFLATED, None),
+    "best": (zipfile.ZIP_DEFLATED, 9),
+}
+
+class LazyWorksheet(Worksheet):
+    """Placeholder for a worksheet left unparsed in the input archive.
+
+    It has no cells; on save its original parts are copied through. The
+    title may change and the sheet may be deleted, but its content can
+    only be reached by loading the workbook with the sheet included.
+    """
+
+    def __init__(self, parent: openpyxl.Workbook, title: str):
+        super().__init__(parent, title)
+        self.source_title = title
+
+class Package:
+    """Minimal read-only view of an xlsx archive's part graph."""
+
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive = archive
+        self.names = set(archive.namelist())
+        self.workbook_part = self._workbook_part()
+        self.sheets = self._sheet_parts()
+
+    def read(self, name: str) -> bytes:
+        return self.archive.read(name)
+
+    def rels(self, part: str) -> List[Tuple[str, str, Optional[str]]]:
+        """Return (type, target part, target mode) for each relationship of a part."""
+        rels_name = rels_path(part)
+        if rels_name not in self.names:
+            return []
+        root = ElementTree.fromstring(self.read(rels_name))
+        result = []
+        for rel in root.findall(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+            mode = rel.get("TargetMode")
+            target = rel.get("Target")
+            if mode != "External":
+                target = resolve_target(part, target)
+            result.append((rel.get("Type"), target, mode))
+        return result
+
+    def _workbook_part(self) -> str:
+        for rel_type, target, _ in self.rels(""):
+            if rel_type.endswith("/officeDocument"):
+                return target
+        return "xl/workbook.xml"
+
+    def _sheet_parts(self) -> Dict[str, str]:
+        """Map sheet names to their worksheet part names."""
+        targets = {}
+        root = ElementTree.fromstring(self.read(rels_path(self.workbook_part)))
+        for rel in root.findall(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+            if rel.get("Type").endswith("/worksheet"):
+                targets[rel.get("Id")] = resolve_target(self.workbook_part, rel.get("Target"))
+
+        sheets = {}
+        root = ElementTree.fromstring(self.read(self.workbook_part))
+        for sheet in root.iter(f"{{{MAIN_NS}}}sheet"):
+            rel_id = sheet.get(f"{{{DOC_RELS_NS}}}id")
+            if rel_id in targets:
+                sheets[sheet.get("name")] = targets[rel_id]
+        return sheets
+
+    def closure(self, part: str) -> Optional[Set[str]]:
+        """Parts reachable from part (excluding it), or None if any is not copyable."""
+        seen: Set[str] = set()
+        pending = [part]
+        while pending:
+            for rel_type, target, mode in self.rels(pending.pop()):
+                if rel_type.rsplit("/", 1)[-1] not in PASSTHROUGH_REL_TYPES:
+                    return None
+                if mode == "External" or target in seen:
+                    continue
+                if target not in self.names:
+                    return None
+                seen.add(target)
+                pending.append(target)
+        return seen
+
+    def shared_strings_part(self) -> Optional[str]:
+        for rel_type, target, _ in self.rels(self.workbook_part):
+            if rel_type == SHARED_STRINGS_TYPE and target in self.names:
+                return target
+        return None
+
+def rels_path(part: str) -> str:
+    """Return the relationships part name for a part ("" is the package root)."""
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+def resolve_target(source: str, target: str) -> str:
+    """Resolve a relationship target against its source part."""
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+
+def passthrough_sheets(excel_data: bytes) -> Set[str]:
+    """Names of the worksheets whose parts can be copied through on save."""
+    package = Package(zipfile.ZipFile(io.BytesIO(excel_data)))
+    return {name for name, part in package.sheets.items() if package.closure(part) is not None}
+
+class _LazyReader(ExcelReader):
+    """ExcelReader that leaves some worksheets unparsed as LazyWorksheets."""
+
+    def __init__(self, excel_data: bytes, lazy_sheets: Set[str]):
+        super().__init__(io.BytesIO(excel_data))
+        self.lazy_sheets = lazy_sheets
+
+    def read_worksheets(self):
+        sheets = list(self.parser.find_sheets())
+        self.parser.find_sheets = lambda: (
+            (sheet, rel) for sheet, rel in sheets if sheet.name not in self.lazy_sheets
+        )
+        try:
+            super().read_worksheets()
+        finally:
+            del self.parser.find_sheets
+
+        for sheet, rel in sheets:
+            if sheet.name in self.lazy_sheets:
+                ws = LazyWorksheet(self.wb, sheet.name)
+                ws.sheet_state = sheet.state
+                self.wb._sheets.append(ws)
+        # Restore the archive order, which sheet-scoped defined names index into
+        order = {sheet.name: index for index, (sheet, rel) in enumerate(sheets)}
+        self.wb._sheets.sort(key=lambda ws: order.get(ws.title, len(order)))
+
+def load_workbook_lazily(excel_data: bytes, sheet_names: Iterable[str]) -> openpyxl.Workbook:
+    """Load a workbook, parsing only the named sheets and sheets that cannot be passed through."""
+    lazy_sheets = passthrough_sheets(excel_data) - set(sheet_names)
+    reader = _LazyReader(excel_data, lazy_sheets)
+    reader.read()
+    return reader.wb
+
+def _stub(worksheet: Worksheet) -> Worksheet:
+    """Shallow copy of a worksheet with its content removed, keeping workbook-level settings."""
+    stub = copy(worksheet)
+    stub._cells = {}
+    stub._images = []
+    stub._charts = []
+    stub._tables = TableList()
+    stub._pivots = []
+    stub._hyperlinks = []
+    stub.legacy_drawing = None
+    stub.merged_cells = MultiCellRange()
+    setattr(stub, INDEX_ATTRIBUTE, None)
+    stub.data_validations = DataValidationList()
+    stub.conditional_formatting = ConditionalFormattingList()
+    stub.row_dimensions = DimensionHolder(worksheet=stub, default_factory=stub._add_row)
+    stub.column_dimensions = DimensionHolder(worksheet=stub, default_factory=stub._add_column)
+    return stub
+
+def save_workbook(workbook: openpyxl.Workbook, compression: str = "default") -> io.BytesIO:
+    """Save the workbook like Workbook.save, with one of the COMPRESSION_LEVELS."""
+    method, level = COMPRESSION_LEVELS[compression]
+    output = io.BytesIO()
+    archive = zipfile.ZipFile(output, "w", method, compresslevel=level, allowZip64=True)
+    workbook.properties.modified = datetime.utcnow()
+    ExcelWriter(workbook, archive).save()
+    output.seek(0)
+    return output
+
+def _save_with_stubs(workbook: openpyxl.Workbook, titles: Set[str], compression: str) -> bytes:
+    """Save the workbook with the titled sheets replaced by empty stubs."""
+    originals = list(workbook._sheets)
+    try:
+        workbook._sheets = [
+            _stub(ws) if isinstance(ws, Worksheet) and ws.title in titles else ws
+            for ws in originals
+        ]
+        return save_workbook(workbook, compression).getvalue()
+    finally:
+        workbook._sheets = originals
+
+def _fresh_name(part: str, taken: Set[str]) -> str:
+    """Return an unused part name in part's directory, numbered like part."""
+    directory, name = posixpath.split(part)
+    stem, extension = posixpath.splitext(name)
+    prefix = re.sub(r"\d+$", "", stem)
+    index = 1
+    while posixpath.join(directory, f"{prefix}{index}{extension}") in taken:
+        index += 1
+    return posixpath.join(directory, f"{prefix}{index}{extension}")
+
+def save_with_passthrough(workbook: openpyxl.Workbook, original_data: bytes,
+                          touched_sheets: Set[str], compression: str = "default") -> io.BytesIO:
+    """Save the workbook, copying untouched worksheet parts byte-for-byte from the input.
+
+    LazyWorksheets are always copied through; other worksheets are when no
+    operation touched them and all their related parts are copyable.
+    Copied parts whose names openpyxl reused for regenerated parts are
+    renamed and the copied relationships pointed at the new names.
+    """
+    original = Package(zipfile.ZipFile(io.BytesIO(original_data)))
+
+    # Current title -> (original part, parts reachable from it)
+    candidates: Dict[str, Tuple[str, Set[str]]] = {}
+    for ws in workbook.worksheets:
+        source_title = getattr(ws, "source_title", ws.title)
+        if not isinstance(ws, LazyWorksheet) and ws.title in touched_sheets:
+            continue
+        if source_title not in original.sheets:
+            continue
+        part = original.sheets[source_title]
+        closure = original.closure(part)
+        if closure is not None:
+            candidates[ws.title] = (part, closure)
+
+    if not candidates:
+        return save_workbook(workbook, compression)
+    # Only read back and recompressed below, so not worth compressing
+    generated_data = _save_with_stubs(workbook, set(candidates), "stored")
+    generated = Package(zipfile.ZipFile(io.BytesIO(generated_data)))
+
+    shared_strings = original.shared_strings_part()
+    if shared_strings in generated.names and generated.read(shared_strings) != original.read(shared_strings):
+        # Copied sheets index into the original string table
+        if any(isinstance(ws, LazyWorksheet) for ws in workbook.worksheets):
+            raise ValueError("Cannot pass through sheets: the shared string table was regenerated")
+        return save_workbook(workbook, compression)
+    add_shared_strings = shared_strings is not None and shared_strings not in generated.names
+
+    # Regenerated stub sheets and anything related to them are replaced
+    dropped: Set[str] = set()
+    for title in candidates:
+        part = generated.sheets[title]
+        related = generated.closure(part) or set()
+        dropped |= related
+        dropped |= {rels_path(name) for name in related | {part}}
+    kept = generated.names - dropped
+
+    # Original part -> output part for everything copied through
+    part_map: Dict[str, str] = {}
+    copied: Set[str] = set()
+    taken = kept | {name for _, closure in candidates.values() for name in closure}
+    for title, (part, closure) in candidates.items():
+        part_map[part] = generated.sheets[title]
+        for related in sorted(closure):
+            if related in part_map:
+                continue
+            if related in kept:
+                part_map[related] = _fresh_name(related, taken)
+                taken.add(part_map[related])
+            else:
+                part_map[related] = related
+            copied.add(related)
+
+    content_types = {part_map[name]: name for name in copied}
+    if add_shared_strings:
+        content_types[shared_strings] = shared_strings
+
+    method, level = COMPRESSION_LEVELS[compression]
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", method, compresslevel=level) as archive:
+        replaced = {generated.sheets[title]: part for title, (part, _) in candidates.items()}
+        for info in generated.archive.infolist():
+            name = info.filename
+            if name in dropped:
+                continue
+            if name in replaced:
+                data = original.read(replaced[name])
+            elif name == "[Content_Types].xml":
+                data = _merge_content_types(generated.read(name), original, content_types, dropped)
+            elif name == rels_path(generated.workbook_part) and add_shared_strings:
+                data = _add_relationship(generated.read(name), SHARED_STRINGS_TYPE,
+                                         posixpath.relpath(shared_strings, posixpath.dirname(generated.workbook_part)))
+            else:
+                data = generated.read(name)
+            archive.writestr(name, data)
+
+        for source in sorted(set(replaced.values()) | copied):
+            if rels_path(source) in original.names:
+                archive.writestr(rels_path(part_map[source]), _relocate_rels(original, source, part_map))
+        for name in sorted(copied):
+            archive.writestr(part_map[name], original.read(name))
+        if add_shared_strings:
+            archive.writestr(shared_strings, original.read(shared_strings))
+
+    output.seek(0)
+    return output
+
+def _relocate_rels(original: Package, source: str, part_map: Dict[str, str]) -> bytes:
+    """Return source's .rels with targets pointing at the output part names."""
+    data = original.read(rels_path(source))
+    output_source = part_map[source]
+    ElementTree.register_namespace("", PACKAGE_RELS_NS)
+    root = ElementTree.fromstring(data)
+    changed = False
+    for rel in root.findall(f"{{{PACKAGE_RELS_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target")
+        moved = part_map[resolve_target(source, target)]
+        if resolve_target(output_source, target) != moved:
+            rel.set("Target", posixpath.relpath(moved, posixpath.dirname(output_source)))
+            changed = True
+    if not changed:
+        return data
+    return ElementTree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+def _merge_content_types(data: bytes, original: Package, extra: Dict[str, str], dropped: Set[str]) -> bytes:
+    """Add content types for copied parts (output name -> original name) and drop removed ones."""
+    ElementTree.register_namespace("", CONTENT_TYPES_NS)
+    root = ElementTree.fromstring(data)
+    original_root = ElementTree.fromstring(original.read("[Content_Types].xml"))
+
+    changed = False
+    for override in list(root.findall(f"{{{CONTENT_TYPES_NS}}}Override")):
+        if override.get("PartName").lstrip("/") in dropped:
+            root.remove(override)
+            changed = True
+
+    defaults = {el.get("Extension").lower() for el in root.findall(f"{{{CONTENT_TYPES_NS}}}Default")}
+    overrides = {el.get("PartName") for el in root.findall(f"{{{CONTENT_TYPES_NS}}}Override")}
+    original_defaults = {el.get("Extension").lower(): el for el in original_root.findall(f"{{{CONTENT_TYPES_NS}}}Default")}
+    original_overrides = {el.get("PartName"): el for el in original_root.findall(f"{{{CONTENT_TYPES_NS}}}Override")}
+
+    for name, source in sorted(extra.items()):
+        part_name = "/" + name
+        if "/" + source in original_overrides and part_name not in overrides:
+            override = copy(original_overrides["/" + source])
+            override.set("PartName", part_name)
+            root.append(override)
+            overrides.add(part_name)
+            changed = True
+            continue
+        extension = posixpath.splitext(name)[1][1:].lower()
+        if extension in original_defaults and extension not in defaults:
+            # Defaults must come before overrides
+            root.insert(0, original_defaults[extension])
+            defaults.add(extension)
+            changed = True
+
+    if not changed:
+        return data
+    return ElementTree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+def _add_relationship(data: bytes, rel_type: str, target: str) -> bytes:
+    """Append a relationship with an unused id to a .rels part."""
+    ElementTree.register_namespace("", PACKAGE_RELS_NS)
+    root = ElementTree.fromstring(data)
+    ids = {rel.get("Id") for rel in root.findall(f"{{{PACKAGE_RELS_NS}}}Relationship")}
+    index = len(ids) + 1
+    while f"rId{index}" in ids:
+        index += 1
+    ElementTree.SubElement(root, f"{{{PACKAGE_RELS_NS}}}Relationship",
+                           {"Id": f"rId{index}", "Type": rel_type, "Target": target})
+    return ElementTree.tostring(root, xml_declaration=True, encoding="UTF-8")
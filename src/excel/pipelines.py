@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional, Set, Tuple
+import hashlib
+import io
+import os
+import re
+import threading
+from pydantic import TypeAdapter
+from src.schemas.models import Operation, Processing
+from src.excel.processor import ExcelProcessor, PlannedStep, plan_steps, referenced_sheets
+from src.excel.template_cache import get_template_cache
+from src import config
+
+operations_adapter = TypeAdapter(List[Operation])
+
+# A set_cells value that is exactly "{{name}}" is filled in from the request's params
+PARAMETER_PATTERN = re.compile(r"^\{\{(\w+)\}\}$")
+PIPELINE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class Pipeline:
+    """A validated operation list with its steps planned once, ready to run on any workbook."""
+
+    def __init__(self, pipeline_id: str, operations: List[Operation]):
+        self.pipeline_id = pipeline_id
+        self.operations = operations
+        self.steps: List[PlannedStep] = [
+            step for operation in operations for step in plan_steps(operation.sheet_name, operation.processing)
+        ]
+        self.sheet_names = referenced_sheets(operations)
+        # Step index -> (row, column, parameter name) of each placeholder value
+        self.slots: Dict[int, List[Tuple[int, int, str]]] = {}
+        for index, step in enumerate(self.steps):
+            if not isinstance(step.argument, Processing) or not step.argument.target:
+                continue
+            for row, row_values in enumerate(step.argument.target.values or []):
+                for col, value in enumerate(row_values):
+                    match = PARAMETER_PATTERN.match(value) if isinstance(value, str) else None
+                    if match:
+                        self.slots.setdefault(index, []).append((row, col, match.group(1)))
+        self.parameters: Set[str] = {name for slots in self.slots.values() for _, _, name in slots}
+
+    def bind(self, params: Optional[Dict[str, Any]] = None) -> List[PlannedStep]:
+        """Return the steps with every placeholder replaced by its parameter value."""
+        params = params or {}
+        missing = self.parameters - params.keys()
+        if missing:
+            raise ValueError(f"Missing pipeline parameters: {', '.join(sorted(missing))}")
+        unknown = params.keys() - self.parameters
+        if unknown:
+            raise ValueError(f"Unknown pipeline parameters: {', '.join(sorted(unknown))}")
+
+        steps = list(self.steps)
+        for index, slots in self.slots.items():
+            process = steps[index].argument
+            values = [list(row_values) for row_values in process.target.values]
+            for row, col, name in slots:
+                values[row][col] = params[name]
+            target = process.target.model_copy(update={"values": values})
+            steps[index] = steps[index]._replace(argument=process.model_copy(update={"target": target}))
+        return steps
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "pipeline_id": self.pipeline_id,
+            "steps": len(self.steps),
+            "parameters": sorted(self.parameters),
+            "operations": [operation.model_dump(exclude_none=True) for operation in self.operations],
+        }
+
+class PipelineRegistry:
+    """Operation lists stored on disk by content hash and compiled once per process.
+
+    Registering the same list twice returns the same ID, and any API or
+    worker process sharing the directory can run a registered pipeline.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pipelines: Dict[str, Pipeline] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, pipeline_id: str) -> str:
+        return os.path.join(self.directory, f"{pipeline_id}.json")
+
+    def register(self, operations: List[Operation]) -> Pipeline:
+        """Store an operation list and return its compiled pipeline."""
+        data = operations_adapter.dump_json(operations, exclude_none=True)
+        pipeline_id = hashlib.sha256(data).hexdigest()
+        pipeline = Pipeline(pipeline_id, operations)
+        if not os.path.exists(self._path(pipeline_id)):
+            # Write then rename so other processes never load a partial file
+            partial_path = f"{self._path(pipeline_id)}.{os.getpid()}.{threading.get_ident()}.partial"
+            with open(partial_path, "wb") as file:
+                file.write(data)
+            os.replace(partial_path, self._path(pipeline_id))
+        with self._lock:
+            self._pipelines[pipeline_id] = pipeline
+        return pipeline
+
+    def get(self, pipeline_id: str) -> Optional[Pipeline]:
+        """Return a registered pipeline, or None if there is none with this ID."""
+        with self._lock:
+            pipeline = self._pipelines.get(pipeline_id)
+        if pipeline is not None or not PIPELINE_ID_PATTERN.match(pipeline_id):
+            return pipeline
+        try:
+            with open(self._path(pipeline_id), "rb") as file:
+                operations = operations_adapter.validate_json(file.read())
+        except FileNotFoundError:
+            return None
+        pipeline = Pipeline(pipeline_id, operations)
+        with self._lock:
+            self._pipelines[pipeline_id] = pipeline
+        return pipeline
+
+_pipeline_registry: Optional[PipelineRegistry] = None
+
+def get_pipeline_registry() -> PipelineRegistry:
+    """Return the process-wide pipeline registry."""
+    global _pipeline_registry
+    if _pipeline_registry is None:
+        _pipeline_registry = PipelineRegistry(config.PIPELINE_DIR)
+    return _pipeline_registry
+
+def transform_with_pipeline(excel_file: io.BytesIO, pipeline_id: str, params: Optional[Dict[str, Any]] = None,
+                            compression: Optional[str] = None, load_mode: Optional[str] = None) -> io.BytesIO:
+    """Run a registered pipeline on a workbook and return the saved output buffer."""
+    pipeline = get_pipeline_registry().get(pipeline_id)
+    if pipeline is None:
+        raise ValueError(f"Pipeline {pipeline_id} not found")
+    steps = pipeline.bind(params)
+
+    if (load_mode or config.LOAD_MODE) == "lazy":
+        processor = ExcelProcessor(excel_file, sheet_names=pipeline.sheet_names, compression=compression)
+    else:
+        processor = ExcelProcessor(excel_file, get_template_cache(), compression=compression)
+    for step in steps:
+        processor.run_step(step)
+    return processor.save()
+
+def transform_bytes_with_pipeline(excel_data: bytes, pipeline_id: str, params: Optional[Dict[str, Any]] = None,
+                                  compression: Optional[str] = None, load_mode: Optional[str] = None) -> bytes:
+    """Picklable entry point used by worker processes."""
+    return transform_with_pipeline(io.BytesIO(excel_data), pipeline_id, params, compression, load_mode).getvalue()
@@ -0,0 +1,192 @@
+from typing import List, Optional, Tuple
+from openpyxl.utils import get_column_letter, column_index_from_string
+from src.schemas.models import Operation, Processing, ProcessingTarget, CellRange, Cell
+from src.excel.utils import get_cell_range, is_row_target
+from src.excel.pipelines import PARAMETER_PATTERN
+
+# Operations that only write and never read or move existing cells, so a
+# value write that is fully overwritten later can be dropped across them.
+# A set_cells on whole rows or columns is the exception (see _reads_sheet)
+WRITE_ONLY_TYPES = {"set_cells", "hidden", "group"}
+
+def optimize_operations(operations: List[Operation]) -> List[Operation]:
+    """Rewrite an operation list into an equivalent, cheaper plan."""
+    steps = [(operation.sheet_name, process)
+             for operation in operations
+             for process in operation.processing]
+
+    steps = _drop_overwritten_writes(steps)
+    steps = _coalesce_adjacent(steps)
+
+    # Regroup consecutive steps on the same sheet into operations
+    plan: List[Operation] = []
+    for sheet_name, process in steps:
+        if plan and plan[-1].sheet_name == sheet_name:
+            plan[-1].processing.append(process)
+        else:
+            plan.append(Operation(sheet_name=sheet_name, processing=[process]))
+    return plan
+
+def _axis_span(process: Processing) -> Optional[Tuple[bool, int, int]]:
+    """Return (is_rows, first, last) for a row/column operation, or None."""
+    if not process.target or not process.target.cells:
+        return None
+    cell_range = get_cell_range(process.target.cells)
+    is_rows = is_row_target(process.target.cells)
+    indices = cell_range.rows if is_rows else cell_range.cols
+    if not indices:
+        return None
+    return is_rows, indices[0], indices[-1]
+
+def _axis_process(processing_type: str, is_rows: bool, first: int, last: int) -> Processing:
+    """Build a row or column operation covering first..last."""
+    if is_rows:
+        start, end = Cell(row=first), Cell(row=last)
+    else:
+        start = Cell(col_letter=get_column_letter(first))
+        end = Cell(col_letter=get_column_letter(last))
+    return Processing(
+        processing_type=processing_type,
+        target=ProcessingTarget(cells=CellRange(start_cell=start, end_cell=end))
+    )
+
+def _merge_axis(previous: Processing, current: Processing) -> Optional[Processing]:
+    """Merge two consecutive insert/delete/hidden steps, or return None."""
+    previous_span = _axis_span(previous)
+    current_span = _axis_span(current)
+    if previous_span is None or current_span is None:
+        return None
+    is_rows, first, last = previous_span
+    current_is_rows, current_first, current_last = current_span
+    if is_rows != current_is_rows:
+        return None
+    count = last - first + 1
+    current_count = current_last - current_first + 1
+
+    kind = previous.processing_type
+    if kind == "hidden":
+        # Hiding is idempotent, so touching or overlapping spans union
+        if current_first > last + 1 or current_last < first - 1:
+            return None
+        return _axis_process(kind, is_rows, min(first, current_first), max(last, current_last))
+
+    if kind == "insert":
+        # A second insert anywhere inside (or right after) the blank block
+        # just inserted extends that block
+        if not first <= current_first <= first + count:
+            return None
+        return _axis_process(kind, is_rows, first, first + count + current_count - 1)
+
+    if kind == "delete":
+        # Deleting a block that ends where the first deletion started (or
+        # starts there) removes one contiguous block of the original sheet
+        if not current_first <= first <= current_first + current_count:
+            return None
+        return _axis_process(kind, is_rows, current_first, current_first + count + current_count - 1)
+
+    return None
+
+def _is_plain_write(process: Processing) -> bool:
+    """Whether a step is a set_cells that only writes a values list."""
+    target = process.target
+    return (process.processing_type == "set_cells"
+            and target is not None
+            and target.cells is not None
+            and bool(target.cells.start_cell.row and target.cells.start_cell.col_letter)
+            and bool(target.values)
+            and not target.styles
+            and target.columns is None
+            and target.csv is None
+            and target.arrow is None)
+
+def _fuse_writes(previous: Processing, current: Processing) -> Optional[Processing]:
+    """Stack a value write directly below the previous one into a single write."""
+    previous_start = previous.target.cells.start_cell
+    current_start = current.target.cells.start_cell
+    if current_start.col_letter != previous_start.col_letter:
+        return None
+    if current_start.row != previous_start.row + len(previous.target.values):
+        return None
+    return Processing(
+        processing_type="set_cells",
+        target=ProcessingTarget(
+            cells=CellRange(start_cell=previous_start),
+            values=previous.target.values + current.target.values
+        )
+    )
+
+def _coalesce_adjacent(steps: List[Tuple[str, Processing]]) -> List[Tuple[str, Processing]]:
+    """Merge runs of adjacent steps of the same kind on the same sheet."""
+    result: List[Tuple[str, Processing]] = []
+    for sheet_name, process in steps:
+        if result and result[-1][0] == sheet_name:
+            previous = result[-1][1]
+            merged = None
+            if previous.processing_type == process.processing_type:
+                if process.processing_type in ("insert", "delete", "hidden"):
+                    merged = _merge_axis(previous, process)
+                elif _is_plain_write(previous) and _is_plain_write(process):
+                    merged = _fuse_writes(previous, process)
+            if merged is not None:
+                result[-1] = (sheet_name, merged)
+                continue
+        result.append((sheet_name, process))
+    return result
+
+def _written_rows(process: Processing) -> dict:
+    """Map each row a plain write touches to its (first, last) column."""
+    start_cell = process.target.cells.start_cell
+    start_col = column_index_from_string(start_cell.col_letter)
+    return {
+        start_cell.row + i: (start_col, start_col + len(row_values) - 1)
+        for i, row_values in enumerate(process.target.values)
+        if row_values
+    }
+
+def _covers(later: dict, earlier: dict) -> bool:
+    """Whether every cell in earlier is also written by later."""
+    for row, (first, last) in earlier.items():
+        span = later.get(row)
+        if span is None or span[0] > first or span[1] < last:
+            return False
+    return True
+
+def _reads_sheet(process: Processing) -> bool:
+    """Whether a step depends on existing cells, so no write may be dropped across it.
+
+    A set_cells whose target leaves the rows or the columns open sizes its
+    range from the sheet's current extent, which an earlier write can grow.
+    """
+    if process.processing_type not in WRITE_ONLY_TYPES:
+        return True
+    if process.processing_type != "set_cells":
+        return False
+    cells = process.target.cells if process.target else None
+    return cells is None or not (cells.start_cell.row and cells.start_cell.col_letter)
+
+def _has_parameters(process: Processing) -> bool:
+    """Whether a plain write holds pipeline parameter placeholders."""
+    return any(isinstance(value, str) and PARAMETER_PATTERN.match(value)
+               for row_values in process.target.values for value in row_values)
+
+def _drop_overwritten_writes(steps: List[Tuple[str, Processing]]) -> List[Tuple[str, Processing]]:
+    """Remove plain writes whose cells are all overwritten before anything reads them.
+
+    Writes holding pipeline parameters are kept, since a pipeline's
+    parameters are the placeholders left in its planned operations.
+    """
+    written = [_written_rows(process) if _is_plain_write(process) else None
+               for _, process in steps]
+    keep = [True] * len(steps)
+    for index, (sheet_name, process) in enumerate(steps):
+        if written[index] is None or _has_parameters(process):
+            continue
+        for later_index in range(index + 1, len(steps)):
+            later_sheet, later = steps[later_index]
+            if _reads_sheet(later):
+                break
+            later_written = written[later_index]
+            if later_sheet == sheet_name and later_written is not None and _covers(later_written, written[index]):
+                keep[index] = False
+                break
+    return [step for step, kept in zip(steps, keep) if kept]
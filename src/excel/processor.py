@@ -1,41 +1,196 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Set, Callable, Tuple, NamedTuple, Union
 import io
+from types import MethodType
 import openpyxl
 from openpyxl.utils import get_column_letter, column_index_from_string
-from src.schemas.models import Processing
+from src.schemas.models import Processing, Operation
 from src.excel.operations import xlsx_operation
+from src.excel.template_cache import TemplateCache, get_template_cache
+from src.excel.utils import is_row_target
+from src.excel.passthrough import save_with_passthrough, load_workbook_lazily, save_workbook, COMPRESSION_LEVELS
+from src import config
+from src.excel.compaction import compact_styles
+from src.metrics import StageTimer, timed, record_bytes, record_style_compaction, collect_timings
+from src.profiling import profile_to
+
+SHIFT_TYPES = ("insert", "delete")
+
+OPERATION_METHODS: Dict[str, Callable[[xlsx_operation, str, Any], None]] = {
+    "copy": xlsx_operation.copy_cells,
+    "copy_sheet": xlsx_operation.copy_sheet,
+    "copy_style": xlsx_operation.copy_style,
+    "insert_sheet": xlsx_operation.insert_sheet,
+    "delete_sheet": xlsx_operation.delete_sheet,
+    "insert": xlsx_operation.insert_rows_or_cols,
+    "delete": xlsx_operation.delete_rows_or_cols,
+    "hidden": xlsx_operation.hide_rows_or_cols,
+    "group": xlsx_operation.group_rows_or_cols,
+    "set_cells": xlsx_operation.set_cells,
+    "join_cells": xlsx_operation.join_cells,
+    "merge_cells": xlsx_operation.merge_cells,
+    "unmerge_cells": xlsx_operation.unmerge_cells,
+}
+
+class PlannedStep(NamedTuple):
+    """One Processing step, or a batched run of shifts, with its operation method resolved."""
+    sheet_name: str
+    index: int  # Position of the (first) step in its operation's processing list
+    stage: str  # Label the step is timed under
+    method: Callable[[xlsx_operation, str, Any], None]
+    argument: Union[Processing, List[Processing]]
+
+def plan_steps(sheet_name: str, processing: List[Processing]) -> List[PlannedStep]:
+    """Resolve the steps of one operation, batching runs of same-axis inserts/deletes."""
+    steps = []
+    index = 0
+    while index < len(processing):
+        # Runs of inserts/deletes on one axis are shifted in a single pass
+        run_end = _shift_run_end(processing, index)
+        if run_end - index > 1:
+            run = processing[index:run_end]
+            kinds = {process.processing_type for process in run}
+            stage = f"op.{kinds.pop() if len(kinds) == 1 else 'insert_delete'}"
+            steps.append(PlannedStep(sheet_name, index, stage, xlsx_operation.shift_rows_or_cols, run))
+            index = run_end
+            continue
+
+        process = processing[index]
+        method = OPERATION_METHODS.get(process.processing_type)
+        if method is None:
+            raise ValueError(f"Unknown processing type: {process.processing_type}")
+        steps.append(PlannedStep(sheet_name, index, f"op.{process.processing_type}", method, process))
+        index += 1
+    return steps
+
+def _shift_run_end(processing: List[Processing], start: int) -> int:
+    """Return the end of the run of same-axis insert/delete steps starting at start."""
+    is_rows = None
+    end = start
+    while end < len(processing):
+        process = processing[end]
+        if process.processing_type not in SHIFT_TYPES or not process.target or not process.target.cells:
+            break
+        process_is_rows = is_row_target(process.target.cells)
+        if is_rows is not None and process_is_rows != is_rows:
+            break
+        is_rows = process_is_rows
+        end += 1
+    return end
 
 class ExcelProcessor:
-    def __init__(self, excel_file: io.BytesIO):
-        """Initialize ExcelProcessor with an Excel file."""
-        self.workbook = openpyxl.load_workbook(excel_file)
+    def __init__(self, excel_file: io.BytesIO, template_cache: Optional[TemplateCache] = None,
+                 save_mode: Optional[str] = None, sheet_names: Optional[Iterable[str]] = None,
+                 compression: Optional[str] = None, compact: Optional[bool] = None):
+        """Initialize ExcelProcessor with an Excel file.
+
+        If sheet_names is given, only those sheets are parsed; the others are
+        left in the archive and copied through on save. compression picks
+        one of COMPRESSION_LEVELS for the output archive. compact, defaulting
+        to config.COMPACT_STYLES, compacts the style tables before saving.
+        """
+        self.save_mode = save_mode or config.SAVE_MODE
+        if self.save_mode not in ("full", "passthrough"):
+            raise ValueError(f"Unknown save mode: {self.save_mode}")
+        self.compression = compression or config.COMPRESSION
+        if self.compression not in COMPRESSION_LEVELS:
+            raise ValueError(f"Unknown compression: {self.compression}")
+        self.compact = config.COMPACT_STYLES if compact is None else compact
+        if sheet_names is not None:
+            self.save_mode = "passthrough"
+        excel_data = excel_file.read()
+        record_bytes("in", len(excel_data))
+        # Passthrough saving copies untouched parts from the input archive
+        self.excel_data = excel_data if self.save_mode == "passthrough" else None
+        with timed("load"):
+            if sheet_names is not None:
+                self.workbook = load_workbook_lazily(excel_data, sheet_names)
+            elif template_cache is not None:
+                self.workbook = template_cache.get_workbook(excel_data)
+            else:
+                self.workbook = openpyxl.load_workbook(io.BytesIO(excel_data))
         self.operations = xlsx_operation(self.workbook)
 
-    def process_operations(self, sheet_name: str, processing: List[Processing]) -> None:
-        """Process a list of operations for a specific sheet."""
-        for process in processing:
-            operation_method = self._get_operation_method(process.processing_type)
-            operation_method(sheet_name, process)
+    def process_operations(self, sheet_name: str, processing: List[Processing],
+                           on_step: Optional[Callable[[int], None]] = None) -> None:
+        """Process a list of operations for a specific sheet.
+
+        on_step, if given, is called with the index of each step (or the
+        first step of a batched run) before it runs.
+        """
+        for step in plan_steps(sheet_name, processing):
+            if on_step is not None:
+                on_step(step.index)
+            self.run_step(step)
+
+    def run_step(self, step: "PlannedStep") -> None:
+        """Run one planned step against the workbook."""
+        with timed(step.stage):
+            step.method(self.operations, step.sheet_name, step.argument)
 
     def _get_operation_method(self, processing_type: str):
         """Get the corresponding operation method based on processing type."""
-        operation_map = {
-            "copy": self.operations.copy_cells,
-            "copy_sheet": self.operations.copy_sheet,
-            "copy_style": self.operations.copy_style,
-            "insert_sheet": self.operations.insert_sheet,
-            "delete_sheet": self.operations.delete_sheet,
-            "insert": self.operations.insert_rows_or_cols,
-            "delete": self.operations.delete_rows_or_cols,
-            "hidden": self.operations.hide_rows_or_cols,
-            "set_cells": self.operations.set_cells,
-            "join_cells": self.operations.join_cells
-        }
-        return operation_map.get(processing_type)
+        method = OPERATION_METHODS.get(processing_type)
+        return MethodType(method, self.operations) if method else None
 
     def save(self) -> io.BytesIO:
         """Save the workbook to a buffer and return it."""
-        output = io.BytesIO()
-        self.workbook.save(output)
-        output.seek(0)
-        return output
\ No newline at end of file
+        if self.compact:
+            with timed("compact_styles"):
+                # Passed-through sheets keep referring to the input's cellXfs positions
+                counts = compact_styles(self.workbook, keep_cell_xfs=self.excel_data is not None)
+            record_style_compaction(counts)
+        with timed("save"):
+            if self.excel_data is not None:
+                output = save_with_passthrough(self.workbook, self.excel_data, self.operations.touched_sheets,
+                                               self.compression)
+            else:
+                output = save_workbook(self.workbook, self.compression)
+        record_bytes("out", output.getbuffer().nbytes)
+        return output
+
+def referenced_sheets(operations: List[Operation]) -> Set[str]:
+    """Names of the sheets whose content an operation list reads or writes."""
+    names = set()
+    for operation in operations:
+        for process in operation.processing:
+            # Deleting a sheet does not need its content
+            if process.processing_type != "delete_sheet":
+                names.add(operation.sheet_name)
+            if process.paste_target:
+                names.add(process.paste_target.sheet_name)
+    return names
+
+def transform_workbook(excel_file: io.BytesIO, operations: List[Operation], profile_id: Optional[str] = None,
+                       compression: Optional[str] = None, load_mode: Optional[str] = None) -> io.BytesIO:
+    """Apply every operation to the workbook and return the saved output buffer.
+
+    With a profile_id, the whole ExcelProcessor lifecycle is profiled and the
+    results are spooled to config.PROFILE_DIR under that ID. load_mode
+    overrides config.LOAD_MODE.
+    """
+    if profile_id is not None:
+        with profile_to(config.PROFILE_DIR, profile_id):
+            return transform_workbook(excel_file, operations, compression=compression, load_mode=load_mode)
+
+    if (load_mode or config.LOAD_MODE) == "lazy":
+        processor = ExcelProcessor(excel_file, sheet_names=referenced_sheets(operations),
+                                   compression=compression)
+    else:
+        processor = ExcelProcessor(excel_file, get_template_cache(), compression=compression)
+    for operation in operations:
+        processor.process_operations(operation.sheet_name, operation.processing)
+    return processor.save()
+
+
+def transform_bytes(excel_data: bytes, operations: List[Operation], profile_id: Optional[str] = None,
+                    compression: Optional[str] = None, load_mode: Optional[str] = None) -> bytes:
+    """Picklable entry point used by worker processes."""
+    return transform_workbook(io.BytesIO(excel_data), operations, profile_id, compression, load_mode).getvalue()
+
+
+def transform_bytes_timed(excel_data: bytes, operations: List[Operation], profile_id: Optional[str] = None,
+                          compression: Optional[str] = None,
+                          load_mode: Optional[str] = None) -> Tuple[bytes, StageTimer]:
+    """Like transform_bytes, also returning the stage timings collected in the worker."""
+    with collect_timings() as timer:
+        return transform_bytes(excel_data, operations, profile_id, compression, load_mode), timer
@@ -0,0 +1,199 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from src.schemas.models import Operation
+from src import config
+
+def _settings(compression: Optional[str]) -> bytes:
+    """The settings that change the output bytes, so entries stored under others are not served."""
+    return json.dumps([compression or config.COMPRESSION, config.SAVE_MODE, config.LOAD_MODE,
+                       config.COMPACT_STYLES]).encode()
+
+def result_key(excel_data: bytes, operations: List[Operation], compression: Optional[str] = None) -> str:
+    """Hash the input workbook, the operations and the output settings into a cache key."""
+    digest = hashlib.sha256(excel_data)
+    normalized = [operation.model_dump(exclude_none=True) for operation in operations]
+    digest.update(json.dumps(normalized, sort_keys=True, separators=(",", ":")).encode())
+    digest.update(_settings(compression))
+    return digest.hexdigest()
+
+def pipeline_result_key(excel_data: bytes, pipeline_id: str, params: Optional[Dict[str, Any]] = None,
+                        compression: Optional[str] = None) -> str:
+    """Cache key for running a registered pipeline, which is itself keyed by its operations."""
+    digest = hashlib.sha256(excel_data)
+    digest.update(pipeline_id.encode())
+    digest.update(json.dumps(params or {}, sort_keys=True, separators=(",", ":"), default=str).encode())
+    digest.update(_settings(compression))
+    return digest.hexdigest()
+
+class ResultCache:
+    """Transformed workbooks stored on disk, evicted least recently used first.
+
+    Identical requests arriving while one is being computed wait for that
+    computation instead of starting their own.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.xlsx")
+
+    def _load_index(self) -> None:
+        """Pick up entries left by a previous process, oldest use first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".xlsx"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-len(".xlsx")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.current_bytes += size
+        with self._lock:
+            self._evict(0)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored output for key, or None on a miss."""
+        with self._lock:
+            known = key in self._entries
+        if known:
+            try:
+                with open(self._path(key), "rb") as file:
+                    data = file.read()
+                # The modification time orders entries when the index is reloaded
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                data = None
+            with self._lock:
+                if data is not None and key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return data
+                self._forget(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store an output, evicting old entries to stay within max_bytes."""
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        # Write then rename so a reader never sees a partial entry
+        partial_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.partial"
+        with open(partial_path, "wb") as file:
+            file.write(data)
+        os.replace(partial_path, self._path(key))
+        with self._lock:
+            self._forget(key)
+            self._evict(size)
+            self._entries[key] = size
+            self.current_bytes += size
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.current_bytes -= size
+
+    def _evict(self, incoming: int) -> None:
+        while self._entries and self.current_bytes + incoming > self.max_bytes:
+            key, size = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the stored output for key, computing and storing it on a miss.
+
+        Only one computation per key runs at a time in this process; other
+        callers share its result or its error. If the running computation is
+        cancelled, as when its client goes away, a waiting caller starts its
+        own instead of seeing the cancellation.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        pending = self._pending.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+        while pending is not None:
+            data = await asyncio.shield(pending)
+            if data is not None:
+                return data
+            # The computation was cancelled; the first waiter to get here takes over
+            pending = self._pending.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            data = await compute()
+            self.put(key, data)
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; without any, it must not be reported as unretrieved
+            future.exception()
+            raise
+        except BaseException:
+            # None tells waiters to retry rather than passing the cancellation on
+            future.set_result(None)
+            raise
+        finally:
+            del self._pending[key]
+        future.set_result(data)
+        return data
+
+    def clear(self) -> None:
+        """Drop every stored output."""
+        with self._lock:
+            while self._entries:
+                key, _ = self._entries.popitem()
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters used to size the cache."""
+        # Coalesced requests missed the store but did not compute either
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+_result_cache: Optional[ResultCache] = None
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache, or None when disabled."""
+    global _result_cache
+    if config.RESULT_CACHE_BYTES <= 0:
+        return None
+    if _result_cache is None:
+        _result_cache = ResultCache(config.RESULT_CACHE_DIR, config.RESULT_CACHE_BYTES)
+    return _result_cache
@@ -0,0 +1,233 @@
+from typing import List, Optional, Tuple
+from bisect import bisect_right
+from copy import copy
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.utils import get_column_letter, column_index_from_string
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from src.excel.merges import update_merge_index
+
+MAX_INDEX = 1 << 30
+MAX_ROW = 1048576
+MAX_COLUMN = 16384
+
+class ShiftMap:
+    """Composition of row or column inserts/deletes as a piecewise offset map.
+
+    Segments are (first, last, delta) runs of original indices that survive
+    and move by delta; original indices outside every segment were deleted.
+    Shifts are given in the coordinates left by the previous shift, just as
+    if they were applied one after another.
+    """
+
+    def __init__(self):
+        self.segments: List[Tuple[int, int, int]] = [(1, MAX_INDEX, 0)]
+
+    def insert(self, idx: int, amount: int) -> None:
+        """Insert amount blank indices before idx."""
+        segments = []
+        for first, last, delta in self.segments:
+            split = idx - delta  # first original index whose image moves
+            if last < split:
+                segments.append((first, last, delta))
+            elif first >= split:
+                segments.append((first, last, delta + amount))
+            else:
+                segments.append((first, split - 1, delta))
+                segments.append((split, last, delta + amount))
+        self.segments = segments
+
+    def delete(self, idx: int, amount: int) -> None:
+        """Delete amount indices starting at idx."""
+        segments = []
+        for first, last, delta in self.segments:
+            # Original index bounds of the deleted block for this segment
+            cut_first = idx - delta
+            cut_last = idx + amount - 1 - delta
+            if first < cut_first:
+                segments.append((first, min(last, cut_first - 1), delta))
+            if last > cut_last:
+                segments.append((max(first, cut_last + 1), last, delta - amount))
+        self.segments = segments
+
+    @property
+    def is_identity(self) -> bool:
+        return self.segments == [(1, MAX_INDEX, 0)]
+
+    @property
+    def start(self) -> int:
+        """Smallest original index that is moved or deleted."""
+        first, last, delta = self.segments[0]
+        if first > 1:
+            return 1
+        return last + 1 if delta == 0 else 1
+
+    def __call__(self, index: int) -> Optional[int]:
+        """Map an original index, returning None if it was deleted."""
+        position = bisect_right(self._firsts, index) - 1
+        if position < 0:
+            return None
+        first, last, delta = self.segments[position]
+        if index > last:
+            return None
+        return index + delta
+
+    def span(self, first: int, last: int) -> Optional[Tuple[int, int]]:
+        """Map an inclusive span to the bounds of its surviving indices."""
+        images = [(max(first, seg_first) + delta, min(last, seg_last) + delta)
+                  for seg_first, seg_last, delta in self.segments
+                  if seg_first <= last and seg_last >= first]
+        if not images:
+            return None
+        return images[0][0], images[-1][1]
+
+    def freeze(self) -> "ShiftMap":
+        """Prepare the lookup table once all shifts have been added."""
+        self._firsts = [segment[0] for segment in self.segments]
+        return self
+
+def apply_shifts(sheet, shifts: List[Tuple[int, int]], is_rows: bool) -> None:
+    """Apply a sequence of (idx, amount) shifts to a sheet in a single pass.
+
+    A positive amount inserts blank rows/columns before idx, a negative one
+    deletes them starting at idx. Cells, dimensions, merged ranges, hyperlink
+    references, data validations and conditional formatting ranges move with
+    the data. Formulas are not rewritten, as with openpyxl's insert_rows.
+    """
+    shift_map = ShiftMap()
+    for idx, amount in shifts:
+        if amount > 0:
+            shift_map.insert(idx, amount)
+        elif amount < 0:
+            shift_map.delete(idx, -amount)
+    if shift_map.is_identity:
+        return
+    shift_map.freeze()
+
+    _shift_cells(sheet, shift_map, is_rows)
+    if is_rows:
+        _shift_row_dimensions(sheet, shift_map)
+    else:
+        _shift_column_dimensions(sheet, shift_map)
+    _shift_merged_cells(sheet, shift_map, is_rows)
+    sheet.data_validations.dataValidation = [
+        dv for dv in sheet.data_validations.dataValidation
+        if _shift_sqref(dv, shift_map, is_rows)
+    ]
+    _shift_conditional_formatting(sheet, shift_map, is_rows)
+
+def _shift_cells(sheet, shift_map: ShiftMap, is_rows: bool) -> None:
+    """Rebuild the cell store with every cell at its new coordinate."""
+    start = shift_map.start
+    firsts = shift_map._firsts
+    segments = shift_map.segments
+    cell_class = Cell
+    cells = {}
+    max_row = 0
+    for key, cell in sheet._cells.items():
+        row, column = key
+        index = row if is_rows else column
+        if index >= start:
+            segment = segments[bisect_right(firsts, index) - 1]
+            if index > segment[1] or index < segment[0]:
+                continue
+            index += segment[2]
+            if is_rows:
+                row = cell.row = index
+            else:
+                column = cell.column = index
+            key = (row, column)
+            if cell.__class__ is cell_class and cell._hyperlink is not None:
+                cell._hyperlink.ref = cell.coordinate
+        cells[key] = cell
+        if row > max_row:
+            max_row = row
+    sheet._cells = cells
+    if is_rows:
+        sheet._current_row = max_row
+
+def _shift_row_dimensions(sheet, shift_map: ShiftMap) -> None:
+    dims = sheet.row_dimensions
+    items = list(dims.items())
+    dims.clear()
+    for index, dim in items:
+        new_index = shift_map(index)
+        if new_index is None:
+            continue
+        dim.index = new_index
+        dims[new_index] = dim
+
+def _shift_column_dimensions(sheet, shift_map: ShiftMap) -> None:
+    dims = sheet.column_dimensions
+    items = list(dims.items())
+    dims.clear()
+    for letter, dim in items:
+        first = dim.min or column_index_from_string(letter)
+        last = dim.max or first
+        span = shift_map.span(first, last)
+        if span is None:
+            continue
+        new_letter = get_column_letter(span[0])
+        dim.index = new_letter
+        dim.min, dim.max = span
+        dims[new_letter] = dim
+
+def _shift_range(cell_range: CellRange, shift_map: ShiftMap, is_rows: bool) -> bool:
+    """Move a CellRange in place; returns False if it was deleted entirely."""
+    if is_rows:
+        span = shift_map.span(cell_range.min_row, cell_range.max_row)
+        if span is None or span[0] > MAX_ROW:
+            return False
+        cell_range.min_row, cell_range.max_row = span[0], min(span[1], MAX_ROW)
+    else:
+        span = shift_map.span(cell_range.min_col, cell_range.max_col)
+        if span is None or span[0] > MAX_COLUMN:
+            return False
+        cell_range.min_col, cell_range.max_col = span[0], min(span[1], MAX_COLUMN)
+    return True
+
+def _shift_sqref(item, shift_map: ShiftMap, is_rows: bool) -> bool:
+    """Shift every range in item.sqref, returning False if none survive."""
+    ranges = [r for r in item.sqref.ranges if _shift_range(r, shift_map, is_rows)]
+    item.sqref = MultiCellRange(ranges)
+    return bool(ranges)
+
+def _shift_merged_cells(sheet, shift_map: ShiftMap, is_rows: bool) -> None:
+    start = shift_map.start
+    ranges = []
+    moved = []
+    removed = []
+    for merged in sheet.merged_cells.ranges:
+        # Ranges wholly before the first shifted index stay as they are
+        if (merged.max_row if is_rows else merged.max_col) < start:
+            ranges.append(merged)
+            continue
+        size = merged.size
+        if not _shift_range(merged, shift_map, is_rows):
+            removed.append(merged)
+            continue
+        _unmerge_placeholder(sheet, merged.min_row, merged.min_col)
+        if merged.min_row == merged.max_row and merged.min_col == merged.max_col:
+            removed.append(merged)
+            continue
+        merged.start_cell = sheet.cell(row=merged.min_row, column=merged.min_col)
+        if merged.size != size:
+            # Inserting inside a merge widens it: add placeholders for the gap
+            merged.format()
+        ranges.append(merged)
+        moved.append(merged)
+    sheet.merged_cells = MultiCellRange(ranges)
+    update_merge_index(sheet, moved, removed)
+
+def _unmerge_placeholder(sheet, row: int, column: int) -> None:
+    """Turn a MergedCell that became a range's top-left (or stands alone) into a Cell."""
+    cell = sheet._cells.get((row, column))
+    if cell is not None and cell.__class__ is MergedCell:
+        sheet._cells[(row, column)] = Cell(sheet, row=row, column=column, style_array=copy(cell._style))
+
+def _shift_conditional_formatting(sheet, shift_map: ShiftMap, is_rows: bool) -> None:
+    formatting = sheet.conditional_formatting
+    items = list(formatting._cf_rules.items())
+    formatting._cf_rules.clear()
+    for cf, rules in items:
+        if _shift_sqref(cf, shift_map, is_rows):
+            formatting._cf_rules.setdefault(cf, []).extend(rules)
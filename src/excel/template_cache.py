@@ -0,0 +1,214 @@
+from typing import Callable, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from copy import copy, deepcopy
+import hashlib
+import io
+import os
+import threading
+import openpyxl
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet.dimensions import DimensionHolder
+from src.excel.utils import get_uncompressed_size
+from src.excel.merges import INDEX_ATTRIBUTE
+from src import config
+
+def clone_workbook(template: openpyxl.Workbook) -> openpyxl.Workbook:
+    """Return an isolated copy of a parsed workbook without re-parsing XML."""
+    # IndexedList does not survive deepcopy (its lookup dict is restored
+    # before the items), so style tables are rebuilt explicitly.
+    memo: Dict[int, Any] = {}
+    for name, value in vars(template).items():
+        if isinstance(value, IndexedList):
+            memo[id(value)] = IndexedList(value)
+
+    # Cells and dimensions are copied by hand below: deepcopy is slow for
+    # the former and loses the bound default factory of the latter.
+    worksheets = [ws for ws in template._sheets if isinstance(ws, Worksheet)]
+    cell_stores = {}
+    for ws in worksheets:
+        cell_stores[id(ws)] = {}
+        memo[id(ws._cells)] = cell_stores[id(ws)]
+        memo[id(ws.row_dimensions)] = None
+        memo[id(ws.column_dimensions)] = None
+        # The merge index refers to the template's ranges; clones build their own
+        if getattr(ws, INDEX_ATTRIBUTE, None) is not None:
+            memo[id(getattr(ws, INDEX_ATTRIBUTE))] = None
+
+    clone = deepcopy(template, memo)
+
+    for source, target in zip(worksheets, (ws for ws in clone._sheets if isinstance(ws, Worksheet))):
+        _clone_dimensions(source, target)
+        _clone_cells(source, target, cell_stores[id(source)])
+
+    return clone
+
+def _clone_dimensions(source: Worksheet, target: Worksheet) -> None:
+    """Give target fresh dimension holders holding copies of source's."""
+    target.row_dimensions = DimensionHolder(worksheet=target, default_factory=target._add_row)
+    target.column_dimensions = DimensionHolder(worksheet=target, default_factory=target._add_column)
+    for attr in ('row_dimensions', 'column_dimensions'):
+        source_dims = getattr(source, attr)
+        target_dims = getattr(target, attr)
+        target_dims.max_outline = source_dims.max_outline
+        for key, dim in source_dims.items():
+            target_dims[key] = copy(dim)
+            target_dims[key].parent = target
+
+def _clone_cells(source: Worksheet, target: Worksheet, cells: Dict[Any, Cell]) -> None:
+    """Copy the cell store of source into target's (empty) cell dict."""
+    new_cell = Cell.__new__
+    new_merged = MergedCell.__new__
+    for key, source_cell in source._cells.items():
+        if source_cell.__class__ is MergedCell:
+            cell = new_merged(MergedCell)
+        else:
+            cell = new_cell(Cell)
+            cell._value = source_cell._value
+            cell.data_type = source_cell.data_type
+            cell._hyperlink = copy(source_cell._hyperlink) if source_cell._hyperlink else None
+            cell._comment = None
+        cell.parent = target
+        cell.row = source_cell.row
+        cell.column = source_cell.column
+        cell._style = copy(source_cell._style)
+        cells[key] = cell
+        if source_cell.comment is not None:
+            cell.comment = copy(source_cell.comment)
+
+class TemplateCache:
+    def __init__(self, max_bytes: int):
+        """Initialize an LRU cache of parsed workbooks bounded by max_bytes."""
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_workbook(self, excel_data: bytes) -> openpyxl.Workbook:
+        """Return a private workbook for excel_data, parsing it only on a miss."""
+        key = hashlib.sha256(excel_data).hexdigest()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            return clone_workbook(entry[0])
+
+        workbook = openpyxl.load_workbook(io.BytesIO(excel_data))
+        size = get_uncompressed_size(excel_data)
+        if size > self.max_bytes:
+            return workbook
+
+        self._store(key, workbook, size)
+        return clone_workbook(workbook)
+
+    def _store(self, key: str, workbook: openpyxl.Workbook, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                return
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (workbook, size)
+            self.current_bytes += size
+
+    def clear(self) -> None:
+        """Drop every cached workbook."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters used to size the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def report_since(self, before: Dict[str, int]) -> Dict[str, int]:
+        """Counter changes since the stats() snapshot before, with the current size and process ID."""
+        after = self.stats()
+        return {
+            "pid": os.getpid(),
+            "hits": after["hits"] - before["hits"],
+            "misses": after["misses"] - before["misses"],
+            "evictions": after["evictions"] - before["evictions"],
+            "entries": after["entries"],
+            "bytes": after["bytes"],
+        }
+
+class WorkerCacheStats:
+    """Template cache counters of worker processes, added up from what each job reports.
+
+    Each worker process has its own cache, so hits, misses and evictions
+    are summed over jobs while entries and bytes are the latest size of
+    each worker's cache, summed over workers.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # pid -> (entries, bytes)
+        self._workers: Dict[int, Tuple[int, int]] = {}
+
+    def add(self, report: Dict[str, int]) -> None:
+        self.hits += report["hits"]
+        self.misses += report["misses"]
+        self.evictions += report["evictions"]
+        self._workers[report["pid"]] = (report["entries"], report["bytes"])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": sum(entries for entries, _ in self._workers.values()),
+            "bytes": sum(size for _, size in self._workers.values()),
+            "max_bytes": self.max_bytes,
+            "workers": len(self._workers),
+        }
+
+def counted_call(func: Callable[..., Any], *args: Any) -> Tuple[Any, Optional[Dict[str, int]]]:
+    """Call func and return its result with the template cache counter changes it caused.
+
+    Module-level so worker processes can send their cache activity back. If
+    func raises, the report is attached to the exception as
+    template_cache_report, which is pickled along with it.
+    """
+    cache = get_template_cache()
+    if cache is None:
+        return func(*args), None
+    before = cache.stats()
+    try:
+        result = func(*args)
+    except Exception as error:
+        error.template_cache_report = cache.report_since(before)
+        raise
+    return result, cache.report_since(before)
+
+_template_cache: Optional[TemplateCache] = None
+
+def get_template_cache() -> Optional[TemplateCache]:
+    """Return the process-wide template cache, or None when disabled."""
+    global _template_cache
+    if config.TEMPLATE_CACHE_BYTES <= 0:
+        return None
+    if _template_cache is None:
+        _template_cache = TemplateCache(config.TEMPLATE_CACHE_BYTES)
+    return _template_cache
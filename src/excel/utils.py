@@ -1,86 +1,440 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Sequence, Tuple
+import base64
+import csv
+import io
+import json
+import re
+import zipfile
+from copy import copy
+from itertools import zip_longest
 import openpyxl
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from openpyxl.worksheet.dimensions import RowDimension, ColumnDimension
 from openpyxl.utils import get_column_letter, column_index_from_string
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from src.schemas.models import CellRange
+from src.schemas.models import CellRange, ProcessingTarget
 
 def apply_styles(source_cell: Optional[openpyxl.cell.Cell], 
                 target_cell: openpyxl.cell.Cell, 
-                styles: Optional[Dict[str, Any]] = None) -> None:
+                styles: Optional[Dict[str, Any]] = None,
+                style_cache: Optional["StyleCache"] = None) -> None:
     """Apply styles to a target cell either from a source cell or styles dict."""
     if source_cell:
-        # Copy font properties
-        if source_cell.font:
-            target_cell.font = Font(
-                name=source_cell.font.name,
-                size=source_cell.font.size,
-                bold=source_cell.font.bold,
-                italic=source_cell.font.italic,
-                vertAlign=source_cell.font.vertAlign,
-                underline=source_cell.font.underline,
-                strike=source_cell.font.strike,
-                color=source_cell.font.color
-            )
-        
-        # Copy fill properties
-        if source_cell.fill:
-            target_cell.fill = PatternFill(
-                patternType=source_cell.fill.patternType,
-                fgColor=source_cell.fill.fgColor.rgb if source_cell.fill.fgColor else None,
-                bgColor=source_cell.fill.bgColor.rgb if source_cell.fill.bgColor else None
-            )
-        
-        # Copy border properties
-        if source_cell.border:
-            sides = {}
-            for side in ['left', 'right', 'top', 'bottom']:
-                source_side = getattr(source_cell.border, side)
-                if source_side:
-                    sides[side] = Side(
-                        style=source_side.style,
-                        color=source_side.color
-                    )
-            target_cell.border = Border(**sides)
-        
-        # Copy alignment
-        if source_cell.alignment:
-            target_cell.alignment = Alignment(
-                horizontal=source_cell.alignment.horizontal,
-                vertical=source_cell.alignment.vertical,
-                textRotation=source_cell.alignment.textRotation,
-                wrapText=source_cell.alignment.wrapText,
-                shrinkToFit=source_cell.alignment.shrinkToFit,
-                indent=source_cell.alignment.indent
-            )
-        
-        # Copy number format as is
-        if source_cell.number_format:
-            target_cell.number_format = source_cell.number_format
+        if source_cell.parent.parent is target_cell.parent.parent:
+            # Same workbook: share the already registered style indices
+            target_cell._style = copy(source_cell._style)
+        else:
+            _rebuild_styles(source_cell, target_cell)
     
     if styles:
-        if 'font' in styles:
-            target_cell.font = Font(**styles['font'])
-        
-        if 'fill' in styles:
-            target_cell.fill = PatternFill(**styles['fill'])
-        
-        if 'border' in styles:
-            # Convert border style dictionaries to Side objects
-            border_sides = {}
-            for side in ['left', 'right', 'top', 'bottom']:
-                if side in styles['border']:
-                    side_style = styles['border'][side]
-                    border_sides[side] = Side(
-                        style=side_style['style'],
-                        color=side_style['color']
-                    )
-            target_cell.border = Border(**border_sides)
-        
-        if 'alignment' in styles:
-            target_cell.alignment = Alignment(**styles['alignment'])
-
-def get_cell_range(cell_range: CellRange) -> Dict[str, List[int]]:
-    """Convert CellRange to lists of row and column indices."""
+        if style_cache is None:
+            style_cache = StyleCache()
+        style_cache.apply(target_cell, styles)
+
+def _rebuild_styles(source_cell: openpyxl.cell.Cell, target_cell: openpyxl.cell.Cell) -> None:
+    """Copy styles field by field from a cell in another workbook."""
+    # Copy font properties
+    if source_cell.font:
+        target_cell.font = Font(
+            name=source_cell.font.name,
+            size=source_cell.font.size,
+            bold=source_cell.font.bold,
+            italic=source_cell.font.italic,
+            vertAlign=source_cell.font.vertAlign,
+            underline=source_cell.font.underline,
+            strike=source_cell.font.strike,
+            color=source_cell.font.color
+        )
+    
+    # Copy fill properties
+    if source_cell.fill:
+        target_cell.fill = PatternFill(
+            patternType=source_cell.fill.patternType,
+            fgColor=source_cell.fill.fgColor.rgb if source_cell.fill.fgColor else None,
+            bgColor=source_cell.fill.bgColor.rgb if source_cell.fill.bgColor else None
+        )
+    
+    # Copy border properties
+    if source_cell.border:
+        sides = {}
+        for side in ['left', 'right', 'top', 'bottom']:
+            source_side = getattr(source_cell.border, side)
+            if source_side:
+                sides[side] = Side(
+                    style=source_side.style,
+                    color=source_side.color
+                )
+        target_cell.border = Border(**sides)
+    
+    # Copy alignment
+    if source_cell.alignment:
+        target_cell.alignment = Alignment(
+            horizontal=source_cell.alignment.horizontal,
+            vertical=source_cell.alignment.vertical,
+            textRotation=source_cell.alignment.textRotation,
+            wrapText=source_cell.alignment.wrapText,
+            shrinkToFit=source_cell.alignment.shrinkToFit,
+            indent=source_cell.alignment.indent
+        )
+    
+    # Copy number format as is
+    if source_cell.number_format:
+        target_cell.number_format = source_cell.number_format
+
+def build_style_objects(styles: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a styles dict into openpyxl style objects keyed by cell attribute."""
+    objects = {}
+    if 'font' in styles:
+        objects['font'] = Font(**styles['font'])
+    
+    if 'fill' in styles:
+        objects['fill'] = PatternFill(**styles['fill'])
+    
+    if 'border' in styles:
+        # Convert border style dictionaries to Side objects
+        border_sides = {}
+        for side in ['left', 'right', 'top', 'bottom']:
+            if side in styles['border']:
+                side_style = styles['border'][side]
+                border_sides[side] = Side(
+                    style=side_style['style'],
+                    color=side_style['color']
+                )
+        objects['border'] = Border(**border_sides)
+    
+    if 'alignment' in styles:
+        objects['alignment'] = Alignment(**styles['alignment'])
+    return objects
+
+class StyleCache:
+    """Per-workbook cache of styles dicts resolved to style arrays.
+
+    A styles dict is turned into style objects once, and the style array
+    produced for each distinct starting style is remembered, so applying
+    the same dict to many cells is a single array copy per cell.
+    """
+
+    def __init__(self):
+        self._keys: Dict[int, Any] = {}
+        self._objects: Dict[str, Dict[str, Any]] = {}
+        self._arrays: Dict[Any, Any] = {}
+
+    def _key(self, styles: Dict[str, Any]) -> str:
+        entry = self._keys.get(id(styles))
+        if entry is None or entry[0] is not styles:
+            # Keep a reference so the id cannot be reused while cached
+            entry = (styles, json.dumps(styles, sort_keys=True, default=str))
+            self._keys[id(styles)] = entry
+        return entry[1]
+
+    def objects(self, styles: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the style objects for a styles dict, building them once."""
+        key = self._key(styles)
+        objects = self._objects.get(key)
+        if objects is None:
+            objects = build_style_objects(styles)
+            self._objects[key] = objects
+        return objects
+
+    def apply(self, cell: openpyxl.cell.Cell, styles: Dict[str, Any]) -> None:
+        """Apply a styles dict to a cell."""
+        current = cell._style
+        array_key = (self._key(styles), tuple(current) if current is not None else None)
+        array = self._arrays.get(array_key)
+        if array is None:
+            for name, value in self.objects(styles).items():
+                setattr(cell, name, value)
+            self._arrays[array_key] = copy(cell._style)
+        else:
+            cell._style = copy(array)
+
+# Placeholder for the positions below a short column, which are left untouched
+_SKIP = object()
+
+# CSV fields that are written as numbers; anything else, including "00123"
+# or "NA", is written as the string it is
+_CSV_INT = re.compile(r"-?(0|[1-9][0-9]*)")
+_CSV_FLOAT = re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+
+def _csv_value(field: str) -> Any:
+    """Convert one CSV field: empty is None, plain decimals are int or float."""
+    if not field:
+        return None
+    if _CSV_INT.fullmatch(field):
+        return int(field)
+    if _CSV_FLOAT.fullmatch(field):
+        return float(field)
+    return field
+
+def iter_bulk_rows(target: ProcessingTarget) -> Optional[Iterable[Sequence[Any]]]:
+    """Return the row values of a target from whichever value field is set."""
+    sources = [name for name in ('values', 'columns', 'csv', 'arrow')
+               if getattr(target, name) is not None]
+    if len(sources) > 1:
+        raise ValueError(f"Only one of values, columns, csv or arrow may be set, got {', '.join(sources)}")
+    if not sources:
+        return None
+
+    if target.values is not None:
+        return target.values
+
+    if target.columns is not None:
+        return zip_longest(*target.columns, fillvalue=_SKIP)
+
+    if target.csv is not None:
+        if not target.csv.strip():
+            return []
+        # A blank line reads as an empty row, which still takes up a sheet row
+        return ([_csv_value(field) for field in row] for row in csv.reader(io.StringIO(target.csv)))
+
+    try:
+        import pyarrow
+    except ImportError:
+        raise ValueError("Arrow input requires the pyarrow package")
+    reader = pyarrow.ipc.open_stream(base64.b64decode(target.arrow))
+    table = reader.read_all()
+    return zip(*(column.to_pylist() for column in table.columns))
+
+def write_rows(sheet, start_row: int, start_col: int, rows: Iterable[Sequence[Any]]) -> int:
+    """Write rows of values starting at a cell, returning the number of rows written."""
+    cells = sheet._cells
+    row = start_row - 1
+    for row, row_values in enumerate(rows, start_row):
+        for col, value in enumerate(row_values, start_col):
+            if value is _SKIP:
+                continue
+            cell = cells.get((row, col))
+            if cell is None:
+                # Build the cell directly instead of going through sheet.cell()
+                cells[(row, col)] = Cell(sheet, row=row, column=col, value=value)
+            else:
+                cell.value = value
+    if row >= start_row:
+        sheet._current_row = max(sheet._current_row, row)
+    return row - start_row + 1
+
+def iter_block_cells(sheet, rows: "IndexRange", cols: "IndexRange") -> Iterator[Tuple[Tuple[int, int], Cell]]:
+    """Yield ((row, col), cell) for the cells that exist in a block, without creating any.
+
+    Probes the block position by position when it is smaller than the cell
+    store, and scans the store otherwise.
+    """
+    cells = sheet._cells
+    if len(rows) * len(cols) <= len(cells):
+        for row in rows:
+            for col in cols:
+                cell = cells.get((row, col))
+                if cell is not None:
+                    yield (row, col), cell
+    else:
+        for key, cell in list(cells.items()):
+            if key[0] in rows and key[1] in cols:
+                yield key, cell
+
+def update_row_dimensions(sheet, rows: "IndexRange", **attributes: Any) -> None:
+    """Set attributes such as hidden or height on a run of rows.
+
+    Existing row dimensions are updated in place, keeping what is already
+    set on them; rows without one get a single new RowDimension each.
+    """
+    dimensions = sheet.row_dimensions
+    for row in rows:
+        dim = dimensions.get(row)
+        if dim is None:
+            dim = dimensions[row] = RowDimension(sheet, index=row)
+        for name, value in attributes.items():
+            setattr(dim, name, value)
+
+def update_column_dimensions(sheet, cols: "IndexRange", **attributes: Any) -> None:
+    """Set attributes such as hidden or width on a run of columns as <col min max> spans.
+
+    Existing spans overlapping the run are split at its edges so columns
+    outside it keep their settings; columns in the run that had no
+    dimension share one new span per gap instead of one entry each. New
+    spans have no width, so the columns keep the sheet's default width.
+    """
+    if not cols:
+        return
+    first, last = cols.first, cols.last
+    dimensions = sheet.column_dimensions
+    pieces = []  # (min, max, dimension to copy settings from or None)
+    for letter, dim in list(dimensions.items()):
+        low = dim.min or column_index_from_string(letter)
+        high = max(dim.max or low, low)
+        if high < first or low > last:
+            continue
+        del dimensions[letter]
+        if low < first:
+            pieces.append((low, first - 1, dim, False))
+        if high > last:
+            pieces.append((last + 1, high, dim, False))
+        pieces.append((max(low, first), min(high, last), dim, True))
+
+    covered = sorted((low, high) for low, high, _, inside in pieces if inside)
+    start = first
+    for low, high in covered:
+        if low > start:
+            pieces.append((start, low - 1, None, True))
+        start = max(start, high + 1)
+    if start <= last:
+        pieces.append((start, last, None, True))
+
+    for low, high, template, inside in pieces:
+        letter = get_column_letter(low)
+        # A zero width is left out when saving, where openpyxl's default of 13 would be written
+        dim = copy(template) if template is not None else ColumnDimension(sheet, index=letter, width=0)
+        dim.index, dim.min, dim.max = letter, low, high
+        if inside:
+            for name, value in attributes.items():
+                setattr(dim, name, value)
+        dimensions[letter] = dim
+
+def clone_worksheet(source: Worksheet, titles: Sequence[str]) -> List[Worksheet]:
+    """Copy a worksheet into new sheets with the given titles in one pass over its cells.
+
+    Unlike Workbook.copy_worksheet, cells are created directly in each
+    copy's cell store, and print titles, print area, views and headers are
+    copied along with dimensions, merges and page setup. Style indices are
+    shared with the source, not re-registered.
+    """
+    workbook = source.parent
+    targets = [workbook.create_sheet(title) for title in titles]
+    stores = [(target, target._cells) for target in targets]
+    for key, source_cell in source._cells.items():
+        row, column = key
+        if isinstance(source_cell, MergedCell):
+            for target, cells in stores:
+                cell = cells[key] = MergedCell(target, row, column)
+                cell._style = copy(source_cell._style)
+            continue
+        value, data_type, style = source_cell._value, source_cell.data_type, source_cell._style
+        for target, cells in stores:
+            # Filled in slot by slot: Cell.__init__ dominates the copy time
+            cell = cells[key] = Cell.__new__(Cell)
+            cell.parent = target
+            cell.row = row
+            cell.column = column
+            cell._value = value
+            cell.data_type = data_type
+            cell._style = copy(style) if style is not None else None
+            cell._hyperlink = copy(source_cell._hyperlink) if source_cell._hyperlink else None
+            cell._comment = None
+            if source_cell._comment:
+                cell.comment = copy(source_cell._comment)
+
+    for target in targets:
+        for attr in ("row_dimensions", "column_dimensions"):
+            dimensions = getattr(target, attr)
+            for index, dimension in getattr(source, attr).items():
+                dimensions[index] = copy(dimension)
+                dimensions[index].worksheet = target
+        # Ranges are rebuilt so that they refer to the copy, not the source
+        target.merged_cells = MultiCellRange(
+            [MergedCellRange(target, cell_range.coord) for cell_range in source.merged_cells.ranges])
+        target.sheet_format = copy(source.sheet_format)
+        target.sheet_properties = copy(source.sheet_properties)
+        target.page_margins = copy(source.page_margins)
+        target.print_options = copy(source.print_options)
+        target.page_setup = copy(source.page_setup)
+        target.page_setup._parent = target
+        # The printer settings part belongs to the source sheet
+        target.page_setup.id = None
+        target.HeaderFooter = copy(source.HeaderFooter)
+        target._print_rows = copy(source._print_rows)
+        target._print_cols = copy(source._print_cols)
+        target._print_area = copy(source._print_area)
+        target.views = copy(source.views)
+        for view in target.views.sheetView:
+            view.tabSelected = None
+    return targets
+
+def is_row_target(cell_range: CellRange) -> bool:
+    """Whether a row/column operation targets rows (a row without a column letter)."""
+    return bool(cell_range.start_cell.row and not cell_range.start_cell.col_letter)
+
+class IndexRange(Sequence):
+    """Inclusive run of row or column indices stored as its two bounds."""
+
+    __slots__ = ('_range',)
+
+    def __init__(self, first: int, last: int):
+        self._range = range(first, last + 1)
+
+    @property
+    def first(self) -> Optional[int]:
+        return self._range[0] if self._range else None
+
+    @property
+    def last(self) -> Optional[int]:
+        return self._range[-1] if self._range else None
+
+    def __len__(self) -> int:
+        return len(self._range)
+
+    def __getitem__(self, index):
+        return self._range[index]
+
+    def __iter__(self):
+        return iter(self._range)
+
+    def __reversed__(self):
+        return reversed(self._range)
+
+    def __contains__(self, value) -> bool:
+        return value in self._range
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, IndexRange):
+            return self._range == other._range
+        if isinstance(other, (list, tuple, range)):
+            return len(other) == len(self._range) and all(a == b for a, b in zip(self._range, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"IndexRange({self.first}, {self.last})"
+
+EMPTY_INDEX_RANGE = IndexRange(1, 0)
+
+class SheetRange:
+    """Rows and columns addressed by a CellRange, in O(1) memory.
+
+    An axis left unspecified in the CellRange (whole rows or whole columns)
+    spans the sheet's used dimension when a sheet is given, and is empty
+    otherwise. The used dimension is only computed if that axis is read.
+    Dict-style access (``cell_range['rows']``) is kept for callers.
+    """
+
+    __slots__ = ('_rows', '_cols', '_sheet')
+
+    def __init__(self, rows: Optional[IndexRange], cols: Optional[IndexRange], sheet=None):
+        self._rows = rows
+        self._cols = cols
+        self._sheet = sheet
+
+    @property
+    def rows(self) -> IndexRange:
+        if self._rows is None:
+            self._rows = IndexRange(1, self._sheet.max_row) if self._sheet is not None else EMPTY_INDEX_RANGE
+        return self._rows
+
+    @property
+    def cols(self) -> IndexRange:
+        if self._cols is None:
+            self._cols = IndexRange(1, self._sheet.max_column) if self._sheet is not None else EMPTY_INDEX_RANGE
+        return self._cols
+
+    def __getitem__(self, key: str) -> IndexRange:
+        if key == 'rows':
+            return self.rows
+        if key == 'cols':
+            return self.cols
+        raise KeyError(key)
+
+def get_cell_range(cell_range: CellRange, sheet=None) -> SheetRange:
+    """Convert CellRange to row and column index ranges, clipping whole rows/columns to sheet."""
     start_col = column_index_from_string(cell_range.start_cell.col_letter) if cell_range.start_cell.col_letter else None
     start_row = cell_range.start_cell.row if cell_range.start_cell.row else None
     
@@ -91,7 +445,13 @@ def get_cell_range(cell_range: CellRange) -> Dict[str, List[int]]:
         end_col = start_col
         end_row = start_row
     
-    return {
-        'rows': list(range(start_row, end_row + 1)) if start_row else [],
-        'cols': list(range(start_col, end_col + 1)) if start_col else []
-    }
\ No newline at end of file
+    return SheetRange(
+        IndexRange(start_row, end_row) if start_row else None,
+        IndexRange(start_col, end_col) if start_col else None,
+        sheet
+    )
+
+def get_uncompressed_size(excel_data: bytes) -> int:
+    """Sum the uncompressed sizes listed in the xlsx ZIP central directory."""
+    with zipfile.ZipFile(io.BytesIO(excel_data)) as archive:
+        return sum(info.file_size for info in archive.infolist())
@@ -0,0 +1,174 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class StageTimer:
+    """Stage durations and byte counts collected while serving one request."""
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+        self.bytes: Dict[str, int] = {}
+        # Style table sizes before and after compaction, keyed (table, phase)
+        self.style_records: Dict[Tuple[str, str], int] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+
+    def add_bytes(self, direction: str, count: int) -> None:
+        self.bytes[direction] = self.bytes.get(direction, 0) + count
+
+    def add_style_records(self, table: str, phase: str, count: int) -> None:
+        key = (table, phase)
+        self.style_records[key] = self.style_records.get(key, 0) + count
+
+    def merge(self, other: "StageTimer") -> None:
+        """Add what a timer elsewhere collected, e.g. in a worker process."""
+        self.stages.extend(other.stages)
+        for direction, count in other.bytes.items():
+            self.add_bytes(direction, count)
+        for (table, phase), count in other.style_records.items():
+            self.add_style_records(table, phase, count)
+
+    def server_timing(self) -> str:
+        """Format the stages as a Server-Timing header value, summing repeats."""
+        totals: Dict[str, float] = {}
+        for stage, seconds in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return ", ".join(f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in totals.items())
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("stage_timer", default=None)
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimer]:
+    """Collect stage timings for the duration of a request (or worker call)."""
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+def timed_call(func: Callable[..., Any], *args: Any) -> Tuple[Any, StageTimer]:
+    """Call func collecting stage timings; module-level so workers can return their timings."""
+    with collect_timings() as timer:
+        return func(*args), timer
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as stage if a timer is active; otherwise do nothing."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage, time.perf_counter() - start)
+
+def record_bytes(direction: str, count: int) -> None:
+    """Count workbook bytes read ("in") or written ("out") if a timer is active."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add_bytes(direction, count)
+
+def record_style_compaction(counts: Dict[str, Tuple[int, int]]) -> None:
+    """Count style table records before and after compaction if a timer is active."""
+    timer = _current_timer.get()
+    if timer is not None:
+        for table, (before, after) in counts.items():
+            timer.add_style_records(table, "before", before)
+            timer.add_style_records(table, "after", after)
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Process-wide request counters and stage duration histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self.bytes: Dict[str, int] = {}
+        self.style_records: Dict[Tuple[str, str], int] = {}
+        self.stages: Dict[str, Histogram] = {}
+
+    def record(self, endpoint: str, status_code: int, timer: StageTimer) -> None:
+        """Fold one finished request into the aggregates."""
+        with self._lock:
+            key = (endpoint, str(status_code))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for direction, count in timer.bytes.items():
+                self.bytes[direction] = self.bytes.get(direction, 0) + count
+            for key, count in timer.style_records.items():
+                self.style_records[key] = self.style_records.get(key, 0) + count
+            for stage, seconds in timer.stages:
+                histogram = self.stages.get(stage)
+                if histogram is None:
+                    histogram = self.stages[stage] = Histogram()
+                histogram.observe(seconds)
+
+    def render(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP excel_requests_total Requests served, by endpoint and status code.",
+            "# TYPE excel_requests_total counter",
+        ]
+        with self._lock:
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'excel_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP excel_workbook_bytes_total Workbook bytes read and written.",
+                "# TYPE excel_workbook_bytes_total counter",
+            ]
+            for direction, count in sorted(self.bytes.items()):
+                lines.append(f'excel_workbook_bytes_total{{direction="{direction}"}} {count}')
+
+            lines += [
+                "# HELP excel_style_records_total Style table records before and after compaction on save.",
+                "# TYPE excel_style_records_total counter",
+            ]
+            for (table, phase), count in sorted(self.style_records.items()):
+                lines.append(f'excel_style_records_total{{table="{table}",phase="{phase}"}} {count}')
+
+            lines += [
+                "# HELP excel_stage_duration_seconds Time spent per processing stage.",
+                "# TYPE excel_stage_duration_seconds histogram",
+            ]
+            for stage, histogram in sorted(self.stages.items()):
+                labels = _stage_labels(stage)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'excel_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'excel_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"excel_stage_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"excel_stage_duration_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def _stage_labels(stage: str) -> str:
+    """Split "op.<processing_type>" stage names into stage and processing_type labels."""
+    if stage.startswith("op."):
+        return f'stage="operation",processing_type="{stage[3:]}"'
+    return f'stage="{stage}"'
+
+metrics = MetricsRegistry()
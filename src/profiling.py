@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterator, Optional
+import cProfile
+import json
+import os
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Request IDs become file names, so only a safe subset is kept
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+TOP_ALLOCATIONS = 10
+
+def is_valid_profile_id(profile_id: str) -> bool:
+    return bool(PROFILE_ID_PATTERN.match(profile_id))
+
+def profile_paths(directory: str, profile_id: str) -> Dict[str, str]:
+    """Files a profile is written to: "pstats" and the JSON "summary"."""
+    return {
+        "pstats": os.path.join(directory, f"{profile_id}.pstats"),
+        "summary": os.path.join(directory, f"{profile_id}.json"),
+    }
+
+@contextmanager
+def profile_to(directory: str, profile_id: str) -> Iterator[Dict[str, Any]]:
+    """Profile a block with cProfile and tracemalloc and spool the results.
+
+    The yielded dict is filled with the summary once the block exits.
+    """
+    summary: Dict[str, Any] = {"profile_id": profile_id}
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield summary
+    finally:
+        profiler.disable()
+        summary["wall_seconds"] = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+        summary["peak_memory_bytes"] = peak - baseline
+        summary["retained_memory_bytes"] = current - baseline
+        summary["top_allocations"] = [
+            {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        ]
+
+        os.makedirs(directory, exist_ok=True)
+        paths = profile_paths(directory, profile_id)
+        profiler.dump_stats(paths["pstats"])
+        with open(paths["summary"], "w") as file:
+            json.dump(summary, file, indent=2)
+
+def load_summary(directory: str, profile_id: str) -> Optional[Dict[str, Any]]:
+    """Read a spooled profile summary, or None if there is none."""
+    try:
+        with open(profile_paths(directory, profile_id)["summary"]) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
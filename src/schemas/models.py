@@ -13,11 +13,24 @@ class PasteTarget(BaseModel):
     sheet_name: str
     cells: CellRange
     is_insert: bool = True
+    tile: bool = False  # Repeat the copied block to fill cells (needs an end_cell)
 
 class ProcessingTarget(BaseModel):
     cells: Optional[CellRange] = None
     values: Optional[List[List[Any]]] = None
     styles: Optional[Dict[str, Any]] = None
+    # Bulk alternatives to values, written from the start cell row by row
+    columns: Optional[List[List[Any]]] = None  # Column-oriented arrays
+    csv: Optional[str] = None  # CSV text without header row
+    arrow: Optional[str] = None  # Base64 encoded Arrow IPC stream (requires pyarrow)
+    # copy_sheet: titles for the copies, or how many "<sheet>_copy" sheets to make
+    sheet_names: Optional[List[str]] = None
+    count: Optional[int] = None
+    # group: outline level (1-7, default 1) and whether the group starts collapsed
+    outline_level: Optional[int] = None
+    collapsed: Optional[bool] = None
+    # merge_cells/unmerge_cells: the ranges to merge or unmerge in one step
+    ranges: Optional[List[CellRange]] = None
 
 class Processing(BaseModel):
     processing_type: str
@@ -32,6 +45,19 @@ class ExcelRequest(BaseModel):
     file: str  # Base64 encoded Excel file
     mimetype: str = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     operations: List[Operation]
+    optimize: bool = True  # Rewrite operations into an equivalent cheaper plan
+    dry_run: bool = False  # Return the plan without processing the file
+    compression: Optional[str] = None  # "stored", "fast", "default" or "best"; defaults to config
+
+class PipelineRequest(BaseModel):
+    operations: List[Operation]
+    optimize: bool = True  # Register the optimized plan
+
+class PipelineTransformRequest(BaseModel):
+    file: str  # Base64 encoded Excel file
+    pipeline_id: str
+    params: Optional[Dict[str, Any]] = None  # Values for "{{name}}" placeholders in set_cells values
+    compression: Optional[str] = None
 
 class ExcelResponse(BaseModel):
     output: str  # Base64 encoded Excel file
@@ -39,6 +65,7 @@ class ExcelResponse(BaseModel):
     status: str
     error_code: int
     status_code: int
+    plan: Optional[List[Operation]] = None  # Only set for dry runs
 
 class ValidationError(BaseModel):
     output: str  # Base64 encoded Excel file
@@ -1,7 +1,11 @@
 import pytest
 import openpyxl
+import asyncio
 import base64
+import json
 import io
+import re
+import zipfile
 from datetime import UTC, datetime
 from openpyxl.styles import Font, PatternFill
 import sys
@@ -9,17 +13,25 @@ from pathlib import Path
 
 # Alternative import approach
 try:
-    from src.schemas.models import Processing, Cell, CellRange, ProcessingTarget, PasteTarget
+    from src.schemas.models import Processing, Cell, CellRange, ProcessingTarget, PasteTarget, Operation
     from src.excel.operations import xlsx_operation
-    from src.excel.utils import apply_styles, get_cell_range
-    from src.excel.processor import ExcelProcessor
+    from src.excel.utils import apply_styles, get_cell_range, get_uncompressed_size, StyleCache
+    from src.excel.processor import ExcelProcessor, transform_bytes, referenced_sheets
+    from src.excel.executor import ExcelExecutor, PoolSaturatedError
+    from src.excel.template_cache import TemplateCache, clone_workbook
+    from src.excel.planner import optimize_operations
+    from src.excel.jobs import JobStore, JobRunner
 except ModuleNotFoundError:
     # Add parent directory to path if running tests directly
     sys.path.insert(0, str(Path(__file__).parent.parent))
-    from src.schemas.models import Processing, Cell, CellRange, ProcessingTarget, PasteTarget
+    from src.schemas.models import Processing, Cell, CellRange, ProcessingTarget, PasteTarget, Operation
     from src.excel.operations import xlsx_operation
-    from src.excel.utils import apply_styles, get_cell_range
-    from src.excel.processor import ExcelProcessor
+    from src.excel.utils import apply_styles, get_cell_range, get_uncompressed_size, StyleCache
+    from src.excel.processor import ExcelProcessor, transform_bytes, referenced_sheets
+    from src.excel.executor import ExcelExecutor, PoolSaturatedError
+    from src.excel.template_cache import TemplateCache, clone_workbook
+    from src.excel.planner import optimize_operations
+    from src.excel.jobs import JobStore, JobRunner
 
 @pytest.fixture
 def sample_workbook():
@@ -72,6 +84,62 @@ class TestXlsxOperation:
         assert sheet['C1'].value == "Test"
         assert sheet['D1'].value == "Data"
 
+    def test_copy_cells_overlapping_and_sparse(self, xlsx_op):
+        """Test copying onto an overlapping range reads the source before writing, without creating empty cells"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet["A3"] = 3
+        process = Processing(
+            processing_type="copy",
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(col_letter="A", row=1), end_cell=Cell(col_letter="A", row=100))),
+            paste_target=PasteTarget(sheet_name="Sheet1", cells=CellRange(start_cell=Cell(col_letter="A", row=2)))
+        )
+
+        xlsx_op.copy_cells("Sheet1", process)
+
+        assert [sheet.cell(row=row, column=1).value for row in range(1, 5)] == ["Test", "Test", 1, 3]
+        assert sheet["A2"].font.bold
+        assert not sheet["A4"].has_style
+        assert sheet.max_row == 4
+
+    def test_copy_cells_tile(self, xlsx_op):
+        """Test tiling a small block over a larger target range, cropped at its edges"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        process = Processing(
+            processing_type="copy",
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(col_letter="A", row=1), end_cell=Cell(col_letter="B", row=2))),
+            paste_target=PasteTarget(sheet_name="Sheet1", tile=True, cells=CellRange(
+                start_cell=Cell(col_letter="D", row=1), end_cell=Cell(col_letter="H", row=3)))
+        )
+
+        xlsx_op.copy_cells("Sheet1", process)
+
+        values = [[cell.value for cell in row] for row in sheet.iter_rows(min_row=1, max_row=3, min_col=4, max_col=8)]
+        assert values == [
+            ["Test", "Data", "Test", "Data", "Test"],
+            [1, 2, 1, 2, 1],
+            ["Test", "Data", "Test", "Data", "Test"],
+        ]
+        assert sheet["F3"].font.bold
+        assert sheet.max_column == 8
+
+    def test_copy_style(self, xlsx_op):
+        """Test copying styles only"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet["D1"] = "Kept"
+        process = Processing(
+            processing_type="copy_style",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(col_letter="A", row=1))),
+            paste_target=PasteTarget(sheet_name="Sheet1", cells=CellRange(start_cell=Cell(col_letter="D", row=1)))
+        )
+
+        xlsx_op.copy_style("Sheet1", process)
+
+        assert sheet["D1"].value == "Kept"
+        assert sheet["D1"].font.bold
+        assert sheet["D1"].fill.fgColor.rgb == sheet["A1"].fill.fgColor.rgb
+
     def test_set_cells(self, xlsx_op):
         """Test setting cell values and styles"""
         process = Processing(
@@ -103,6 +171,107 @@ class TestXlsxOperation:
         assert sheet['B1'].font.bold is True
         assert sheet['B1'].fill.fgColor.rgb == "00FF0000"
 
+    def test_set_cells_columns(self, xlsx_op):
+        """Test bulk column-oriented values"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="C", row=2)),
+                columns=[[1, 2, 3], ["a", "b"]]
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert [sheet.cell(row=r, column=3).value for r in range(2, 5)] == [1, 2, 3]
+        assert [sheet.cell(row=r, column=4).value for r in range(2, 5)] == ["a", "b", None]
+        # Existing cells keep their styles when overwritten
+        assert sheet['A1'].font.bold is True
+
+    def test_set_cells_short_column_keeps_cells_below(self, xlsx_op):
+        """Test a short column leaves existing cells below it alone, like a short values row"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="A", row=1)),
+                columns=[["x", "y"], ["z"]]
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert [sheet['A1'].value, sheet['A2'].value, sheet['B1'].value] == ["x", "y", "z"]
+        assert sheet['B2'].value == 2
+
+    def test_set_cells_csv(self, xlsx_op):
+        """Test bulk CSV values"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="A", row=1)),
+                csv="Name,10,1.5\nOther,,2.5\n"
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert sheet['A1'].value == "Name"
+        assert sheet['B1'].value == 10
+        assert sheet['C2'].value == 2.5
+        assert sheet['B2'].value is None
+        assert sheet['A1'].font.bold is True
+        assert sheet.max_row == 2
+
+    def test_set_cells_csv_blank_line(self, xlsx_op):
+        """Test a blank CSV line leaves its row empty instead of pulling later rows up"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="H", row=1)),
+                csv="a,1\n\nc,3"
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert sheet['H2'].value is None
+        assert [sheet['H3'].value, sheet['I3'].value] == ["c", 3]
+
+    def test_set_cells_csv_keeps_text(self, xlsx_op):
+        """Test CSV text that only looks like a number or a missing value is kept as written"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="A", row=1)),
+                csv="NA,null,N/A,00123\n1,,2,-0.5e3\n"
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert [cell.value for cell in sheet[1]] == ["NA", "null", "N/A", "00123"]
+        assert [cell.value for cell in sheet[2]] == [1, None, 2, -500.0]
+        assert isinstance(sheet['A2'].value, int) and isinstance(sheet['C2'].value, int)
+
+    def test_set_cells_multiple_value_sources(self, xlsx_op):
+        """Test only one value source may be given"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="A", row=1)),
+                values=[[1]],
+                csv="1"
+            )
+        )
+
+        with pytest.raises(ValueError, match="Only one of values, columns, csv or arrow"):
+            xlsx_op.set_cells("Sheet1", process)
+
     def test_copy_sheet(self, xlsx_op):
         """Test copying an entire sheet"""
         process = Processing(processing_type="copy_sheet")
@@ -120,6 +289,33 @@ class TestXlsxOperation:
         assert copied_sheet['A1'].font.__dict__ == original_sheet['A1'].font.__dict__
         assert copied_sheet['A1'].fill.__dict__ == original_sheet['A1'].fill.__dict__
 
+    def test_copy_sheet_fan_out(self, xlsx_op):
+        """Test copying a sheet into several copies keeps merges, dimensions and print settings"""
+        source = xlsx_op.workbook["Sheet1"]
+        source.merge_cells("D1:E2")
+        source.row_dimensions[2].height = 30
+        source.print_title_rows = "1:1"
+
+        xlsx_op.copy_sheet("Sheet1", Processing(processing_type="copy_sheet", target=ProcessingTarget(count=2)))
+        xlsx_op.copy_sheet("Sheet1", Processing(
+            processing_type="copy_sheet", target=ProcessingTarget(sheet_names=["North", "South"])))
+
+        assert xlsx_op.workbook.sheetnames == ["Sheet1", "Sheet1_copy", "Sheet1_copy1", "North", "South"]
+        copied = xlsx_op.workbook["South"]
+        assert copied["A1"].value == "Test"
+        assert [str(cell_range) for cell_range in copied.merged_cells.ranges] == ["D1:E2"]
+        assert all(cell_range.ws is copied for cell_range in copied.merged_cells.ranges)
+        assert copied.row_dimensions[2].height == 30
+        assert copied.print_title_rows == source.print_title_rows
+
+        # Copies get their own style arrays
+        copied["A1"].font = Font(italic=True)
+        assert not source["A1"].font.italic
+
+        with pytest.raises(ValueError, match="already exists"):
+            xlsx_op.copy_sheet("Sheet1", Processing(
+                processing_type="copy_sheet", target=ProcessingTarget(sheet_names=["North"])))
+
     def test_insert_sheet(self, xlsx_op):
         """Test inserting a new sheet"""
         process = Processing(processing_type="insert_sheet")
@@ -179,6 +375,188 @@ class TestXlsxOperation:
         assert sheet['A2'].value is None
         assert sheet['B2'].value is None
 
+    def test_hide_columns_as_one_span(self, xlsx_op):
+        """Test hiding columns writes one span and splits an overlapping one"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.column_dimensions.group("A", "F", outline_level=0)
+        sheet.column_dimensions["A"].width = 20
+        process = Processing(
+            processing_type="hidden",
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(col_letter="C"), end_cell=Cell(col_letter="H")
+            ))
+        )
+        xlsx_op.hide_rows_or_cols("Sheet1", process)
+
+        spans = sorted((dim.min, dim.max, dim.width, dim.hidden) for dim in sheet.column_dimensions.values())
+        assert spans == [(1, 2, 20, False), (3, 6, 20, True), (7, 8, 0, True)]
+
+        output = io.BytesIO()
+        xlsx_op.workbook.save(output)
+        with zipfile.ZipFile(output) as archive:
+            xml = archive.read("xl/worksheets/sheet1.xml").decode()
+        assert len(re.findall(r"<col ", xml)) == 3
+
+    def test_hide_rows_keeps_height(self, xlsx_op):
+        """Test hiding rows updates existing row dimensions in place"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.row_dimensions[2].height = 40
+        process = Processing(
+            processing_type="hidden",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=4)))
+        )
+        xlsx_op.hide_rows_or_cols("Sheet1", process)
+
+        assert sheet.row_dimensions[2].height == 40
+        assert all(sheet.row_dimensions[row].hidden for row in range(2, 5))
+
+    def test_group_rows_collapsed(self, xlsx_op):
+        """Test grouping rows into a collapsed outline survives a save"""
+        process = Processing(
+            processing_type="group",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=5)),
+                collapsed=True
+            )
+        )
+        xlsx_op.group_rows_or_cols("Sheet1", process)
+
+        output = io.BytesIO()
+        xlsx_op.workbook.save(output)
+        sheet = openpyxl.load_workbook(output)["Sheet1"]
+        for row in range(2, 6):
+            assert sheet.row_dimensions[row].outline_level == 1
+            assert sheet.row_dimensions[row].hidden is True
+        assert sheet.row_dimensions[6].collapsed is True
+        assert sheet.sheet_format.outlineLevelRow == 1
+
+    def test_group_columns_expanded(self, xlsx_op):
+        """Test grouping columns at a nested level without hiding them"""
+        process = Processing(
+            processing_type="group",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="B"), end_cell=Cell(col_letter="D")),
+                outline_level=2
+            )
+        )
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.column_dimensions["E"].width = 20
+        xlsx_op.group_rows_or_cols("Sheet1", process)
+
+        dim = sheet.column_dimensions["B"]
+        assert (dim.min, dim.max, dim.outline_level, dim.hidden) == (2, 4, 2, False)
+        assert sheet.sheet_format.outlineLevelCol == 2
+
+        output = io.BytesIO()
+        xlsx_op.workbook.save(output)
+        sheet_xml = zipfile.ZipFile(output).read("xl/worksheets/sheet1.xml").decode()
+        cols = re.findall(r"<col [^>]*>", sheet_xml)
+        assert 'min="2" max="4"' in cols[0] and "width" not in cols[0]
+        assert 'min="5" max="5"' in cols[1] and 'width="20"' in cols[1] and "collapsed" not in cols[1]
+        assert 'outlineLevelCol="2"' in sheet_xml
+
+        process.target.outline_level = 8
+        with pytest.raises(ValueError, match="outline_level"):
+            xlsx_op.group_rows_or_cols("Sheet1", process)
+
+    def _ranges(self, *coords):
+        ranges = []
+        for coord in coords:
+            start, end = coord.split(":")
+            ranges.append(CellRange(
+                start_cell=Cell(col_letter=start[0], row=int(start[1:])),
+                end_cell=Cell(col_letter=end[0], row=int(end[1:]))
+            ))
+        return ranges
+
+    def _batch(self, processing_type, *coords):
+        return Processing(processing_type=processing_type, target=ProcessingTarget(ranges=self._ranges(*coords)))
+
+    def test_merge_cells_batch(self, xlsx_op):
+        """Test many ranges are merged in one step with edge borders"""
+        from openpyxl.cell.cell import MergedCell
+        from openpyxl.styles import Border, Side
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet["A4"].border = Border(top=Side(style="thin"), left=Side(style="thick"))
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A4:C5", "E4:F4", "A7:B8", "D1:D1"))
+
+        assert {str(r) for r in sheet.merged_cells.ranges} == {"A4:C5", "E4:F4", "A7:B8"}
+        assert isinstance(sheet["B5"], MergedCell)
+        assert sheet["B4"].border.top.style == "thin"
+        assert sheet["A5"].border.left.style == "thick"
+        assert sheet["B5"].border.top.style is None
+
+        # Merging an exact existing range again is a no-op
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A4:C5"))
+        assert len(sheet.merged_cells.ranges) == 3
+
+    def test_merge_cells_rejects_overlap(self, xlsx_op):
+        """Test an overlapping batch is rejected before anything is merged"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A1:B2"))
+
+        with pytest.raises(ValueError, match="overlaps merged range A1:B2"):
+            xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "D1:E1", "B2:C3"))
+        with pytest.raises(ValueError, match="overlaps"):
+            xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "D1:E2", "E2:F3"))
+        with pytest.raises(ValueError, match="overlaps"):
+            xlsx_op.join_cells("Sheet1", Processing(
+                processing_type="join_cells",
+                target=ProcessingTarget(cells=self._ranges("B1:C1")[0])
+            ))
+        assert {str(r) for r in sheet.merged_cells.ranges} == {"A1:B2"}
+
+    def test_unmerge_cells_batch(self, xlsx_op):
+        """Test every merge intersecting the given ranges is unmerged"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A1:B2", "D1:E1", "A5:C5"))
+
+        xlsx_op.unmerge_cells("Sheet1", self._batch("unmerge_cells", "B2:E2", "Z9:Z9"))
+
+        assert {str(r) for r in sheet.merged_cells.ranges} == {"D1:E1", "A5:C5"}
+        assert sheet["A1"].value == "Test"
+        assert (2, 2) not in sheet._cells
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A1:C2"))
+
+    def test_merged_workbook_is_collectable(self):
+        """Test the merge index does not keep a processed workbook alive"""
+        import gc
+        import weakref
+
+        workbook = openpyxl.Workbook()
+        workbook.active.title = "Sheet1"
+        op = xlsx_operation(workbook)
+        op.join_cells("Sheet1", Processing(
+            processing_type="join_cells",
+            target=ProcessingTarget(cells=self._ranges("A1:B2")[0])
+        ))
+        ref = weakref.ref(workbook)
+        del op, workbook
+        gc.collect()
+
+        assert ref() is None
+
+    def test_merge_index_follows_shifts(self, xlsx_op):
+        """Test inserted and deleted rows move the indexed merges"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A3:B4", "A10:B10", "D1:D200"))
+
+        xlsx_op.insert_rows_or_cols("Sheet1", Processing(
+            processing_type="insert",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2), end_cell=Cell(row=3)))
+        ))
+        xlsx_op.delete_rows_or_cols("Sheet1", Processing(
+            processing_type="delete",
+            target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=12)))
+        ))
+
+        assert {str(r) for r in sheet.merged_cells.ranges} == {"A5:B6", "D1:D201"}
+        # The old positions are free and the new ones are taken
+        xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "A3:B4", "A12:B12"))
+        with pytest.raises(ValueError, match="A5:B6"):
+            xlsx_op.merge_cells("Sheet1", self._batch("merge_cells", "B6:C7"))
+
 class TestExcelStyles:
     @pytest.fixture
     def xlsx_op(self):
@@ -342,9 +720,10 @@ class TestExcelStyles:
         for row in range(2, 5):
             assert sheet.row_dimensions[row].height == 30
         
-        # Check column widths
-        for col_letter in ['B', 'C', 'D']:
-            assert sheet.column_dimensions[col_letter].width == 15
+        # Column widths are one <col min max> span
+        dim = sheet.column_dimensions['B']
+        assert (dim.min, dim.max, dim.width) == (2, 4, 15)
+        assert 'C' not in sheet.column_dimensions and 'D' not in sheet.column_dimensions
 
     def test_multiple_style_combinations(self, xlsx_op):
         """Test applying multiple styles simultaneously"""
@@ -513,6 +892,44 @@ class TestExcelStyles:
         assert sheet["D2"].font.italic is True
         assert sheet["D2"].font.underline == "double"
 
+    def test_range_styles_with_overrides(self, xlsx_op):
+        """Test position borders, range styles and per-cell overrides combine"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(
+                    start_cell=Cell(col_letter="B", row=2),
+                    end_cell=Cell(col_letter="E", row=6)
+                ),
+                styles={
+                    "border": {
+                        "top": {"style": "thin", "color": "000000"},
+                        "left": {"style": "thin", "color": "000000"}
+                    },
+                    "fill": {"patternType": "solid", "fgColor": "00FF00"},
+                    "cells": {
+                        "C3": {"font": {"italic": True}},
+                        "B2": {"font": {"bold": True}}
+                    }
+                }
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+        sheet = xlsx_op.workbook["Sheet1"]
+
+        assert sheet["B2"].border.top.style == "thin"
+        assert sheet["B2"].border.left.style == "thin"
+        assert sheet["B2"].font.bold is True
+        assert sheet["C2"].border.top.style == "thin"
+        assert sheet["C2"].border.left is None
+        assert sheet["C3"].font.italic is True
+        assert sheet["C3"].border.top.style is None
+        assert sheet["D4"].font.italic is False
+        assert sheet["E6"].fill.fgColor.rgb == "0000FF00"
+        assert sheet["C3"].fill.fgColor.rgb == "0000FF00"
+        assert sheet["F7"].has_style is False
+
 class TestUtils:
     def test_apply_styles(self):
         """Test applying styles from one cell to another"""
@@ -531,6 +948,54 @@ class TestUtils:
         assert target_cell.font.size == source_cell.font.size
         assert target_cell.fill.fgColor.rgb == source_cell.fill.fgColor.rgb
 
+    def test_apply_styles_shares_style_array(self):
+        """Test same-workbook copies reuse the registered style"""
+        wb = openpyxl.Workbook()
+        source_cell = wb.active['A1']
+        source_cell.font = Font(bold=True)
+        source_cell.number_format = "0.00"
+        target_cell = wb.create_sheet("Other")['C3']
+        fonts_before = len(wb._fonts)
+
+        apply_styles(source_cell, target_cell)
+
+        assert target_cell.style_id == source_cell.style_id
+        assert target_cell.number_format == "0.00"
+        assert len(wb._fonts) == fonts_before
+
+    def test_apply_styles_across_workbooks(self):
+        """Test copying styles from a cell in another workbook"""
+        source_cell = openpyxl.Workbook().active['A1']
+        source_cell.font = Font(italic=True, size=9)
+        target_cell = openpyxl.Workbook().active['A1']
+
+        apply_styles(source_cell, target_cell)
+
+        assert target_cell.font.italic is True
+        assert target_cell.font.size == 9
+
+    def test_style_cache_matches_direct_styles(self):
+        """Test cached dict styles produce the same result as building them per cell"""
+        styles = {
+            "font": {"bold": True, "color": "FF0000"},
+            "fill": {"patternType": "solid", "fgColor": "FFFF00"},
+            "border": {"top": {"style": "thin", "color": "000000"}},
+        }
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        sheet['A2'].number_format = "0%"
+        cache = StyleCache()
+
+        for coord in ("A1", "B1", "A2"):
+            apply_styles(None, sheet[coord], styles, cache)
+        apply_styles(None, sheet['C1'], styles)
+
+        assert sheet['B1'].style_id == sheet['A1'].style_id == sheet['C1'].style_id
+        assert sheet['A2'].font.bold is True
+        assert sheet['A2'].number_format == "0%"
+        assert sheet['B1'].border.top.style == "thin"
+        assert sheet['B1'].fill.fgColor.rgb == "00FFFF00"
+
     def test_get_cell_range(self):
         """Test getting row and column ranges from CellRange object"""
         cell_range = CellRange(
@@ -615,4 +1080,1444 @@ class TestErrorCases:
         process = Processing(processing_type="insert_sheet")
         
         with pytest.raises(ValueError, match="Sheet Sheet1 already exists"):
-            xlsx_op.insert_sheet("Sheet1", process)
\ No newline at end of file
+            xlsx_op.insert_sheet("Sheet1", process)
+
+class TestTransformEndpoints:
+    @pytest.fixture
+    def client(self):
+        from fastapi.testclient import TestClient
+        from main import app
+        return TestClient(app)
+
+    @pytest.fixture
+    def workbook_bytes(self, sample_workbook):
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        return output.getvalue()
+
+    def test_transform_excel_binary(self, client, workbook_bytes):
+        """Test multipart upload returns the raw xlsx"""
+        operations = [{
+            "sheet_name": "Sheet1",
+            "processing": [{
+                "processing_type": "set_cells",
+                "target": {
+                    "cells": {"start_cell": {"col_letter": "C", "row": 1}},
+                    "values": [["Binary"]]
+                }
+            }]
+        }]
+
+        response = client.post(
+            "/transform_excel/binary",
+            files={"file": ("input.xlsx", workbook_bytes)},
+            data={"operations": json.dumps(operations)},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith(
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        wb = openpyxl.load_workbook(io.BytesIO(response.content))
+        assert wb["Sheet1"]["C1"].value == "Binary"
+        assert wb["Sheet1"]["A1"].value == "Test"
+
+    def test_transform_excel_binary_error_envelope(self, client, workbook_bytes):
+        """Test binary endpoint keeps the JSON error envelope"""
+        response = client.post(
+            "/transform_excel/binary",
+            files={"file": ("input.xlsx", workbook_bytes)},
+            data={"operations": "not json"},
+        )
+
+        assert response.status_code == 400
+        assert response.json()["status"] == "Error"
+        assert response.json()["error_code"] == 400
+
+    def test_transform_excel_batch(self, client, workbook_bytes):
+        """Test batch endpoint streams one result per file and isolates failures"""
+        operations = [{
+            "sheet_name": "Sheet1",
+            "processing": [{
+                "processing_type": "set_cells",
+                "target": {
+                    "cells": {"start_cell": {"col_letter": "C", "row": 1}},
+                    "values": [["Batch"]]
+                }
+            }]
+        }]
+
+        response = client.post(
+            "/transform_excel/batch",
+            files=[
+                ("files", ("first.xlsx", workbook_bytes)),
+                ("files", ("broken.xlsx", b"not a workbook")),
+                ("files", ("second.xlsx", workbook_bytes)),
+            ],
+            data={"operations": json.dumps(operations)},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        results = {item["filename"]: item for item in map(json.loads, response.text.splitlines())}
+        assert set(results) == {"first.xlsx", "broken.xlsx", "second.xlsx"}
+        assert results["broken.xlsx"]["status"] == "Error"
+        assert results["broken.xlsx"]["status_code"] == 400
+        for name, index in (("first.xlsx", 0), ("second.xlsx", 2)):
+            assert results[name]["index"] == index
+            assert results[name]["status"] == "Success"
+            wb = openpyxl.load_workbook(io.BytesIO(base64.b64decode(results[name]["output"])))
+            assert wb["Sheet1"]["C1"].value == "Batch"
+
+    def test_batch_reads_spooled_uploads(self, workbook_bytes):
+        """Test batch items read their workbook from a spool file and close it"""
+        import tempfile
+        import main
+
+        spools = []
+        for _ in range(2):
+            spool = tempfile.TemporaryFile()
+            spool.write(workbook_bytes)
+            spool.seek(0)
+            spools.append(("book.xlsx", spool))
+
+        async def run():
+            return [line async for line in main.iter_batch_results(spools, [])]
+
+        lines = asyncio.run(run())
+        assert [json.loads(line)["status"] for line in lines] == ["Success", "Success"]
+        assert all(spool.closed for _, spool in spools)
+
+    def test_transform_excel_batch_invalid_operations(self, client, workbook_bytes):
+        """Test invalid shared operations fail the batch up front"""
+        response = client.post(
+            "/transform_excel/batch",
+            files=[("files", ("first.xlsx", workbook_bytes))],
+            data={"operations": "[{}]"},
+        )
+
+        assert response.status_code == 400
+        assert response.json()["status"] == "Error"
+
+
+class TestExcelExecutor:
+    def test_process_mode_runs_transform(self, sample_workbook):
+        """Test workbook processing in the process pool"""
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(
+                    cells=CellRange(start_cell=Cell(col_letter="A", row=3)),
+                    values=[["Pooled"]]
+                )
+            )
+        ])]
+
+        executor = ExcelExecutor(mode="process", pool_size=1, queue_depth=1)
+        try:
+            result = asyncio.run(executor.run(transform_bytes, output.getvalue(), operations))
+        finally:
+            executor.shutdown()
+
+        wb = openpyxl.load_workbook(io.BytesIO(result))
+        assert wb["Sheet1"]["A3"].value == "Pooled"
+        assert executor.in_flight == 0
+
+    def test_saturated_pool_rejects(self):
+        """Test backpressure once pool and queue are full"""
+        executor = ExcelExecutor(mode="process", pool_size=1, queue_depth=0, retry_after=7)
+        executor.in_flight = 1
+
+        with pytest.raises(PoolSaturatedError) as exc_info:
+            asyncio.run(executor.run(len, b""))
+        assert exc_info.value.retry_after == 7
+
+    def test_saturated_pool_returns_503(self, monkeypatch):
+        """Test saturated pool maps to 503 with Retry-After"""
+        from fastapi.testclient import TestClient
+        import main
+
+        busy = ExcelExecutor(mode="process", pool_size=1, queue_depth=0, retry_after=3)
+        busy.in_flight = 1
+        monkeypatch.setattr(main, "executor", busy)
+
+        response = TestClient(main.app).post("/transform_excel", json={
+            "file": base64.b64encode(b"").decode(),
+            "operations": []
+        })
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "3"
+        assert response.json()["status"] == "Error"
+
+    def test_worker_template_cache_stats(self, monkeypatch, sample_workbook):
+        """Test /stats adds up the template cache counters reported by worker processes"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+        from src.excel import template_cache
+
+        monkeypatch.setattr(config, "TEMPLATE_CACHE_BYTES", 10 * 1024 * 1024)
+        monkeypatch.setattr(template_cache, "_template_cache", None)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        executor = ExcelExecutor(mode="process", pool_size=1, queue_depth=1)
+        monkeypatch.setattr(main, "executor", executor)
+        try:
+            for _ in range(2):
+                asyncio.run(executor.run(transform_bytes, output.getvalue(), []))
+            with pytest.raises(Exception):
+                asyncio.run(executor.run(transform_bytes, b"not a workbook", []))
+            stats = TestClient(main.app).get("/stats").json()["template_cache"]
+        finally:
+            executor.shutdown()
+
+        assert (stats["hits"], stats["misses"]) == (1, 2)
+        assert (stats["entries"], stats["workers"]) == (1, 1)
+        assert stats["bytes"] == get_uncompressed_size(output.getvalue())
+
+
+class TestTemplateCache:
+    @pytest.fixture
+    def workbook_bytes(self, sample_workbook):
+        sample_workbook["Sheet1"].merge_cells("C1:D2")
+        sample_workbook["Sheet1"].row_dimensions[2].height = 25
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        return output.getvalue()
+
+    def test_hit_returns_isolated_clone(self, workbook_bytes):
+        """Test repeated templates are served from cache as independent copies"""
+        cache = TemplateCache(max_bytes=10 * 1024 * 1024)
+
+        first = cache.get_workbook(workbook_bytes)
+        first["Sheet1"]["A1"].value = "Changed"
+        first["Sheet1"]["A1"].font = Font(italic=True)
+        first["Sheet1"].row_dimensions[2].height = 40
+        second = cache.get_workbook(workbook_bytes)
+
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        sheet = second["Sheet1"]
+        assert sheet["A1"].value == "Test"
+        assert sheet["A1"].font.bold is True
+        assert sheet["A1"].font.italic is False
+        assert sheet.row_dimensions[2].height == 25
+        assert "C1:D2" in set(str(mr) for mr in sheet.merged_cells.ranges)
+
+    def test_clone_saves(self, workbook_bytes):
+        """Test a cloned workbook round-trips through save"""
+        clone = clone_workbook(openpyxl.load_workbook(io.BytesIO(workbook_bytes)))
+        clone["Sheet1"]["B2"].value = 5
+
+        output = io.BytesIO()
+        clone.save(output)
+        wb = openpyxl.load_workbook(output)
+
+        assert wb["Sheet1"]["B2"].value == 5
+        assert wb["Sheet1"]["A1"].fill.fgColor.rgb == "00FF0000"
+
+    def test_eviction_under_budget(self, workbook_bytes, sample_workbook):
+        """Test least recently used templates are evicted to fit the budget"""
+        sample_workbook["Sheet1"]["E5"] = "other"
+        other = io.BytesIO()
+        sample_workbook.save(other)
+        size = get_uncompressed_size(workbook_bytes)
+        cache = TemplateCache(max_bytes=size + size // 2)
+
+        cache.get_workbook(workbook_bytes)
+        cache.get_workbook(other.getvalue())
+
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["entries"] == 1
+
+
+class TestOperationPlanner:
+    @staticmethod
+    def _rows_op(processing_type, first, last=None):
+        return Processing(
+            processing_type=processing_type,
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(row=first),
+                end_cell=Cell(row=last) if last else None
+            ))
+        )
+
+    @staticmethod
+    def _write(coord, values, styles=None):
+        return Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter=coord[0], row=int(coord[1:]))),
+                values=values,
+                styles=styles
+            )
+        )
+
+    @staticmethod
+    def _snapshot(workbook):
+        return {
+            ws.title: (
+                {coord: cell.value for coord, cell in
+                 ((c.coordinate, c) for row in ws.iter_rows() for c in row)},
+                {row: dim.hidden for row, dim in ws.row_dimensions.items() if dim.hidden},
+                {c.coordinate for row in ws.iter_rows() for c in row if c.font.b},
+            )
+            for ws in workbook.worksheets
+        }
+
+    def _assert_equivalent(self, operations):
+        results = []
+        for ops in (operations, optimize_operations(operations)):
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.title = "Sheet1"
+            for row in range(1, 30):
+                ws.cell(row=row, column=1, value=row)
+            processor = ExcelProcessor.__new__(ExcelProcessor)
+            processor.workbook = wb
+            processor.operations = xlsx_operation(wb)
+            for operation in ops:
+                processor.process_operations(operation.sheet_name, operation.processing)
+            results.append(self._snapshot(wb))
+        assert results[0] == results[1]
+
+    def test_coalesce_inserts(self):
+        """Test adjacent single-row inserts become one insert"""
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            self._rows_op("insert", 3) for _ in range(5)
+        ] + [self._rows_op("insert", 8)])]
+
+        plan = optimize_operations(operations)
+
+        assert len(plan) == 1
+        assert len(plan[0].processing) == 1
+        cells = plan[0].processing[0].target.cells
+        assert (cells.start_cell.row, cells.end_cell.row) == (3, 8)
+        self._assert_equivalent(operations)
+
+    def test_coalesce_deletes_and_hidden(self):
+        """Test adjacent deletes and hidden rows are merged"""
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            self._rows_op("delete", 5),
+            self._rows_op("delete", 5),
+            self._rows_op("delete", 3, 4),
+            self._rows_op("hidden", 10),
+            self._rows_op("hidden", 11),
+            self._rows_op("hidden", 9, 10),
+            self._rows_op("hidden", 20),
+        ])]
+
+        plan = optimize_operations(operations)
+
+        assert [p.processing_type for p in plan[0].processing] == ["delete", "hidden", "hidden"]
+        self._assert_equivalent(operations)
+
+    def test_fuse_and_drop_writes(self):
+        """Test stacked writes fuse and overwritten writes are dropped"""
+        operations = [
+            Operation(sheet_name="Sheet1", processing=[
+                self._write("B1", [[1, 2]]),
+                self._write("B2", [[3, 4]]),
+                self._write("D1", [["x"]]),
+            ]),
+            Operation(sheet_name="Sheet1", processing=[
+                self._write("D1", [["y", "z"]]),
+                self._rows_op("insert", 1),
+                self._write("B2", [[5]]),
+            ]),
+        ]
+
+        plan = optimize_operations(operations)
+
+        assert len(plan) == 1
+        assert [p.processing_type for p in plan[0].processing] == ["set_cells", "set_cells", "insert", "set_cells"]
+        assert plan[0].processing[0].target.values == [[1, 2], [3, 4]]
+        self._assert_equivalent(operations)
+
+    def test_styled_writes_are_kept(self):
+        """Test writes with styles are never dropped or fused"""
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            self._write("A1", [[1]], styles={"font": {"bold": True}}),
+            self._write("A1", [[2]]),
+        ])]
+
+        plan = optimize_operations(operations)
+
+        assert len(plan[0].processing) == 2
+
+    def test_whole_column_style_keeps_earlier_write(self):
+        """Test a write is not dropped across a whole-column style that is sized by it"""
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            self._write("A50", [["x"]]),
+            Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(cells=CellRange(start_cell=Cell(col_letter="B")),
+                                        styles={"font": {"bold": True}})
+            ),
+            self._write("A50", [["y"]]),
+        ])]
+
+        plan = optimize_operations(operations)
+
+        assert len(plan[0].processing) == 3
+        self._assert_equivalent(operations)
+
+    def test_dry_run_returns_plan(self):
+        """Test dry run returns the optimized plan without a file"""
+        from fastapi.testclient import TestClient
+        from main import app
+
+        response = TestClient(app).post("/transform_excel", json={
+            "file": "",
+            "dry_run": True,
+            "operations": [{
+                "sheet_name": "Sheet1",
+                "processing": [
+                    {"processing_type": "hidden", "target": {"cells": {"start_cell": {"row": 1}}}},
+                    {"processing_type": "hidden", "target": {"cells": {"start_cell": {"row": 2}}}}
+                ]
+            }]
+        })
+
+        assert response.status_code == 200
+        plan = response.json()["plan"]
+        assert len(plan[0]["processing"]) == 1
+        assert plan[0]["processing"][0]["target"]["cells"]["end_cell"] == {"row": 2}
+
+
+class TestSheetRange:
+    def test_whole_column_clipped_to_used_rows(self, sample_workbook):
+        """Test column-only ranges span the used rows without materializing lists"""
+        sheet = sample_workbook["Sheet1"]
+        cell_range = get_cell_range(CellRange(start_cell=Cell(col_letter="B")), sheet)
+
+        assert cell_range.rows == [1, 2]
+        assert cell_range.cols == [2]
+        assert cell_range['rows'].last == 2
+
+    def test_large_range_is_compact(self):
+        """Test huge explicit ranges are O(1) in memory"""
+        cell_range = get_cell_range(CellRange(
+            start_cell=Cell(col_letter="A", row=1),
+            end_cell=Cell(col_letter="XFD", row=1048576)
+        ))
+
+        assert len(cell_range.rows) == 1048576
+        assert len(cell_range.cols) == 16384
+        assert cell_range.rows[-1] == 1048576
+        assert 500000 in cell_range.rows
+
+    def test_whole_column_styles(self, xlsx_op):
+        """Test styling a whole column only touches used rows"""
+        process = Processing(
+            processing_type="set_cells",
+            target=ProcessingTarget(
+                cells=CellRange(start_cell=Cell(col_letter="B")),
+                styles={"font": {"italic": True}}
+            )
+        )
+
+        xlsx_op.set_cells("Sheet1", process)
+
+        sheet = xlsx_op.workbook["Sheet1"]
+        assert sheet["B1"].font.italic is True
+        assert sheet["B2"].font.italic is True
+        assert sheet.max_row == 2
+
+
+class TestShiftEngine:
+    @staticmethod
+    def _rows_process(processing_type, first, last=None):
+        return Processing(
+            processing_type=processing_type,
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(row=first),
+                end_cell=Cell(row=last) if last else None
+            ))
+        )
+
+    def test_insert_rows_moves_merges_and_dimensions(self, xlsx_op):
+        """Test inserting rows shifts cells, merged ranges and row heights"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.merge_cells("C3:D4")
+        sheet.row_dimensions[2].height = 30
+        sheet["A2"].hyperlink = "https://example.com"
+
+        xlsx_op.insert_rows_or_cols("Sheet1", self._rows_process("insert", 2, 3))
+
+        assert sheet["A1"].value == "Test"
+        assert sheet["A2"].value is None
+        assert sheet["A4"].value == 1
+        assert sheet["A4"].hyperlink.ref == "A4"
+        assert sheet.row_dimensions[4].height == 30
+        assert set(str(mr) for mr in sheet.merged_cells.ranges) == {"C5:D6"}
+
+    def test_insert_inside_merge_widens_it(self, xlsx_op):
+        """Test inserting a row inside a merged range extends the merge"""
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.merge_cells("C3:D4")
+
+        xlsx_op.insert_rows_or_cols("Sheet1", self._rows_process("insert", 4))
+
+        assert set(str(mr) for mr in sheet.merged_cells.ranges) == {"C3:D5"}
+        assert type(sheet["D4"]).__name__ == "MergedCell"
+
+    def test_delete_columns_trims_merges_and_validations(self, xlsx_op):
+        """Test deleting columns shrinks merges and data validation ranges"""
+        from openpyxl.worksheet.datavalidation import DataValidation
+        sheet = xlsx_op.workbook["Sheet1"]
+        sheet.merge_cells("B5:D5")
+        sheet.column_dimensions["E"].width = 20
+        validation = DataValidation(type="list", formula1='"a,b"')
+        sheet.add_data_validation(validation)
+        validation.add("C1:E1")
+
+        xlsx_op.delete_rows_or_cols("Sheet1", Processing(
+            processing_type="delete",
+            target=ProcessingTarget(cells=CellRange(
+                start_cell=Cell(col_letter="B"), end_cell=Cell(col_letter="C")
+            ))
+        ))
+
+        assert sheet["A1"].value == "Test"
+        assert sheet["B1"].value is None
+        assert not sheet.merged_cells.ranges
+        assert type(sheet["B5"]).__name__ == "Cell"
+        assert sheet.column_dimensions["C"].width == 20
+        assert str(validation.sqref) == "B1:C1"
+
+    def test_batched_shifts_match_sequential(self):
+        """Test a run of inserts/deletes gives the same result as one at a time"""
+        processing = [
+            self._rows_process("insert", 1),
+            self._rows_process("delete", 3),
+            self._rows_process("insert", 2, 4),
+        ]
+        expected = openpyxl.Workbook().active
+        for row in range(1, 4):
+            expected.cell(row=row, column=1, value=row)
+        expected.insert_rows(1)
+        expected.delete_rows(3)
+        expected.insert_rows(2, 3)
+
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        for row in range(1, 4):
+            sheet.cell(row=row, column=1, value=row)
+        processor = ExcelProcessor.__new__(ExcelProcessor)
+        processor.workbook = wb
+        processor.operations = xlsx_operation(wb)
+        processor.process_operations(sheet.title, processing)
+
+        assert ([c.value for c in sheet["A"]][:expected.max_row]
+                == [c.value for c in expected["A"]])
+
+
+class TestPassthroughSave:
+    @staticmethod
+    def _shared_strings(data):
+        """Rewrite inline strings into a shared string table, as Excel writes them."""
+        strings = []
+
+        def to_index(match):
+            strings.append(match.group(2))
+            return match.group(1) + b' t="s"><v>' + str(len(strings) - 1).encode() + b'</v></c>'
+
+        source = zipfile.ZipFile(io.BytesIO(data))
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name in source.namelist():
+                part = source.read(name)
+                if name.startswith("xl/worksheets/sheet"):
+                    part = re.sub(rb'(<c r="\w+"(?: s="\d+")?) t="inlineStr"><is><t>([^<]*)</t></is></c>', to_index, part)
+                elif name == "xl/_rels/workbook.xml.rels":
+                    part = part.replace(b"</Relationships>", b'<Relationship Id="rIdS" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/></Relationships>')
+                elif name == "[Content_Types].xml":
+                    part = part.replace(b"</Types>", b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+                archive.writestr(name, part)
+            items = b"".join(b"<si><t>" + value + b"</t></si>" for value in strings)
+            archive.writestr("xl/sharedStrings.xml", b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">' + items + b"</sst>")
+        return output.getvalue()
+
+    @pytest.fixture
+    def workbook_bytes(self):
+        from openpyxl.chart import BarChart, Reference
+        wb = openpyxl.Workbook()
+        wb.active.title = "Edited"
+        for title in ("Edited", "Charted", "Plain"):
+            ws = wb[title] if title in wb.sheetnames else wb.create_sheet(title)
+            for row in range(1, 6):
+                ws.append([f"{title}-{row}", row])
+        for title in ("Edited", "Charted"):
+            chart = BarChart()
+            chart.title = title
+            chart.add_data(Reference(wb[title], min_col=2, min_row=1, max_row=5))
+            wb[title].add_chart(chart, "D2")
+        wb["Plain"]["A1"].font = Font(bold=True)
+        output = io.BytesIO()
+        wb.save(output)
+        return self._shared_strings(output.getvalue())
+
+    @staticmethod
+    def _chart_titles(wb):
+        return {ws.title: [chart.title.tx.rich.p[0].r[0].t for chart in ws._charts] for ws in wb}
+
+    def _save(self, workbook_bytes, save_mode=None, sheet_names=None, edited="Edited"):
+        processor = ExcelProcessor(io.BytesIO(workbook_bytes), save_mode=save_mode, sheet_names=sheet_names)
+        processor.process_operations(edited, [
+            Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(
+                    cells=CellRange(start_cell=Cell(col_letter="A", row=1)),
+                    values=[["Changed"]]
+                )
+            )
+        ])
+        return processor.save().getvalue()
+
+    def test_untouched_sheets_copied_verbatim(self, workbook_bytes):
+        """Test untouched sheet parts are copied byte-for-byte and the edit is kept"""
+        output = self._save(workbook_bytes, "passthrough")
+
+        original = zipfile.ZipFile(io.BytesIO(workbook_bytes))
+        result = zipfile.ZipFile(io.BytesIO(output))
+        for name in ("xl/worksheets/sheet2.xml", "xl/worksheets/sheet3.xml",
+                     "xl/sharedStrings.xml", "xl/drawings/drawing2.xml", "xl/charts/chart2.xml"):
+            assert result.read(name) == original.read(name)
+        assert result.read("xl/worksheets/sheet1.xml") != original.read("xl/worksheets/sheet1.xml")
+
+        wb = openpyxl.load_workbook(io.BytesIO(output))
+        assert wb["Edited"]["A1"].value == "Changed"
+        assert wb["Edited"]["A2"].value == "Edited-2"
+        assert wb["Charted"]["A5"].value == "Charted-5"
+        assert self._chart_titles(wb) == {"Edited": ["Edited"], "Charted": ["Charted"], "Plain": []}
+        assert wb["Plain"]["A1"].value == "Plain-1"
+        assert wb["Plain"]["A1"].font.bold is True
+
+    def test_matches_full_save(self, workbook_bytes):
+        """Test passthrough and full saves load to the same values"""
+        full = openpyxl.load_workbook(io.BytesIO(self._save(workbook_bytes, "full")))
+        passthrough = openpyxl.load_workbook(io.BytesIO(self._save(workbook_bytes, "passthrough")))
+
+        assert full.sheetnames == passthrough.sheetnames
+        for title in full.sheetnames:
+            assert ([[c.value for c in row] for row in full[title].iter_rows()]
+                    == [[c.value for c in row] for row in passthrough[title].iter_rows()])
+
+    def test_unknown_save_mode(self, workbook_bytes):
+        """Test an unknown save mode is rejected"""
+        with pytest.raises(ValueError, match="Unknown save mode"):
+            ExcelProcessor(io.BytesIO(workbook_bytes), save_mode="partial")
+
+    def test_lazy_load_parses_referenced_sheets_only(self, workbook_bytes):
+        """Test lazy loading leaves unreferenced sheets unparsed and copies them through"""
+        processor = ExcelProcessor(io.BytesIO(workbook_bytes), sheet_names={"Charted"})
+        assert [type(ws).__name__ for ws in processor.workbook] == ["LazyWorksheet", "Worksheet", "LazyWorksheet"]
+
+        output = self._save(workbook_bytes, sheet_names={"Charted"}, edited="Charted")
+
+        wb = openpyxl.load_workbook(io.BytesIO(output))
+        assert wb.sheetnames == ["Edited", "Charted", "Plain"]
+        assert wb["Charted"]["A1"].value == "Changed"
+        assert wb["Edited"]["A5"].value == "Edited-5"
+        assert wb["Plain"]["A1"].font.bold is True
+        # The regenerated chart reuses the lazy sheet's part names, which are renamed
+        assert self._chart_titles(wb) == {"Edited": ["Edited"], "Charted": ["Charted"], "Plain": []}
+
+    def test_lazy_sheets_can_be_deleted_and_renamed(self, workbook_bytes):
+        """Test unparsed sheets can still be deleted and renamed"""
+        processor = ExcelProcessor(io.BytesIO(workbook_bytes), sheet_names=set())
+        processor.process_operations("Plain", [Processing(processing_type="delete_sheet")])
+        processor.workbook["Edited"].title = "Renamed"
+
+        wb = openpyxl.load_workbook(processor.save())
+
+        assert wb.sheetnames == ["Renamed", "Charted"]
+        assert wb["Renamed"]["A2"].value == "Edited-2"
+        assert self._chart_titles(wb) == {"Renamed": ["Edited"], "Charted": ["Charted"]}
+
+    def test_referenced_sheets(self):
+        """Test the sheets an operation list needs parsed are collected"""
+        operations = [
+            Operation(sheet_name="Source", processing=[Processing(
+                processing_type="copy",
+                target=ProcessingTarget(cells=CellRange(start_cell=Cell(col_letter="A", row=1))),
+                paste_target=PasteTarget(sheet_name="Target", cells=CellRange(start_cell=Cell(col_letter="A", row=1)))
+            )]),
+            Operation(sheet_name="Dropped", processing=[Processing(processing_type="delete_sheet")])
+        ]
+
+        assert referenced_sheets(operations) == {"Source", "Target"}
+
+
+class TestJobs:
+    @pytest.fixture
+    def workbook_bytes(self, sample_workbook):
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        return output.getvalue()
+
+    @pytest.fixture
+    def operations(self):
+        return [Operation(sheet_name="Sheet1", processing=[
+            Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(
+                    cells=CellRange(start_cell=Cell(col_letter="A", row=3)),
+                    values=[["Queued"]]
+                )
+            ),
+            Processing(
+                processing_type="hidden",
+                target=ProcessingTarget(cells=CellRange(start_cell=Cell(row=2)))
+            )
+        ])]
+
+    def test_job_runs_and_reports_progress(self, tmp_path, workbook_bytes, operations):
+        """Test a job is spooled, processed and its output stored"""
+        runner = JobRunner(JobStore(str(tmp_path), ttl=60), use_processes=False)
+        job_id = runner.submit(workbook_bytes, operations)
+        runner.shutdown()
+
+        job = runner.store.get(job_id)
+        assert job["status"] == "succeeded"
+        assert job["progress"] == {
+            "operation_index": 0, "processing_index": 1, "completed_steps": 2, "total_steps": 2
+        }
+        wb = openpyxl.load_workbook(runner.store.path(job_id, "output"))
+        assert wb["Sheet1"]["A3"].value == "Queued"
+        assert wb["Sheet1"].row_dimensions[2].hidden is True
+
+    def test_progress_writes_are_throttled(self, tmp_path, monkeypatch, workbook_bytes):
+        """Test progress is written at most once per interval and always with the outcome"""
+        from src.excel import jobs
+
+        monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 60)
+        updates = []
+        original_update = JobStore.update
+        def update(store, job_id, **fields):
+            updates.append(fields)
+            original_update(store, job_id, **fields)
+        monkeypatch.setattr(JobStore, "update", update)
+        operations = [Operation(sheet_name="Sheet1", processing=[
+            Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(cells=CellRange(start_cell=Cell(col_letter="A", row=row)),
+                                        values=[[row]])
+            )
+            for row in range(1, 51)
+        ])]
+        runner = JobRunner(JobStore(str(tmp_path), ttl=60), use_processes=False)
+        job_id = runner.submit(workbook_bytes, operations)
+        runner.shutdown()
+
+        assert [fields.get("status") for fields in updates] == ["running", "succeeded"]
+        assert runner.store.get(job_id)["progress"] == {
+            "operation_index": 0, "processing_index": 49, "completed_steps": 50, "total_steps": 50
+        }
+
+    def test_failed_job_records_error(self, tmp_path, operations):
+        """Test a job that raises is marked failed with its error"""
+        runner = JobRunner(JobStore(str(tmp_path), ttl=60), use_processes=False)
+        job_id = runner.submit(b"not a workbook", operations)
+        runner.shutdown()
+
+        job = runner.store.get(job_id)
+        assert job["status"] == "failed"
+        assert job["error"]
+
+    def test_expired_jobs_are_cleaned_up(self, tmp_path, workbook_bytes, operations):
+        """Test jobs past their TTL disappear along with their files"""
+        store = JobStore(str(tmp_path), ttl=0)
+        job_id = store.create(workbook_bytes, operations)
+
+        assert store.get(job_id) is None
+        assert store.cleanup() == 1
+        assert list(tmp_path.glob(f"{job_id}.*")) == []
+
+    def test_job_endpoints(self, tmp_path, monkeypatch, workbook_bytes, operations):
+        """Test submitting, polling and downloading a job over HTTP"""
+        from fastapi.testclient import TestClient
+        import main
+
+        runner = JobRunner(JobStore(str(tmp_path), ttl=60), use_processes=False)
+        monkeypatch.setattr(main, "job_runner", runner)
+        client = TestClient(main.app)
+
+        response = client.post(
+            "/jobs",
+            files={"file": ("input.xlsx", workbook_bytes)},
+            data={"operations": json.dumps([operation.model_dump() for operation in operations])},
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        runner.shutdown()
+
+        status = client.get(f"/jobs/{job_id}").json()
+        assert status["status"] == "succeeded"
+        assert status["progress"]["total_steps"] == 2
+
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.status_code == 200
+        wb = openpyxl.load_workbook(io.BytesIO(result.content))
+        assert wb["Sheet1"]["A3"].value == "Queued"
+
+        assert client.get("/jobs/unknown").status_code == 404
+
+
+class TestCompression:
+    @pytest.mark.parametrize("save_mode", ["full", "passthrough"])
+    def test_compression_levels(self, sample_workbook, save_mode):
+        """Test each compression strategy sets the ZIP method and keeps the workbook readable"""
+        input_data = io.BytesIO()
+        sample_workbook.save(input_data)
+        sizes = {}
+        for compression, method in (("stored", zipfile.ZIP_STORED), ("fast", zipfile.ZIP_DEFLATED),
+                                    ("best", zipfile.ZIP_DEFLATED)):
+            processor = ExcelProcessor(io.BytesIO(input_data.getvalue()), save_mode=save_mode,
+                                       compression=compression)
+            output = processor.save().getvalue()
+            archive = zipfile.ZipFile(io.BytesIO(output))
+            assert {info.compress_type for info in archive.infolist()} == {method}
+            assert openpyxl.load_workbook(io.BytesIO(output))["Sheet1"]["A1"].value == "Test"
+            sizes[compression] = len(output)
+
+        assert sizes["stored"] > sizes["fast"] >= sizes["best"]
+
+    def test_unknown_compression_rejected(self, sample_workbook):
+        """Test an unknown compression strategy is rejected by the API"""
+        from fastapi.testclient import TestClient
+        import main
+
+        client = TestClient(main.app)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        response = client.post("/transform_excel", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "operations": [],
+            "compression": "zstd",
+        })
+
+        assert response.status_code == 400
+        assert "Unknown compression" in response.json()["output"]
+
+
+class TestBenchmarks:
+    def test_run_case_times_every_stage(self):
+        """Test a tiny benchmark case reports every pipeline stage"""
+        from benchmarks.run import BenchmarkCase, run_case
+        from src.excel.processor import OPERATION_METHODS
+
+        results = run_case(BenchmarkCase("tiny", sheets=2, rows=20, cols=4, styled=True, merges=3), repeat=1)
+
+        for stage in ("base64_decode", "load", "save", "base64_encode", *OPERATION_METHODS,
+                      "save_stored", "save_fast", "save_default", "save_best"):
+            assert results[stage]["min"] >= 0
+        assert results["save_stored"]["output_bytes"] > results["save_best"]["output_bytes"]
+        for name in ("set_cells", "set_cells_columns", "set_cells_csv"):
+            assert results[name]["rows_per_second"] > 0
+
+    def test_every_processing_type_has_a_case(self):
+        """Test the benchmark operations cover every processing_type ExcelProcessor supports"""
+        from benchmarks.run import BenchmarkCase, build_operations
+        from src.excel.processor import OPERATION_METHODS
+
+        operations = build_operations(BenchmarkCase("tiny", sheets=1, rows=20, cols=4))
+
+        assert {process.processing_type for process in operations.values()} == set(OPERATION_METHODS)
+
+    def test_compare_flags_regressions(self):
+        """Test only stages slower than the threshold are reported"""
+        from benchmarks.run import compare
+
+        baseline = {"results": {"case": {"load": {"min": 1.0}, "save": {"min": 1.0}, "cells": 10}}}
+        current = {"results": {"case": {"load": {"min": 1.5}, "save": {"min": 1.1}, "cells": 10}}}
+
+        regressions = compare(current, baseline, threshold=0.2)
+
+        assert [(item["case"], item["stage"]) for item in regressions] == [("case", "load")]
+
+
+class TestMetrics:
+    def test_timed_is_noop_without_timer(self):
+        """Test stage timing does nothing outside an instrumented request"""
+        from src.metrics import timed, current_timer
+
+        with timed("load"):
+            pass
+
+        assert current_timer() is None
+
+    def test_server_timing_and_metrics(self, monkeypatch, sample_workbook):
+        """Test stage timings reach the Server-Timing header and /metrics"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+        from src.metrics import MetricsRegistry
+
+        monkeypatch.setattr(config, "METRICS_ENABLED", True)
+        monkeypatch.setattr(main, "metrics", MetricsRegistry())
+        client = TestClient(main.app)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+
+        response = client.post("/transform_excel", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "operations": [{
+                "sheet_name": "Sheet1",
+                "processing": [{
+                    "processing_type": "set_cells",
+                    "target": {
+                        "cells": {"start_cell": {"col_letter": "A", "row": 3}},
+                        "values": [["Timed"]]
+                    }
+                }]
+            }]
+        })
+
+        assert response.status_code == 200
+        stages = {entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")}
+        assert stages == {"base64_decode", "load", "op.set_cells", "save", "base64_encode"}
+
+        text = client.get("/metrics").text
+        assert 'excel_requests_total{endpoint="/transform_excel",status="200"} 1' in text
+        assert f'excel_workbook_bytes_total{{direction="in"}} {len(output.getvalue())}' in text
+        assert 'excel_stage_duration_seconds_count{stage="operation",processing_type="set_cells"} 1' in text
+        assert 'excel_stage_duration_seconds_bucket{stage="load",le="+Inf"} 1' in text
+
+        for path in ("/missing/1", "/missing/2"):
+            assert client.get(path).status_code == 404
+        text = client.get("/metrics").text
+        assert 'excel_requests_total{endpoint="unmatched",status="404"} 2' in text
+        assert "/missing" not in text
+
+    def test_streamed_batch_metrics(self, monkeypatch, sample_workbook):
+        """Test stages timed while a batch response streams reach /metrics"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+        from src.metrics import MetricsRegistry
+
+        monkeypatch.setattr(config, "METRICS_ENABLED", True)
+        monkeypatch.setattr(main, "metrics", MetricsRegistry())
+        client = TestClient(main.app)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+
+        response = client.post(
+            "/transform_excel/batch",
+            files=[("files", ("first.xlsx", output.getvalue())), ("files", ("second.xlsx", output.getvalue()))],
+            data={"operations": "[]"},
+        )
+        assert response.status_code == 200
+        assert len(response.text.splitlines()) == 2
+
+        text = client.get("/metrics").text
+        assert 'excel_requests_total{endpoint="/transform_excel/batch",status="200"} 1' in text
+        assert 'excel_stage_duration_seconds_count{stage="load"} 2' in text
+        assert f'excel_workbook_bytes_total{{direction="in"}} {2 * len(output.getvalue())}' in text
+
+    def test_disabled_adds_no_header(self, monkeypatch, sample_workbook):
+        """Test no Server-Timing header is sent when instrumentation is off"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+
+        monkeypatch.setattr(config, "METRICS_ENABLED", False)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+
+        response = TestClient(main.app).post("/transform_excel", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "operations": []
+        })
+
+        assert response.status_code == 200
+        assert "server-timing" not in response.headers
+
+class TestStyleCompaction:
+    @pytest.fixture
+    def styled_data(self):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Sheet1"
+        for row in range(1, 21):
+            cell = ws.cell(row=row, column=1, value=row)
+            # Each overwritten font stays behind in the font table
+            cell.font = Font(size=8 + row)
+            cell.font = Font(bold=True)
+            cell.number_format = "0.000"
+        other = wb.create_sheet("Other")
+        other["A1"] = 0.5
+        other["A1"].number_format = "0.0%"
+        other["A1"].fill = PatternFill(patternType="solid", fgColor="00FF00")
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+
+    def _process(self, data, **kwargs):
+        from src.metrics import collect_timings
+
+        with collect_timings() as timer:
+            processor = ExcelProcessor(io.BytesIO(data), compact=True, **kwargs)
+            processor.process_operations("Sheet1", [Processing(
+                processing_type="set_cells",
+                target=ProcessingTarget(cells=CellRange(start_cell=Cell(col_letter="B", row=1)),
+                                        values=[["x"]], styles={"font": {"italic": True}})
+            )])
+            output = processor.save()
+        return openpyxl.load_workbook(output), timer
+
+    def test_drops_unused_records(self, styled_data):
+        """Test compaction drops unused fonts and keeps every cell's style"""
+        wb, timer = self._process(styled_data)
+
+        assert timer.style_records[("fonts", "before")] > 20
+        assert timer.style_records[("fonts", "after")] == 3
+        assert len(wb._fonts) == 3
+        assert "compact_styles" in {stage for stage, _ in timer.stages}
+        from src.metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        registry.record("/transform_excel", 200, timer)
+        assert 'excel_style_records_total{table="fonts",phase="after"} 3' in registry.render()
+        assert wb["Sheet1"]["A5"].font.b is True
+        assert wb["Sheet1"]["A5"].number_format == "0.000"
+        assert wb["Sheet1"]["B1"].font.i is True
+        assert wb["Other"]["A1"].number_format == "0.0%"
+        assert wb["Other"]["A1"].fill.fgColor.rgb == "0000FF00"
+
+    def test_keeps_passthrough_sheet_styles(self, styled_data):
+        """Test cellXfs positions survive for sheets copied through unparsed"""
+        wb, timer = self._process(styled_data, sheet_names=["Sheet1"])
+
+        assert timer.style_records[("fonts", "after")] == 3
+        assert wb["Other"]["A1"].number_format == "0.0%"
+        assert wb["Other"]["A1"].fill.fgColor.rgb == "0000FF00"
+        assert wb["Sheet1"]["A5"].font.b is True
+
+    def test_deduplicates_equal_records(self):
+        """Test equal records are merged and references renumbered"""
+        from src.excel.compaction import compact_styles
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws["A1"].font = Font(bold=True)
+        ws["A2"].font = Font(italic=True)
+        # A loaded stylesheet can hold the same record twice
+        list.append(wb._fonts, Font(bold=True))
+        ws["A2"]._style.fontId = len(wb._fonts) - 1
+
+        counts = compact_styles(wb)
+
+        assert counts["fonts"] == (4, 2)
+        assert ws["A1"]._style.fontId == ws["A2"]._style.fontId
+        assert ws["A2"].font.b is True
+
+class TestProfiling:
+    def _post(self, client, sample_workbook, headers):
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        return client.post("/transform_excel", headers=headers, json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "operations": [{
+                "sheet_name": "Sheet1",
+                "processing": [{
+                    "processing_type": "set_cells",
+                    "target": {
+                        "cells": {"start_cell": {"col_letter": "A", "row": 3}},
+                        "values": [["Profiled"]]
+                    }
+                }]
+            }]
+        })
+
+    def test_profile_spooled_by_request_id(self, monkeypatch, tmp_path, sample_workbook):
+        """Test a profiled request spools pstats and a memory summary under its request ID"""
+        from fastapi.testclient import TestClient
+        import pstats
+        import main
+        from src import config
+
+        monkeypatch.setattr(config, "PROFILING_ENABLED", True)
+        monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+        client = TestClient(main.app)
+
+        response = self._post(client, sample_workbook, {"X-Profile": "1", "X-Request-ID": "slow-customer"})
+
+        assert response.status_code == 200
+        assert response.headers["x-profile-id"] == "slow-customer"
+        summary = client.get("/profiles/slow-customer").json()
+        assert summary["peak_memory_bytes"] > 0
+        assert summary["top_allocations"]
+
+        stats_file = tmp_path / "downloaded.pstats"
+        stats_file.write_bytes(client.get("/profiles/slow-customer/pstats").content)
+        functions = {name for _, _, name in pstats.Stats(str(stats_file)).stats}
+        assert "save" in functions
+
+    def test_profiling_requires_config_and_header(self, monkeypatch, tmp_path, sample_workbook):
+        """Test requests are not profiled unless both the config flag and header are set"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+
+        monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+        client = TestClient(main.app)
+
+        monkeypatch.setattr(config, "PROFILING_ENABLED", False)
+        response = self._post(client, sample_workbook, {"X-Profile": "1"})
+        assert "x-profile-id" not in response.headers
+
+        monkeypatch.setattr(config, "PROFILING_ENABLED", True)
+        response = self._post(client, sample_workbook, {})
+        assert "x-profile-id" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+        response = self._post(client, sample_workbook, {"X-Profile": "1", "X-Request-ID": "../escape"})
+        assert response.status_code == 400
+
+
+class TestResultCache:
+    def test_lru_eviction_by_size(self, tmp_path):
+        """Test stored outputs are evicted least recently used first once over budget"""
+        from src.excel.result_cache import ResultCache
+
+        cache = ResultCache(str(tmp_path), max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        assert cache.get("a") == b"aaaa"
+        cache.put("c", b"cccc")
+
+        assert cache.get("b") is None
+        assert cache.get("c") == b"cccc"
+        assert not (tmp_path / "b.xlsx").exists()
+        assert cache.stats()["evictions"] == 1
+
+        # A new process picks up what is on disk
+        reloaded = ResultCache(str(tmp_path), max_bytes=10)
+        assert reloaded.get("a") == b"aaaa"
+        assert reloaded.stats()["bytes"] == 8
+
+    def test_single_flight(self, tmp_path):
+        """Test concurrent identical lookups run the computation once"""
+        import asyncio
+        from src.excel.result_cache import ResultCache
+
+        cache = ResultCache(str(tmp_path), max_bytes=1000)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b"output"
+
+        async def run():
+            return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)))
+
+        assert asyncio.run(run()) == [b"output"] * 3
+        assert calls == [1]
+        assert cache.stats()["coalesced"] == 2
+
+    def test_cancelled_computation_is_taken_over(self, tmp_path):
+        """Test waiters compute themselves instead of inheriting a cancellation"""
+        import asyncio
+        from src.excel.result_cache import ResultCache
+
+        cache = ResultCache(str(tmp_path), max_bytes=1000)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return b"output"
+
+        async def run():
+            leader = asyncio.create_task(cache.get_or_compute("key", compute))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(cache.get_or_compute("key", compute)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await asyncio.gather(*followers)
+
+        assert asyncio.run(run()) == [b"output"] * 2
+        assert calls == [1, 1]
+
+    def test_key_covers_output_settings(self, monkeypatch):
+        """Test changing a setting that affects the output changes the key"""
+        from src import config
+        from src.excel.result_cache import result_key
+
+        key = result_key(b"data", [])
+        for name, value in (("SAVE_MODE", "passthrough"), ("LOAD_MODE", "lazy"), ("COMPACT_STYLES", True)):
+            with monkeypatch.context() as patch:
+                patch.setattr(config, name, value)
+                assert result_key(b"data", []) != key
+
+    def test_hit_skips_processing(self, monkeypatch, tmp_path, sample_workbook):
+        """Test an identical request is answered from the cache without running ExcelProcessor"""
+        from fastapi.testclient import TestClient
+        import main
+        from src.excel.result_cache import ResultCache
+
+        cache = ResultCache(str(tmp_path), max_bytes=1 << 20)
+        monkeypatch.setattr(main, "get_result_cache", lambda: cache)
+        calls = []
+        original = main.transform_bytes
+        monkeypatch.setattr(main, "transform_bytes", lambda *args: calls.append(1) or original(*args))
+        client = TestClient(main.app)
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        body = {
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "operations": [{
+                "sheet_name": "Sheet1",
+                "processing": [{
+                    "processing_type": "set_cells",
+                    "target": {
+                        "cells": {"start_cell": {"col_letter": "A", "row": 3}},
+                        "values": [["Cached"]]
+                    }
+                }]
+            }]
+        }
+
+        first = client.post("/transform_excel", json=body).json()
+        second = client.post("/transform_excel", json=body).json()
+
+        assert first["output"] == second["output"]
+        assert calls == [1]
+        assert client.get("/stats").json()["result_cache"]["hit_ratio"] == 0.5
+
+
+class TestPipelines:
+    @pytest.fixture
+    def client(self, monkeypatch, tmp_path):
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+        from src.excel import pipelines
+
+        monkeypatch.setattr(config, "PIPELINE_DIR", str(tmp_path))
+        monkeypatch.setattr(pipelines, "_pipeline_registry", None)
+        return TestClient(main.app)
+
+    def test_register_and_run_with_params(self, client, sample_workbook):
+        """Test a registered pipeline runs on a file with its placeholders filled from params"""
+        operations = [{
+            "sheet_name": "Sheet1",
+            "processing": [
+                {
+                    "processing_type": "set_cells",
+                    "target": {
+                        "cells": {"start_cell": {"col_letter": "A", "row": 3}},
+                        "values": [["{{customer}}", "fixed"]]
+                    }
+                },
+                {"processing_type": "insert", "target": {"cells": {"start_cell": {"row": 1}}}},
+            ]
+        }]
+        registered = client.post("/pipelines", json={"operations": operations})
+        assert registered.status_code == 201
+        pipeline_id = registered.json()["pipeline_id"]
+        assert registered.json()["parameters"] == ["customer"]
+        # Registration is idempotent
+        assert client.post("/pipelines", json={"operations": operations}).json()["pipeline_id"] == pipeline_id
+
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        response = client.post("/transform_excel/pipeline", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "pipeline_id": pipeline_id,
+            "params": {"customer": "Acme"},
+        })
+
+        assert response.status_code == 200
+        sheet = openpyxl.load_workbook(io.BytesIO(base64.b64decode(response.json()["output"])))["Sheet1"]
+        assert [sheet["A4"].value, sheet["B4"].value] == ["Acme", "fixed"]
+
+        missing = client.post("/transform_excel/pipeline", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "pipeline_id": pipeline_id,
+        })
+        assert missing.status_code == 400
+        assert "Missing pipeline parameters: customer" in missing.json()["output"]
+
+    def test_overwritten_parameter_is_kept(self, client, sample_workbook):
+        """Test the planner keeps a parameter write that a later write covers, so binding accepts it"""
+        def write(value):
+            return {
+                "processing_type": "set_cells",
+                "target": {"cells": {"start_cell": {"col_letter": "A", "row": 3}}, "values": [[value]]}
+            }
+        registered = client.post("/pipelines", json={"operations": [{
+            "sheet_name": "Sheet1",
+            "processing": [write("{{customer}}"), write("final")]
+        }]})
+        assert registered.json()["parameters"] == ["customer"]
+
+        output = io.BytesIO()
+        sample_workbook.save(output)
+        response = client.post("/transform_excel/pipeline", json={
+            "file": base64.b64encode(output.getvalue()).decode(),
+            "pipeline_id": registered.json()["pipeline_id"],
+            "params": {"customer": "Acme"},
+        })
+
+        assert response.status_code == 200
+        sheet = openpyxl.load_workbook(io.BytesIO(base64.b64decode(response.json()["output"])))["Sheet1"]
+        assert sheet["A3"].value == "final"
+
+    def test_unknown_pipeline(self, client):
+        """Test looking up a pipeline that was never registered"""
+        assert client.get("/pipelines/" + "0" * 64).status_code == 404
+        assert client.get("/pipelines/../../etc").status_code == 404
+
+    def test_pipeline_reloaded_from_disk(self, tmp_path):
+        """Test another process can load a pipeline registered on the shared directory"""
+        from src.excel.pipelines import PipelineRegistry
+
+        operations = [Operation(sheet_name="Sheet1", processing=[Processing(processing_type="copy_sheet")])]
+        pipeline_id = PipelineRegistry(str(tmp_path)).register(operations).pipeline_id
+
+        pipeline = PipelineRegistry(str(tmp_path)).get(pipeline_id)
+
+        assert pipeline.operations == operations
+        assert [step.stage for step in pipeline.steps] == ["op.copy_sheet"]
+
+
+class TestAdmission:
+    @pytest.fixture
+    def two_sheet_bytes(self):
+        wb = openpyxl.Workbook()
+        wb.active.title = "Small"
+        wb.active["A1"] = "x"
+        big = wb.create_sheet("Big")
+        for row in range(1, 2001):
+            big.append([row] * 10)
+        output = io.BytesIO()
+        wb.save(output)
+        return output.getvalue()
+
+    def test_estimate_memory_cost(self, two_sheet_bytes):
+        """Test the cost estimate scales sheet XML and skips sheets a lazy load leaves unparsed"""
+        from src.excel.admission import estimate_memory_cost
+
+        full = estimate_memory_cost(two_sheet_bytes)
+        lazy = estimate_memory_cost(two_sheet_bytes, ["Small"])
+
+        assert full > get_uncompressed_size(two_sheet_bytes) * 5
+        assert lazy < full / 10
+
+    def test_budget_queues_and_rejects(self):
+        """Test requests wait for room in arrival order and are rejected when they never fit"""
+        from src.excel.admission import MemoryBudget, WorkbookTooLargeError
+
+        async def scenario():
+            budget = MemoryBudget(100, wait_timeout=1)
+            order = []
+
+            async def request(name, cost, hold):
+                async with budget.reserve(cost):
+                    order.append(name)
+                    await asyncio.sleep(hold)
+
+            first = asyncio.create_task(request("first", 80, 0.05))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(request("second", 50, 0))
+            third = asyncio.create_task(request("third", 10, 0))
+            await asyncio.gather(first, second, third)
+            assert order == ["first", "second", "third"]
+            assert budget.reserved == 0
+
+            with pytest.raises(WorkbookTooLargeError):
+                await budget.acquire(101)
+
+            budget.wait_timeout = 0.01
+            await budget.acquire(100)
+            with pytest.raises(PoolSaturatedError):
+                await budget.acquire(1)
+            assert budget.stats()["rejected"] == 2
+
+        asyncio.run(scenario())
+
+    def test_oversized_request_routed_or_rejected(self, monkeypatch, two_sheet_bytes):
+        """Test a workbook too big for an eager load runs lazily when that fits, and gets a 413 otherwise"""
+        from fastapi.testclient import TestClient
+        import main
+        from src import config
+        from src.excel import admission
+
+        lazy_cost = admission.estimate_memory_cost(two_sheet_bytes, ["Small"])
+        monkeypatch.setattr(config, "MEMORY_BUDGET_BYTES", lazy_cost)
+        monkeypatch.setattr(admission, "_memory_budget", None)
+        client = TestClient(main.app)
+
+        def request(sheet_name):
+            return client.post("/transform_excel", json={
+                "file": base64.b64encode(two_sheet_bytes).decode(),
+                "operations": [{
+                    "sheet_name": sheet_name,
+                    "processing": [{
+                        "processing_type": "set_cells",
+                        "target": {"cells": {"start_cell": {"col_letter": "B", "row": 1}}, "values": [["y"]]}
+                    }]
+                }]
+            })
+
+        response = request("Small")
+        assert response.status_code == 200
+        workbook = openpyxl.load_workbook(io.BytesIO(base64.b64decode(response.json()["output"])))
+        assert workbook["Small"]["B1"].value == "y"
+        assert workbook["Big"].max_row == 2000
+
+        response = request("Big")
+        assert response.status_code == 413
+        assert "memory budget" in response.json()["output"]
+
+    def test_jobs_reserve_budget_and_route_lazily(self, tmp_path, monkeypatch, two_sheet_bytes):
+        """Test jobs too big for an eager load run lazily within the job budget and get a 413 otherwise"""
+        from fastapi.testclient import TestClient
+        import main
+        from src.excel import admission, jobs
+
+        lazy_cost = admission.estimate_memory_cost(two_sheet_bytes, ["Small"])
+        load_modes = []
+        original_run_job = jobs.run_job
+        def run_job(directory, ttl, job_id, load_mode=None):
+            load_modes.append(load_mode)
+            original_run_job(directory, ttl, job_id, load_mode)
+        monkeypatch.setattr(jobs, "run_job", run_job)
+        runner = JobRunner(JobStore(str(tmp_path), ttl=60), use_processes=False, memory_budget=lazy_cost)
+        monkeypatch.setattr(main, "job_runner", runner)
+        client = TestClient(main.app)
+
+        def submit(sheet_name):
+            operations = [{
+                "sheet_name": sheet_name,
+                "processing": [{
+                    "processing_type": "set_cells",
+                    "target": {"cells": {"start_cell": {"col_letter": "B", "row": 1}}, "values": [["y"]]}
+                }]
+            }]
+            return client.post("/jobs", files={"file": ("input.xlsx", two_sheet_bytes)},
+                               data={"operations": json.dumps(operations)})
+
+        responses = [submit("Small"), submit("Small")]
+        assert [response.status_code for response in responses] == [202, 202]
+        runner.shutdown()
+
+        assert load_modes == ["lazy", "lazy"]
+        assert runner.reserved == 0
+        for response in responses:
+            job_id = response.json()["job_id"]
+            assert runner.store.get(job_id)["status"] == "succeeded"
+            workbook = openpyxl.load_workbook(runner.store.path(job_id, "output"))
+            assert workbook["Small"]["B1"].value == "y"
+            assert workbook["Big"].max_row == 2000
+
+        assert submit("Big").status_code == 413
+        assert len(list(tmp_path.glob("*.input.xlsx"))) == 2